@@ -6,9 +6,17 @@
 import forumdb
 
 # Other modules used to run a web server.
+import argparse
 import cgi
+import collections
+import contextlib
+import hashlib
+import itertools
+import threading
+import urllib
 from wsgiref.simple_server import make_server
 from wsgiref import util
+import forumserver
 
 # HTML template for the forum page
 HTML_WRAP = '''\
@@ -38,23 +46,143 @@ HTML_WRAP = '''\
 </html>
 '''
 
+# The forum page before and after its posts, sent as they are streamed
+HTML_HEAD, HTML_TAIL = (HTML_WRAP % '%s').split('%s')
+
+# Posts rendered into each chunk of a streamed page
+CHUNK_POSTS = 100
+
 # HTML template for an individual comment
 POST = '''\
     <div class=post><em class=date>%(time)s</em><br>%(content)s</div>
 '''
 
+# HTML template for the link to the next page of older posts
+OLDER = '''\
+    <div class=post><a href="/?before=%s">Older posts</a></div>
+'''
+
+# Rendered pages kept.  A page is served while its ETag is current, which
+# is read from the database, so posts added by any process are seen at once.
+PAGE_CACHE_SIZE = 100
+
+# Rendered pages by (before, limit), least recently used first
+_pages = collections.OrderedDict()
+_pagesLock = threading.Lock()
+
 ## Request handler for main page
 def View(env, resp):
     '''View is the 'main page' of the forum.
 
-    It displays the submission form and the previously posted messages.
+    It displays the submission form and a page of the previously posted
+    messages, newest first.  The 'before' query parameter picks an older
+    page, and 'limit' the number of messages on it.  Rendered pages are
+    cached until a post is added.  Each page is sent with an ETag made from
+    its key and the version of the posts, so a browser that already has the
+    page gets a 304 Not Modified instead.
     '''
-    # get posts from database
-    posts = forumdb.GetAllPosts()
-    # send results
-    headers = [('Content-type', 'text/html')]
+    fields = cgi.parse_qs(env.get('QUERY_STRING', ''))
+    before = fields.get('before', [None])[0]
+    limit = fields.get('limit', [forumdb.PAGE_SIZE])[0]
+    headers = [('Content-type', 'text/html'),
+               ('Cache-Control', 'no-cache')]
+    try:
+        limit = forumdb.PageSize(limit)
+    except ValueError:
+        return BadPage(resp)
+    # send nothing if the browser has the page, or send it from the cache
+    key = (before, limit)
+    etag = PageETag(key, forumdb.PostsVersion())
+    headers.append(('ETag', etag))
+    if ETagMatches(env.get('HTTP_IF_NONE_MATCH', ''), etag):
+        resp('304 Not Modified', headers)
+        return []
+    page = CachedPage(key, etag)
+    if page is not None:
+        resp('200 OK', headers)
+        return [page]
+    # get a page of posts from database, and one more to see if there are
+    # older posts
+    try:
+        posts = forumdb.IterPosts(before, limit + 1)
+    except ValueError:
+        return BadPage(resp)
+    # send results as they are read, and cache them
     resp('200 OK', headers)
-    return [HTML_WRAP % ''.join(POST % p for p in posts)]
+    return CachePage(key, etag, RenderPage(posts, limit))
+
+def BadPage(resp):
+    '''Reply to a request for a page that cannot exist.'''
+    resp('400 Bad Request', [('Content-type', 'text/plain')])
+    return ['Bad Request: invalid page']
+
+def PageETag(key, version):
+    '''Make the ETag of a page from its (before, limit) key and the version
+    of the posts, which together fix what the page shows.'''
+    return '"%s"' % hashlib.md5(repr((key, version))).hexdigest()
+
+def ETagMatches(header, etag):
+    '''Tell whether an If-None-Match header names a page's ETag.
+
+    As If-None-Match compares ETags weakly, a weak W/"..." validator matches
+    its strong form, and '*' matches any page.
+    '''
+    tags = [tag.strip() for tag in header.split(',')]
+    if '*' in tags:
+        return True
+    return etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+def CachedPage(key, etag):
+    '''Get the text of a cached page, or None if it is not cached or may be
+    out of date.'''
+    with _pagesLock:
+        entry = _pages.pop(key, None)
+        if entry is None:
+            return None
+        cachedETag, page = entry
+        if cachedETag != etag:
+            return None
+        _pages[key] = entry
+        return page
+
+def CachePage(key, etag, chunks):
+    '''Yield the chunks of a page, then cache the whole page.
+
+    The page is only cached if it was sent in full, and is served again only
+    while etag, read before the page's posts were, is current.
+    '''
+    page = []
+    with contextlib.closing(chunks):
+        for chunk in chunks:
+            page.append(chunk)
+            yield chunk
+    with _pagesLock:
+        _pages.pop(key, None)
+        _pages[key] = (etag, ''.join(page))
+        while len(_pages) > PAGE_CACHE_SIZE:
+            _pages.popitem(last=False)
+
+def RenderPage(posts, limit=None):
+    '''Render the forum page for an iterator of posts from forumdb.
+
+    The page is yielded in chunks of CHUNK_POSTS posts, starting with the
+    page head before any post is read, so the first bytes go out at once.
+    If there are more than limit posts, only limit of them are shown, and
+    the page ends with a link to the older ones.
+    '''
+    try:
+        yield HTML_HEAD
+        chunk = []
+        for post in itertools.islice(posts, limit):
+            chunk.append(POST % post)
+            if len(chunk) == CHUNK_POSTS:
+                yield ''.join(chunk)
+                chunk = []
+        if limit is not None and next(posts, None) is not None:
+            chunk.append(OLDER % urllib.quote(post['cursor']))
+        yield ''.join(chunk) + HTML_TAIL
+    finally:
+        posts.close()
 
 ## Request handler for posting - inserts to database
 def Post(env, resp):
@@ -101,7 +229,27 @@ def Dispatcher(env, resp):
 
 
 # Run this bad server only on localhost!
-httpd = make_server('', 8000, Dispatcher)
-print "Serving HTTP on port 8000..."
-httpd.serve_forever()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the DB Forum server.")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--threads', type=int, default=0,
+                        help="handle requests on a pool of this many threads "
+                             "in each process, instead of one at a time")
+    parser.add_argument('--processes', type=int, default=0,
+                        help="fork this many worker processes to handle "
+                             "requests")
+    parser.add_argument('--quiet', action='store_true',
+                        help="do not log each request")
+    args = parser.parse_args()
+    if args.threads or args.processes:
+        print "Serving HTTP on port %d with %d processes of %d threads..." % (
+            args.port, max(args.processes, 1), max(args.threads, 1))
+        forumserver.Serve(Dispatcher, '', args.port, max(args.threads, 1),
+                          args.processes, args.quiet)
+        forumdb.ClosePool()
+        print "Stopped."
+    else:
+        httpd = make_server('', args.port, Dispatcher)
+        print "Serving HTTP on port %d..." % args.port
+        httpd.serve_forever()
 
@@ -1,5 +1,27 @@
-
 CREATE TABLE posts ( content TEXT,
                      time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                      id SERIAL );
 
+-- Backs the newest-first pages of GetPosts(), so each page reads only its
+-- own rows however many posts there are.  On an existing database, run this
+-- statement alone.
+CREATE INDEX posts_time_id ON posts (time DESC, id DESC);
+
+-- One row counting the changes to posts.  The trigger bumps it in the same
+-- transaction as every change, so PostsVersion() changes whenever a post is
+-- committed, even one that sorts below the newest post.  Writers to posts
+-- wait on that row for each other's transactions, which AddPost() keeps
+-- short.  On an existing database, run these statements alone.
+CREATE TABLE posts_version ( version BIGINT NOT NULL );
+INSERT INTO posts_version VALUES (0);
+
+CREATE FUNCTION bump_posts_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE posts_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER posts_version_bump
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON posts
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_posts_version();
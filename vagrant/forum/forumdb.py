@@ -2,12 +2,155 @@
 # Database access functions for the web forum.
 # 
 
+import contextlib
 import time
+import datetime
+import os
+import threading
 import psycopg2
+import psycopg2.pool
 import bleach
 
-## Database connection
-## DB = []
+## Database connection settings.  The pool keeps up to POOL_MIN connections
+## open while idle, and opens up to POOL_MAX at once.
+DSN = os.environ.get('FORUM_DSN', 'dbname=forum')
+POOL_MIN = int(os.environ.get('FORUM_POOL_MIN', 2))
+POOL_MAX = int(os.environ.get('FORUM_POOL_MAX', 10))
+
+## Seconds a pooled connection may be idle before it is checked again
+CHECK_IDLE = 30
+
+## Database connection pool, created on first use in each process
+_pool = None
+_poolLock = threading.Lock()
+
+## Pools inherited from the parent of a forked process.  Their connections
+## belong to the parent, so they are kept from being used or closed here.
+_inheritedPools = []
+
+## Posts on a page, and the most a caller may ask for
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+## Posts read from the database at a time when streaming
+STREAM_SIZE = 500
+
+class ConnectionPool(psycopg2.pool.ThreadedConnectionPool):
+    '''A thread-safe pool of connections to the forum database.
+
+    Borrowers wait for a connection when all of them are in use.  Before a
+    connection is lent, it is checked with a query if it has been idle for
+    CHECK_IDLE seconds, or if a connection has failed since it was last
+    used, as the server may have gone away.  Connections that fail are
+    replaced with new ones.
+    '''
+
+    def __init__(self, minconn, maxconn, dsn):
+        psycopg2.pool.ThreadedConnectionPool.__init__(self, minconn, maxconn,
+                                                      dsn)
+        self.pid = os.getpid()
+        self._available = threading.BoundedSemaphore(maxconn)
+        self._idleSince = {}
+        self._failedAt = 0
+
+    def Borrow(self):
+        '''Take a working connection, waiting for one if necessary.'''
+        self._available.acquire()
+        try:
+            while True:
+                dbconnection = self.getconn()
+                now = time.time()
+                idleSince = self._idleSince.pop(id(dbconnection), now)
+                if not dbconnection.closed and (
+                        (now - idleSince < CHECK_IDLE and
+                         idleSince > self._failedAt) or
+                        _Healthy(dbconnection)):
+                    return dbconnection
+                self.putconn(dbconnection, close=True)
+        except Exception:
+            self._available.release()
+            raise
+
+    def Return(self, dbconnection, failed=False):
+        '''Put back a borrowed connection.
+
+        Uncommitted work is rolled back.  A connection that failed is closed
+        instead, and the others are checked before they are lent again.
+        '''
+        try:
+            if not failed and not dbconnection.closed:
+                try:
+                    dbconnection.rollback()
+                except psycopg2.Error:
+                    failed = True
+            failed = failed or bool(dbconnection.closed)
+            if failed:
+                self._failedAt = time.time()
+            else:
+                self._idleSince[id(dbconnection)] = time.time()
+            if not self.closed:
+                self.putconn(dbconnection, close=failed)
+        finally:
+            self._available.release()
+
+def _Healthy(dbconnection):
+    '''Tell whether a connection still reaches the database.'''
+    try:
+        dbconnection.cursor().execute("SELECT 1")
+        dbconnection.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+## Get the database connection pool.
+def GetPool():
+    '''Get the connection pool of this process, creating it if necessary.
+
+    A forked process creates a pool of its own, as two processes cannot
+    share a connection.
+    '''
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _poolLock:
+            if _pool is not None and _pool.pid != os.getpid():
+                _inheritedPools.append(_pool)
+                _pool = None
+            if _pool is None:
+                _pool = ConnectionPool(POOL_MIN, POOL_MAX, DSN)
+    return _pool
+
+## Close the database connection pool.
+def ClosePool():
+    '''Close the pooled connections of this process.  A new pool is created
+    on next use.'''
+    global _pool
+    with _poolLock:
+        if _pool is not None:
+            if _pool.pid == os.getpid():
+                _pool.closeall()
+            else:
+                _inheritedPools.append(_pool)
+            _pool = None
+
+## Borrow a database connection.
+@contextlib.contextmanager
+def Connection():
+    '''Borrow a connection from the pool for the length of a 'with' block.
+
+    Commit any changes before the block ends; the connection is rolled back
+    when it goes back to the pool.  If the block fails because the
+    connection did, the connection is replaced.
+    '''
+    pool = GetPool()
+    dbconnection = pool.Borrow()
+    failed = False
+    try:
+        yield dbconnection
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        failed = True
+        raise
+    finally:
+        pool.Return(dbconnection, failed)
 
 ## Get posts from database.
 def GetAllPosts():
@@ -18,14 +161,115 @@ def GetAllPosts():
       pointing to the post content, and 'time' key pointing to the time
       it was posted.
     '''
-    dbconnection = psycopg2.connect("dbname=forum")
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("SELECT time, content FROM posts ORDER BY time DESC")
-    posts = ({'content': str(row[1]), 'time': str(row[0])}
-            for row in dbcursor.fetchall())
-    dbconnection.close()
+    with Connection() as dbconnection:
+        dbcursor = dbconnection.cursor()
+        dbcursor.execute("SELECT time, content FROM posts ORDER BY time DESC")
+        posts = ({'content': str(row[1]), 'time': str(row[0])}
+                for row in dbcursor.fetchall())
     return posts
 
+## Get a page of posts from database.
+def GetPosts(before=None, limit=PAGE_SIZE):
+    '''Get a page of posts from the database, sorted with the newest first.
+
+    A page starts after the last post of the one before it, and is read
+    from the (time, id) index, so it costs the same however many posts
+    there are.
+
+    Args:
+      before: The cursor of the previous page, or None for the newest posts.
+      limit: The most posts to return, up to MAX_PAGE_SIZE.
+
+    Returns:
+      A list of dictionaries like those of IterPosts(), and the cursor of
+      the next page of older posts, or None if there are no older posts.
+
+    Raises:
+      ValueError: if before is not a cursor returned by GetPosts().
+    '''
+    limit = PageSize(limit)
+    # One post more than the page shows whether there is a next page
+    posts = list(IterPosts(before, limit + 1))
+    if len(posts) > limit:
+        return posts[:limit], posts[limit - 1]['cursor']
+    return posts, None
+
+## Get the version of the posts.
+def PostsVersion():
+    '''Get a number that changes whenever a post is added, changed or
+    deleted, so it tells whether anything read before it is out of date.
+
+    It is bumped by a trigger in the same transaction as the change, so it
+    changes even for a post whose time or id sorts below the newest post's,
+    as happens when an earlier transaction commits later.
+    '''
+    with Connection() as dbconnection:
+        dbcursor = dbconnection.cursor()
+        dbcursor.execute("SELECT version FROM posts_version")
+        row = dbcursor.fetchone()
+    return row and row[0]
+
+## Stream posts from database.
+def IterPosts(before=None, limit=None):
+    '''Iterate over posts in the database, newest first, as they are read.
+
+    The posts are read from a server-side cursor STREAM_SIZE at a time, so
+    memory use does not grow with the number of posts.  The iterator holds
+    a connection until it is exhausted or closed.
+
+    Args:
+      before: A post's cursor, to start after that post, or None to start
+              with the newest.
+      limit: The most posts to return, or None for all of them.
+
+    Returns:
+      An iterator of dictionaries, where each dictionary has the 'content'
+      and 'time' keys of GetAllPosts(), and a 'cursor' key pointing to the
+      cursor of the posts after it.
+
+    Raises:
+      ValueError: if before is not a cursor returned by IterPosts().
+    '''
+    if before is not None:
+        before = _ParseCursor(before)
+    return _StreamPosts(before, limit)
+
+def _StreamPosts(before, limit):
+    '''Yield the posts of IterPosts() from a server-side cursor.'''
+    with Connection() as dbconnection:
+        dbcursor = dbconnection.cursor('posts')
+        dbcursor.itersize = STREAM_SIZE
+        if before is None:
+            dbcursor.execute("""SELECT time, content, id FROM posts
+                                ORDER BY time DESC, id DESC LIMIT %s""",
+                             (limit,))
+        else:
+            dbcursor.execute("""SELECT time, content, id FROM posts
+                                WHERE (time, id) < (%s, %s)
+                                ORDER BY time DESC, id DESC LIMIT %s""",
+                             before + (limit,))
+        for row in dbcursor:
+            yield {'content': str(row[1]), 'time': str(row[0]),
+                   'cursor': '%s,%d' % (row[0].isoformat(), row[2])}
+
+def PageSize(limit):
+    '''Bound a requested number of posts on a page to 1..MAX_PAGE_SIZE.
+
+    Raises:
+      ValueError: if limit is not a number.
+    '''
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+def _ParseCursor(cursor):
+    '''Split a page cursor into the time and id of the post it follows.'''
+    stamp, _, post_id = cursor.rpartition(',')
+    for format in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.datetime.strptime(stamp, format), int(post_id)
+        except ValueError:
+            pass
+    raise ValueError("Invalid page cursor: %r" % cursor)
+
 ## Add a post to the database.
 def AddPost(content):
     '''Add a new post to the database.
@@ -34,8 +278,8 @@ def AddPost(content):
       content: The text content of the new post.
     '''
     bleachedContent = bleach.clean(content, strip=True)
-    dbconnection = psycopg2.connect("dbname=forum")
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("INSERT INTO posts (content) VALUES (%s)", (bleachedContent,))
-    dbconnection.commit()
-    dbconnection.close()
+    with Connection() as dbconnection:
+        dbcursor = dbconnection.cursor()
+        dbcursor.execute("INSERT INTO posts (content) VALUES (%s)",
+                         (bleachedContent,))
+        dbconnection.commit()
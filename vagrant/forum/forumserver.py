@@ -0,0 +1,150 @@
+#
+# WSGI servers for the web forum.
+#
+# ThreadPoolWSGIServer handles requests on a fixed pool of threads, so one
+# slow client only holds up its own thread.  Serve() runs one of them, or
+# several in pre-forked worker processes sharing one listening socket, until
+# it gets SIGINT or SIGTERM, then finishes the requests it has accepted
+# before it returns.
+#
+
+import errno
+import os
+import Queue
+import signal
+import threading
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler
+
+## Seconds a stopping server waits for the requests it has accepted
+SHUTDOWN_TIMEOUT = 30
+
+class ThreadPoolWSGIServer(WSGIServer):
+    '''A WSGI server that handles requests on a fixed pool of threads.
+
+    Connections are accepted by the thread running serve_forever() and
+    queued for the workers, which are started by serve_forever() so that
+    the server can be created before worker processes are forked.
+    '''
+
+    # Connections waiting to be accepted before more are refused
+    request_queue_size = 128
+
+    def __init__(self, address, handler, threads):
+        WSGIServer.__init__(self, address, handler)
+        self.threads = threads
+        self.requests = Queue.Queue()
+        self.workers = []
+
+    def serve_forever(self, poll_interval=0.5):
+        '''Start the worker threads, then accept connections until
+        shutdown() is called.'''
+        while len(self.workers) < self.threads:
+            worker = threading.Thread(target=self.Work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+        WSGIServer.serve_forever(self, poll_interval)
+
+    def process_request(self, request, client_address):
+        '''Queue an accepted connection for the next free worker.'''
+        self.requests.put((request, client_address))
+
+    def Work(self):
+        '''Handle queued connections until a None is queued.'''
+        while True:
+            queued = self.requests.get()
+            if queued is None:
+                return
+            request, client_address = queued
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        '''Stop listening, then wait up to SHUTDOWN_TIMEOUT seconds for the
+        workers to finish the connections already accepted.'''
+        WSGIServer.server_close(self)
+        for worker in self.workers:
+            self.requests.put(None)
+        for worker in self.workers:
+            worker.join(SHUTDOWN_TIMEOUT)
+        self.workers = []
+
+class QuietHandler(WSGIRequestHandler):
+    '''A request handler that does not log each request.'''
+
+    def log_message(self, *args):
+        pass
+
+def Serve(app, host='', port=8000, threads=8, processes=0, quiet=False):
+    '''Serve a WSGI application until SIGINT or SIGTERM.
+
+    Args:
+      app: The WSGI application, such as forum.Dispatcher.
+      host, port: The address to listen on.
+      threads: The number of threads handling requests in each process.
+      processes: The number of worker processes to fork, or 0 to handle
+        requests in this process.  Workers that exit are replaced.
+      quiet: If true, requests are not logged.
+    '''
+    handler = QuietHandler if quiet else WSGIRequestHandler
+    server = ThreadPoolWSGIServer((host, port), handler, threads)
+    server.set_app(app)
+    if not processes:
+        _ServeUntilSignal(server)
+        return
+
+    # Every worker waits on the one listening socket, so the ones that lose
+    # the race for a connection must not block in accept()
+    server.socket.setblocking(False)
+    children = []
+    stopping = []
+
+    def Stop(signum, frame):
+        stopping.append(signum)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+    signal.signal(signal.SIGINT, Stop)
+    signal.signal(signal.SIGTERM, Stop)
+
+    def Fork():
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                _ServeUntilSignal(server)
+                status = 0
+            finally:
+                os._exit(status)
+        children.append(pid)
+
+    for _ in range(processes):
+        Fork()
+    while children:
+        try:
+            pid, status = os.wait()
+        except OSError as error:
+            if error.errno == errno.EINTR:
+                continue
+            raise
+        children.remove(pid)
+        if not stopping:
+            Fork()
+    server.socket.close()
+
+def _ServeUntilSignal(server):
+    '''Run a server until SIGINT or SIGTERM, then close it.'''
+    def Stop(signum, frame):
+        # shutdown() waits for serve_forever() to return, so it cannot be
+        # called on the thread running it
+        threading.Thread(target=server.shutdown).start()
+    signal.signal(signal.SIGINT, Stop)
+    signal.signal(signal.SIGTERM, Stop)
+    server.serve_forever()
+    server.server_close()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+#
+# Load test for the web forum
+#
+# Sends requests for the main page and posts to a running forum server from
+# many clients at once, then reports the requests per second and the
+# latency percentiles of each.  Start the server first, for example with
+# 'python forum.py --threads 8 --quiet'.  The posts it adds are named
+# 'Load test post N'.
+
+import argparse
+import httplib
+import threading
+import time
+import urllib
+import urlparse
+
+## Latency percentiles reported
+PERCENTILES = (50, 90, 99)
+
+def Request(host, port, path, number):
+    '''Send one request, and return its status and how long it took.'''
+    start = time.time()
+    connection = httplib.HTTPConnection(host, port, timeout=30)
+    try:
+        if path == '/post':
+            body = urllib.urlencode({'content': 'Load test post %d' % number})
+            connection.request('POST', path, body, {
+                'Content-type': 'application/x-www-form-urlencoded'})
+        else:
+            connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        status = response.status
+    finally:
+        connection.close()
+    return status, time.time() - start
+
+def Percentile(latencies, percent):
+    '''Get a percentile of a sorted list of latencies, by nearest rank.'''
+    rank = int(round(percent / 100.0 * len(latencies))) - 1
+    return latencies[max(0, min(rank, len(latencies) - 1))]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measures the forum server under load.")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000,
+                        help="requests to send in all")
+    parser.add_argument('--posts', type=float, default=0.1,
+                        help="the fraction of requests that add a post")
+    args = parser.parse_args()
+    address = urlparse.urlparse(args.url)
+
+    # Every nth request is a post, spread evenly through the run
+    every = int(round(1 / args.posts)) if args.posts > 0 else 0
+    paths = ['/post' if every and n % every == every - 1 else '/'
+             for n in range(args.requests)]
+    latencies = dict((path, []) for path in set(paths))
+    failures = dict((path, 0) for path in set(paths))
+    remaining = iter(enumerate(paths))
+    lock = threading.Lock()
+
+    def Client():
+        while True:
+            with lock:
+                number, path = next(remaining, (None, None))
+            if path is None:
+                return
+            try:
+                status, latency = Request(address.hostname,
+                                          address.port or 80, path, number)
+            except Exception:
+                status, latency = None, None
+            with lock:
+                if status in (200, 302):
+                    latencies[path].append(latency)
+                else:
+                    failures[path] += 1
+
+    clients = [threading.Thread(target=Client) for _ in range(args.clients)]
+    start = time.time()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.time() - start
+
+    print "%d requests from %d clients in %.2f s: %.1f requests/s" % (
+        args.requests, args.clients, elapsed, args.requests / elapsed)
+    print "%-6s %9s %8s %10s" % ("path", "requests", "failed", "req/s") + \
+        ''.join("%9s" % ("p%d ms" % percent) for percent in PERCENTILES) + \
+        "%9s" % "max ms"
+    for path in sorted(latencies):
+        times = sorted(latencies[path])
+        line = "%-6s %9d %8d %10.1f" % (path, len(times), failures[path],
+                                        len(times) / elapsed)
+        if times:
+            line += ''.join("%9.1f" % (Percentile(times, percent) * 1000)
+                            for percent in PERCENTILES)
+            line += "%9.1f" % (times[-1] * 1000)
+        print line
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+#
+# Benchmark for streaming the forum's main page
+#
+# Adds many posts to the forum database, then measures the time to the
+# first byte, the total time, and the rise in the process's peak memory of:
+# the main page as View() streams it; every post streamed by RenderPage();
+# and every post rendered into one string, as View() used to.  They run in
+# that order, as the peak only ever rises.  The posts are deleted
+# afterwards.
+
+import argparse
+import resource
+import time
+
+import psycopg2
+
+import forum
+import forumdb
+
+
+def PeakMemory():
+    '''Return the process's peak resident memory so far, in kilobytes.'''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def Measure(label, render):
+    '''Read the chunks returned by render() and print the time to the first
+    one, the time to the last one, and the rise in peak memory.'''
+    before = PeakMemory()
+    start = time.time()
+    chunks = iter(render())
+    size = len(next(chunks))
+    first = time.time() - start
+    for chunk in chunks:
+        size += len(chunk)
+    print "%-12s %8.4f s %8.3f s %10d KB %12d bytes" % (
+        label, first, time.time() - start, PeakMemory() - before, size)
+
+def ViewPage():
+    '''Return the main page as View() sends it.'''
+    return forum.Dispatcher({'PATH_INFO': '/', 'SCRIPT_NAME': '',
+                             'QUERY_STRING': ''}, lambda status, headers: None)
+
+def StreamAll():
+    '''Return every post streamed into one page.'''
+    return forum.RenderPage(forumdb.IterPosts())
+
+def RenderAll():
+    '''Return every post rendered into one string at once.'''
+    return [forum.HTML_WRAP % ''.join(forum.POST % p
+                                      for p in forumdb.GetAllPosts())]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares streaming and rendering the forum page.")
+    parser.add_argument('--posts', type=int, default=100000)
+    args = parser.parse_args()
+
+    dbconnection = psycopg2.connect("dbname=forum")
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("""WITH added AS (
+                            INSERT INTO posts (content)
+                            SELECT 'Benchmark post ' || n
+                            FROM generate_series(1, %s) AS n
+                            RETURNING id)
+                        SELECT min(id), max(id) FROM added""", (args.posts,))
+    first_id, last_id = dbcursor.fetchone()
+    dbconnection.commit()
+    try:
+        print "%-12s %10s %10s %13s %18s" % (
+            "%d posts" % args.posts, "first byte", "total", "peak memory",
+            "size")
+        Measure("View page", ViewPage)
+        Measure("Stream all", StreamAll)
+        Measure("Render all", RenderAll)
+    finally:
+        dbcursor.execute("DELETE FROM posts WHERE id BETWEEN %s AND %s",
+                         (first_id, last_id))
+        dbconnection.commit()
+        dbconnection.close()
+
+
+if __name__ == '__main__':
+    main()
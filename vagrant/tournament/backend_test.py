@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#
+# Test cases shared by the tournament backends
+#
+# Plays the same seeded rounds on PostgreSQL, in memory and on SQLite, and
+# checks that every backend pairs each round and ranks the players in
+# exactly the same way.  PostgreSQL is skipped if the database cannot be
+# reached.  Like tournament_test.py, this empties the tables of each backend
+# first.
+
+import os
+import random
+import shutil
+import tempfile
+
+import psycopg2
+
+import tournament
+from tournament import *
+
+PLAYERS = 16
+ROUNDS = 4
+
+
+def playRounds(seed):
+    """Plays seeded rounds on the selected backend.  Returns the pairings
+    and standings after every round, with players numbered in registration
+    order so that backends can be compared."""
+    deleteMatches()
+    deletePlayers()
+    for n in range(PLAYERS):
+        registerPlayer("Backend test player %d" % n)
+    positions = dict((row[0], position) for (position, row) in
+                     enumerate(sorted(playerStandings())))
+    rng = random.Random(seed)
+    history = []
+    for roundNumber in range(ROUNDS):
+        pairings = swissPairings()
+        for (id1, name1, id2, name2) in pairings:
+            if rng.random() < 0.5:
+                reportMatch(id1, id2)
+            else:
+                reportMatch(id2, id1)
+        history.append((
+            [(positions[id1], positions[id2])
+             for (id1, name1, id2, name2) in pairings],
+            [(positions[row[0]],) + tuple(row[2:])
+             for row in playerStandings()]))
+    return history
+
+
+def testSameHistory():
+    directory = tempfile.mkdtemp()
+    try:
+        for seed in range(3):
+            histories = {}
+            try:
+                useBackend('postgresql')
+                histories['postgresql'] = playRounds(seed)
+            except psycopg2.OperationalError:
+                print "PostgreSQL is not available; skipping it."
+            useBackend('memory')
+            histories['memory'] = playRounds(seed)
+            tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+            useBackend('sqlite')
+            histories['sqlite'] = playRounds(seed)
+            tournament._backend.close()
+
+            for backend, history in sorted(histories.iteritems()):
+                if history != histories['memory']:
+                    raise ValueError(backend + " gives different pairings "
+                                     "or standings for the same results.")
+    finally:
+        shutil.rmtree(directory)
+    print "1. Every backend gives the same pairings and standings for the " \
+          "same results."
+
+
+if __name__ == '__main__':
+    backend = tournament.BACKEND
+    try:
+        testSameHistory()
+    finally:
+        useBackend(backend)
+    print "Success!  All tests pass!"
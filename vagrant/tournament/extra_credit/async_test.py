@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+#
+# Test cases for tournament_async.py
+#
+# Runs on PostgreSQL, in memory and on SQLite.  PostgreSQL is skipped if the
+# database cannot be reached.  Like extra_credit_tests.py, this empties the
+# tables of each backend first.
+
+import inspect
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import psycopg2
+
+import tournament
+import tournament_async
+from tournament import *
+
+SIZES = [4, 5, 6, 7, 8]
+
+# Functions in tournament.py that manage connections rather than data
+INFRASTRUCTURE = set(['configurePool', 'closePool', 'getPool', 'useBackend',
+                      'connect', 'transaction'])
+
+# Functions in tournament.py that return iterators, which are read lazily
+# on the caller's thread
+STREAMING = set(['iterStandings'])
+
+
+def clearAllTables():
+    """Empties all tables of the selected backend."""
+    deleteMatches()
+    deleteCompetitors()
+    deleteTournaments()
+    deletePlayers()
+
+
+def newTournament(playerCount):
+    """Creates a tournament of new players on the selected backend.  Returns
+    its id."""
+    createTournament("Async test")
+    dbconnection = connect()
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("SELECT id FROM tournaments;")
+    tournament_id = max(row[0] for row in dbcursor.fetchall())
+    dbconnection.close()
+    registerPlayers(["Async test player %d" % n for n in range(playerCount)],
+                    tournament_id)
+    return tournament_id
+
+
+def testEveryFunction():
+    public = set(name for (name, value)
+                 in inspect.getmembers(tournament, inspect.isfunction)
+                 if value.__module__ == 'tournament' and
+                 not name.startswith('_') and
+                 name not in INFRASTRUCTURE | STREAMING)
+    if public != set(tournament_async.FUNCTIONS):
+        raise ValueError("Every tournament function should have a "
+                         "non-blocking version: %r" %
+                         sorted(public ^ set(tournament_async.FUNCTIONS)))
+    print "1. Every tournament function has a non-blocking version."
+
+
+def testSameResults():
+    clearAllTables()
+    tournament_ids = [newTournament(size) for size in SIZES]
+    pairings = tournament_async.swissPairings(tournament_ids[0]).result()
+    for (id1, name1, id2, name2) in pairings:
+        tournament_async.reportMatch(tournament_ids[0], id1, id2, id1,
+                                     False).result()
+    standings = tournament_async.playerStandingsForTournaments(
+        tournament_ids).result()
+    if standings != dict((tournament_id, playerStandings(tournament_id))
+                         for tournament_id in tournament_ids):
+        raise ValueError("Standings read at once should be the standings of "
+                         "each tournament.")
+    failed = tournament_async.fetchRound(tournament_ids[0], 1)
+    if not isinstance(failed.exception(), ValueError):
+        raise ValueError("An error should be raised by the Future's "
+                         "result.")
+
+
+def testCallsOverlap():
+    started = []
+    release = threading.Event()
+
+    class SlowBackend(object):
+        """Stands in for a backend whose standings reads wait on 'release'."""
+
+        def playerStandings(self, tournament_id):
+            started.append(tournament_id)
+            release.wait(10)
+            return [(tournament_id,)]
+
+    useBackend(SlowBackend())
+    try:
+        reads = tournament_async.playerStandingsForTournaments(range(3))
+        for _ in range(100):
+            if len(started) == 3:
+                break
+            time.sleep(0.05)
+        if len(started) != 3 or reads.done():
+            raise ValueError("Reads should run at once without blocking the "
+                             "caller.")
+        release.set()
+        if reads.result(10) != {0: [(0,)], 1: [(1,)], 2: [(2,)]}:
+            raise ValueError("Reads should be gathered by tournament.")
+    finally:
+        release.set()
+        useBackend('memory')
+    print "3. Calls run at once, without blocking the caller."
+
+
+def testConcurrentWrites():
+    useBackend('memory')
+    # Switch threads as often as possible, so that races show up
+    interval = sys.getcheckinterval()
+    sys.setcheckinterval(1)
+    try:
+        registrations = [tournament_async.registerPlayers(
+            ["Concurrent player %d.%d" % (batch, n) for n in range(2000)])
+            for batch in range(10)]
+        player_ids = sum((registration.result(30)
+                          for registration in registrations), [])
+        if len(set(player_ids)) != len(player_ids):
+            raise ValueError("Concurrent registrations should each get new "
+                             "players.")
+
+        # Pair while the matches of the first round are reported
+        tournament_id = newTournament(0)
+        player_ids = player_ids[:200]
+        registerCompetitors(tournament_id, player_ids)
+        reports = [tournament_async.reportMatch(tournament_id, id1, id2, id1,
+                                                False)
+                   for (id1, id2) in zip(player_ids[::2], player_ids[1::2])]
+        pairings = [tournament_async.swissPairings(tournament_id)
+                    for _ in range(10)]
+        for future in reports + pairings:
+            future.result(30)
+        if standingsDifferences(tournament_id):
+            raise ValueError("Concurrent reports should keep the standings "
+                             "consistent.")
+    finally:
+        sys.setcheckinterval(interval)
+        useBackend('memory')
+    print "5. Concurrent calls on the memory backend keep its data consistent."
+
+
+def countInChild(tournament_id, queue):
+    """Counts a tournament's competitors through tournament_async in a
+    forked process."""
+    queue.put(tournament_async.countCompetitors(tournament_id).result(10))
+
+
+def testForkedProcesses():
+    useBackend('postgresql')
+    try:
+        clearAllTables()
+    except psycopg2.OperationalError:
+        print "PostgreSQL is not available; skipping it."
+        return
+    tournament_id = newTournament(SIZES[0])
+    tournament_async.countCompetitors(tournament_id).result()
+    queue = multiprocessing.Queue()
+    child = multiprocessing.Process(target=countInChild,
+                                    args=(tournament_id, queue))
+    child.start()
+    child.join(30)
+    if queue.get(timeout=1) != SIZES[0]:
+        raise ValueError("A forked process should start its own workers.")
+    clearAllTables()
+    print "4. Forked processes start their own worker threads."
+
+
+def onEveryBackend(test):
+    """Runs a test on each backend."""
+    directory = tempfile.mkdtemp()
+    try:
+        tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+        for backend in ['postgresql', 'memory', 'sqlite']:
+            useBackend(backend)
+            try:
+                test()
+            except psycopg2.OperationalError:
+                print "PostgreSQL is not available; skipping it."
+    finally:
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    backend = tournament.BACKEND
+    try:
+        testEveryFunction()
+        onEveryBackend(testSameResults)
+        print "2. Non-blocking calls give the same results as blocking ones."
+        testCallsOverlap()
+        testForkedProcesses()
+        testConcurrentWrites()
+    finally:
+        useBackend(backend)
+        tournament_async.shutdown()
+    print "Success!  All tests pass!"
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+# Test cases shared by the tournament backends
+#
+# Plays the same seeded tournament, with draws and byes, on PostgreSQL, in
+# memory and on SQLite, and checks that every backend pairs each round and
+# ranks the players in exactly the same way.  PostgreSQL is skipped if the
+# database cannot be reached.  Like extra_credit_tests.py, this empties the
+# tables of each backend first.
+
+import os
+import random
+import shutil
+import tempfile
+
+import psycopg2
+
+import tiebreak
+import tournament
+from tournament import *
+
+PLAYERS = 13
+ROUNDS = 6
+
+# More players than the 999 host parameters of older SQLite builds
+LARGE_ROUND = 1200
+
+
+def clearAllTables():
+    """Empties all tables of the selected backend."""
+    deleteMatches()
+    deleteCompetitors()
+    deleteTournaments()
+    deletePlayers()
+
+
+def playTournament(seed):
+    """Plays a seeded tournament on the selected backend.  Returns the
+    pairings and standings after every round, with players numbered in
+    registration order so that backends can be compared."""
+    clearAllTables()
+    createTournament("Backend test")
+    dbconnection = connect()
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("SELECT id FROM tournaments;")
+    tournament_id = dbcursor.fetchall()[0][0]
+    dbconnection.close()
+
+    player_ids = registerPlayers(["Backend test player %d" % n
+                                  for n in range(PLAYERS)], tournament_id)
+    positions = dict((player_id, position)
+                     for (position, player_id) in enumerate(player_ids))
+    rng = random.Random(seed)
+    history = []
+    for roundNumber in range(ROUNDS):
+        pairings = swissPairings(tournament_id)
+        results = []
+        for (id1, name1, id2, name2) in pairings:
+            outcome = rng.random()
+            if outcome < 0.2:
+                results.append((id1, id2, None, True))
+            else:
+                winner = id1 if outcome < 0.6 else id2
+                results.append((id1, id2, winner, False))
+        # Every other round is reported in one call
+        if roundNumber % 2:
+            reportMatches(tournament_id, results)
+        else:
+            for result in results:
+                reportMatch(tournament_id, *result)
+        if standingsDifferences(tournament_id):
+            raise ValueError(BACKEND + " standings should match its "
+                             "matches after round " + str(roundNumber + 1))
+        history.append((
+            [(positions[id1], positions[id2])
+             for (id1, name1, id2, name2) in pairings],
+            [(positions[row[0]],) + tuple(row[2:])
+             for row in playerStandings(tournament_id)],
+            [(positions[row[0]],) + tuple(row[2:])
+             for row in rankedStandings(tournament_id,
+                                        sorted(tiebreak.TIEBREAKS))]))
+    return history
+
+
+def playOnEveryBackend(seed):
+    """Plays the seeded tournament on each backend.  Returns a dict of
+    histories keyed by backend name."""
+    histories = {}
+    directory = tempfile.mkdtemp()
+    try:
+        try:
+            useBackend('postgresql')
+            histories['postgresql'] = playTournament(seed)
+        except psycopg2.OperationalError:
+            print "PostgreSQL is not available; skipping it."
+
+        useBackend('memory')
+        histories['memory'] = playTournament(seed)
+
+        tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+        useBackend('sqlite')
+        histories['sqlite'] = playTournament(seed)
+    finally:
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        shutil.rmtree(directory)
+    return histories
+
+
+def testSameHistory():
+    for seed in range(3):
+        histories = playOnEveryBackend(seed)
+        expected = histories['memory']
+        for backend, history in sorted(histories.iteritems()):
+            for roundNumber in range(ROUNDS):
+                if history[roundNumber][0] != expected[roundNumber][0]:
+                    raise ValueError(backend + " pairs round " +
+                                     str(roundNumber + 1) + " differently.")
+                if history[roundNumber][1:] != expected[roundNumber][1:]:
+                    raise ValueError(backend + " ranks players differently "
+                                     "after round " + str(roundNumber + 1))
+    print "1. Every backend gives the same pairings and standings for the " \
+          "same results."
+
+
+def testByes():
+    byes = [row for row in playOnEveryBackend(0)['sqlite'][-1][1] if row[1]]
+    if len(byes) != ROUNDS:
+        raise ValueError("Each round of an odd-sized tournament should give "
+                         "one player a bye.")
+    print "2. Byes are handed out once per player on every backend."
+
+
+def testLargeRound():
+    directory = tempfile.mkdtemp()
+    try:
+        tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+        for backend in ['postgresql', 'memory', 'sqlite']:
+            useBackend(backend)
+            try:
+                clearAllTables()
+            except psycopg2.OperationalError:
+                print "PostgreSQL is not available; skipping it."
+                continue
+            createTournament("Large round")
+            dbconnection = connect()
+            dbcursor = dbconnection.cursor()
+            dbcursor.execute("SELECT id FROM tournaments;")
+            tournament_id = dbcursor.fetchall()[0][0]
+            dbconnection.close()
+            player_ids = registerPlayers(["Large round player %d" % n
+                                          for n in range(LARGE_ROUND)],
+                                         tournament_id)
+            reportMatches(tournament_id,
+                          [(id1, id2, id1, False) for (id1, id2)
+                           in zip(player_ids[::2], player_ids[1::2])])
+            if sum(row[3] for row in playerStandings(tournament_id)) != \
+                    LARGE_ROUND / 2:
+                raise ValueError(backend + " should record a round of " +
+                                 str(LARGE_ROUND) + " players.")
+    finally:
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        shutil.rmtree(directory)
+    print "3. A round of more players than older SQLite builds take as " \
+          "parameters is recorded."
+
+
+if __name__ == '__main__':
+    backend = tournament.BACKEND
+    try:
+        testSameHistory()
+        testByes()
+        testLargeRound()
+    finally:
+        useBackend(backend)
+    print "Success!  All tests pass!"
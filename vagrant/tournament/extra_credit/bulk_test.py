@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#
+# Test cases for the bulk APIs in tournament.py
+#
+# Uses a scratch tournament, which is deleted afterwards.
+
+import os
+import tempfile
+
+from tournament import *
+
+
+def createScratchTournament(playerCount):
+    """Creates a tournament of new players.  Returns (tournament_id,
+    player_ids)."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""INSERT INTO tournaments (name)
+                            VALUES ('Bulk test') RETURNING id;""")
+        tournament_id = dbcursor.fetchone()[0]
+        dbcursor.execute("""INSERT INTO players (name)
+                            SELECT 'Bulk test player ' || n
+                            FROM generate_series(1, %s) AS n
+                            RETURNING id;""",
+                         (playerCount,))
+        player_ids = [row[0] for row in dbcursor.fetchall()]
+    for player_id in player_ids:
+        registerCompetitor(tournament_id, player_id)
+    return tournament_id, player_ids
+
+
+def dropScratchTournament(tournament_id, player_ids):
+    """Deletes everything createScratchTournament() made."""
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM matches WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM competitors WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM tournaments WHERE id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM players WHERE id = ANY(%s);",
+                         (player_ids,))
+
+
+def countMatches(tournament_id):
+    """Returns the number of matches recorded in a tournament."""
+    with transaction() as dbcursor:
+        dbcursor.execute("SELECT COUNT(*) FROM matches "
+                         "WHERE tournament_id = %s;", (tournament_id,))
+        return dbcursor.fetchone()[0]
+
+
+def testReportMatches(tournament_id, player_ids):
+    [id1, id2, id3, id4, id5, id6] = player_ids
+    reportMatches(tournament_id, [(id1, id2, id1, False),
+                                  (id4, id3, None, True),
+                                  (id5, id6, id6, False)])
+    if countMatches(tournament_id) != 3:
+        raise ValueError("reportMatches() should record every match.")
+    standings = dict((row[0], row) for row in playerStandings(tournament_id))
+    if (standings[id1][3] != 1 or standings[id2][3] != 0 or
+            standings[id3][4] != 1 or standings[id4][4] != 1 or
+            standings[id6][3] != 1):
+        raise ValueError("reportMatches() should update the standings.")
+    if standingsDifferences(tournament_id):
+        raise ValueError("The standings table should match the matches "
+                         "table after reportMatches().")
+    print "1. A round of results is recorded in one call."
+
+
+def testReportMatchesIsAllOrNothing(tournament_id, player_ids):
+    [id1, id2, id3, id4, id5, id6] = player_ids
+    before = countMatches(tournament_id)
+    invalidRounds = [
+        # The winner did not play in the match
+        [(id1, id3, id1, False), (id2, id4, id5, False)],
+        # The same pair reported twice
+        [(id1, id3, id1, False), (id3, id1, id3, False)],
+        # A draw with a winner
+        [(id1, id3, id1, True)],
+        # A player who is not a competitor in the tournament
+        [(id1, id3, id1, False), (id2, -1, id2, False)],
+        # A rematch, only caught by the database
+        [(id1, id3, id1, False), (id2, id1, id2, False)],
+    ]
+    for results in invalidRounds:
+        try:
+            reportMatches(tournament_id, results)
+        except (ValueError, psycopg2.IntegrityError):
+            pass
+        else:
+            raise ValueError("reportMatches() should reject " +
+                             repr(results))
+        if countMatches(tournament_id) != before:
+            raise ValueError("reportMatches() should record nothing when a "
+                             "result is rejected.")
+    print "2. A round with an invalid result is rejected as a whole."
+
+
+def testReportMatchesKeepsStandings(tournament_id, player_ids):
+    [id1, id2, id3, id4, id5, id6] = player_ids[:6]
+    # Earlier opponents of the winners gain OMW, id3 plays twice, and id4
+    # has a bye
+    reportMatches(tournament_id, [(id1, id3, id3, False),
+                                  (id3, id6, id3, False),
+                                  (id2, id5, None, True),
+                                  (id4, id4, None, False)])
+    if standingsDifferences(tournament_id):
+        raise ValueError("reportMatches() should update the standings of "
+                         "the winners' earlier opponents.")
+    print "3. A second round of results keeps the standings table correct."
+
+
+def testRegisterPlayers(tournament_id, player_ids):
+    names = ["Bulk test player %d" % n for n in range(25)]
+    names[3] = "O'Malley, \"Tab\"\tand\\backslash"
+    new_ids = registerPlayers(names)
+    player_ids.extend(new_ids)
+    if len(new_ids) != len(names) or len(set(new_ids)) != len(names):
+        raise ValueError("registerPlayers() should return a new id for "
+                         "every name.")
+    with transaction() as dbcursor:
+        dbcursor.execute("SELECT id, name FROM players WHERE id = ANY(%s);",
+                         (new_ids,))
+        stored = dict(dbcursor.fetchall())
+    if [stored[player_id] for player_id in new_ids] != names:
+        raise ValueError("registerPlayers() should return ids in the same "
+                         "order as the names.")
+    print "4. Players are registered in bulk, with ids in input order."
+
+
+def testRegisterPlayersIntoTournament(tournament_id, player_ids):
+    before = len(playerStandings(tournament_id))
+    new_ids = registerPlayers(["Bulk test entrant %d" % n for n in range(7)],
+                              tournament_id)
+    player_ids.extend(new_ids)
+    if len(playerStandings(tournament_id)) != before + 7:
+        raise ValueError("registerPlayers() should register the new players "
+                         "in the tournament.")
+    if standingsDifferences(tournament_id):
+        raise ValueError("Players registered in bulk should have an empty "
+                         "record in the standings table.")
+
+    others = registerPlayers(["Bulk test late %d" % n for n in range(3)])
+    player_ids.extend(others)
+    registerCompetitors(tournament_id, others)
+    if countCompetitors(tournament_id) != before + 10:
+        raise ValueError("registerCompetitors() should register every "
+                         "player.")
+    print "5. Players are registered into a tournament in bulk."
+
+
+def testRegisterPlayersFromCSV(tournament_id, player_ids):
+    handle, filename = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(handle, 'w') as csvfile:
+            csvfile.write('rating,name\n1500,"Bulk test, CSV 1"\n'
+                          '1400,Bulk test CSV 2\n')
+        new_ids = registerPlayersFromCSV(filename)
+    finally:
+        os.remove(filename)
+    player_ids.extend(new_ids)
+    with transaction() as dbcursor:
+        dbcursor.execute("SELECT name FROM players WHERE id = ANY(%s) "
+                         "ORDER BY id;", (new_ids,))
+        names = [row[0] for row in dbcursor.fetchall()]
+    if names != ["Bulk test, CSV 1", "Bulk test CSV 2"]:
+        raise ValueError("registerPlayersFromCSV() should register the "
+                         "names in the file.")
+    print "6. Players are registered from a CSV file."
+
+
+if __name__ == '__main__':
+    tournament_id, player_ids = createScratchTournament(6)
+    try:
+        testReportMatches(tournament_id, player_ids)
+        testReportMatchesIsAllOrNothing(tournament_id, player_ids)
+        testReportMatchesKeepsStandings(tournament_id, player_ids)
+        testRegisterPlayers(tournament_id, player_ids)
+        testRegisterPlayersIntoTournament(tournament_id, player_ids)
+        testRegisterPlayersFromCSV(tournament_id, player_ids)
+    finally:
+        dropScratchTournament(tournament_id, player_ids)
+    print "Success!  All tests pass!"
@@ -0,0 +1,133 @@
+#
+# cache.py -- read-through cache of playerStandings() results
+#
+# While a StandingsCache is enabled, playerStandings() answers from memory
+# whenever it can.  Each tournament has a version, which every tournament
+# function that changes its standings bumps once it has written them.  A
+# cached result is only served while the version it was read at is still
+# current, so a read that races a write never stores the older standings
+# as current.  Results are evicted least recently used first, once the
+# cache holds more standings rows than it is allowed.
+#
+# The cache only sees writes made through the tournament functions of this
+# process.  Where other processes write to the same database, give it a
+# 'maxAge' to bound how stale a result can be.
+#
+# While no cache is enabled, playerStandings() only checks that 'enabled'
+# is None.
+#
+
+import collections
+import threading
+import time
+
+# The cache playerStandings() reads through, or None while disabled
+enabled = None
+
+# How many standings rows a StandingsCache holds by default
+DEFAULT_MAX_ROWS = 100000
+
+
+class StandingsCache(object):
+    """A bounded LRU cache of standings, keyed by tournament, that counts
+    its hits and misses."""
+
+    def __init__(self, maxRows=DEFAULT_MAX_ROWS, maxAge=None):
+        """
+        Args:
+          maxRows: the most standings rows to hold across every tournament.
+                   Standings with more rows than this are never cached
+          maxAge: if given, the number of seconds a result is served for
+        """
+        self.maxRows = maxRows
+        self.maxAge = maxAge
+        self._lock = threading.Lock()
+
+        # Bumped by clear(), so that reads begun before it are not stored
+        self._generation = 0
+        self._versions = {}
+
+        # (version, time read, rows) tuples keyed by tournament id, least
+        # recently used first
+        self._entries = collections.OrderedDict()
+        self._rows = 0
+        self._hits = 0
+        self._misses = 0
+
+    def read(self, tournament_id, load):
+        """Returns a tournament's standings from the cache, or from
+        load(tournament_id) if they are not cached, caching them."""
+        with self._lock:
+            version = (self._generation, self._versions.get(tournament_id, 0))
+            entry = self._entries.pop(tournament_id, None)
+            if entry is not None and entry[0] == version and \
+                    (self.maxAge is None or
+                     time.time() - entry[1] < self.maxAge):
+                self._entries[tournament_id] = entry
+                self._hits += 1
+                return list(entry[2])
+            if entry is not None:
+                self._rows -= len(entry[2])
+            self._misses += 1
+
+        readAt = time.time()
+        rows = tuple(load(tournament_id))
+        with self._lock:
+            # Anything written since the read began bumped the version
+            if version == (self._generation,
+                           self._versions.get(tournament_id, 0)) and \
+                    tournament_id not in self._entries and \
+                    len(rows) <= self.maxRows:
+                self._entries[tournament_id] = (version, readAt, rows)
+                self._rows += len(rows)
+                while self._rows > self.maxRows:
+                    oldest, entry = self._entries.popitem(last=False)
+                    self._rows -= len(entry[2])
+        return list(rows)
+
+    def invalidate(self, tournament_id):
+        """Bumps a tournament's version, dropping its cached standings."""
+        with self._lock:
+            self._versions[tournament_id] = \
+                self._versions.get(tournament_id, 0) + 1
+            entry = self._entries.pop(tournament_id, None)
+            if entry is not None:
+                self._rows -= len(entry[2])
+
+    def clear(self):
+        """Drops the cached standings of every tournament."""
+        with self._lock:
+            self._generation += 1
+            self._versions = {}
+            self._entries.clear()
+            self._rows = 0
+
+    def snapshot(self):
+        """Returns a dict of the cache's 'hits' and 'misses' so far, and
+        the 'entries' and 'rows' it holds."""
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses,
+                    'entries': len(self._entries), 'rows': self._rows}
+
+
+def enable(cache=None):
+    """Starts caching playerStandings() results.
+
+    Args:
+      cache: the StandingsCache to read through; a new one holding
+             DEFAULT_MAX_ROWS rows if not given
+
+    Returns:
+      The cache.
+    """
+    global enabled
+    if cache is None:
+        cache = StandingsCache()
+    enabled = cache
+    return cache
+
+
+def disable():
+    """Stops caching playerStandings() results."""
+    global enabled
+    enabled = None
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+#
+# Test cases for cache.py and the cached playerStandings()
+#
+# The database tests run on PostgreSQL, in memory and on SQLite.
+# PostgreSQL is skipped if the database cannot be reached.  Like
+# extra_credit_tests.py, this empties the tables of each backend first.
+
+import os
+import shutil
+import tempfile
+import time
+
+import psycopg2
+
+import cache
+import tournament
+from tournament import *
+
+PLAYERS = 6
+
+
+def clearAllTables():
+    """Empties all tables of the selected backend."""
+    deleteMatches()
+    deleteCompetitors()
+    deleteTournaments()
+    deletePlayers()
+
+
+def newTournament():
+    """Creates a tournament of PLAYERS new players on the selected backend.
+    Returns its id."""
+    createTournament("Cache test")
+    dbconnection = connect()
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("SELECT id FROM tournaments;")
+    tournament_id = max(row[0] for row in dbcursor.fetchall())
+    dbconnection.close()
+    registerPlayers(["Cache test player %d" % n for n in range(PLAYERS)],
+                    tournament_id)
+    return tournament_id
+
+
+def uncachedStandings(tournament_id):
+    """Returns a tournament's standings without reading through the
+    cache."""
+    standingsCache = cache.enabled
+    cache.disable()
+    try:
+        return playerStandings(tournament_id)
+    finally:
+        cache.enable(standingsCache)
+
+
+def testHitsAndMisses():
+    clearAllTables()
+    standingsCache = cache.enable()
+    tournament_id = newTournament()
+    standings = playerStandings(tournament_id)
+    if playerStandings(tournament_id) != standings or \
+            standings != uncachedStandings(tournament_id):
+        raise ValueError("Cached standings should be the standings.")
+    playerStandings(tournament_id).reverse()
+    if playerStandings(tournament_id) != standings:
+        raise ValueError("Changing a returned list should not change the "
+                         "cached one.")
+    counts = standingsCache.snapshot()
+    if (counts['hits'], counts['misses'], counts['entries'],
+            counts['rows']) != (3, 1, 1, PLAYERS):
+        raise ValueError("Reads should be counted as hits and misses: %r" %
+                         counts)
+
+
+def testWritesInvalidate():
+    clearAllTables()
+    standingsCache = cache.enable()
+    tournament_id = newTournament()
+    other_id = newTournament()
+    playerStandings(other_id)
+    player_ids = [row[0] for row in playerStandings(tournament_id)]
+    writes = [
+        lambda: reportMatch(tournament_id, player_ids[0], player_ids[1],
+                            player_ids[0], False),
+        lambda: reportMatches(tournament_id, [(player_ids[2], player_ids[3],
+                                               None, True)]),
+        lambda: useCompetitorBye(tournament_id, player_ids[4]),
+        lambda: registerPlayers(["Late entry"], tournament_id=tournament_id),
+        lambda: swissPairings(tournament_id),
+        lambda: rebuildStandings(),
+        lambda: deleteMatches(),
+    ]
+    for write in writes:
+        playerStandings(tournament_id)
+        write()
+        if playerStandings(tournament_id) != \
+                uncachedStandings(tournament_id):
+            raise ValueError("Cached standings should be dropped by every "
+                             "write.")
+    misses = standingsCache.snapshot()['misses']
+    playerStandings(other_id)
+    registerPlayers(["Unregistered"])
+    playerStandings(other_id)
+    playerStandings(tournament_id)
+    if standingsCache.snapshot()['misses'] != misses + 1:
+        raise ValueError("Writes should only drop the standings they "
+                         "change.")
+
+
+def testBoundedSize():
+    standingsCache = cache.StandingsCache(maxRows=5)
+    for tournament_id in [1, 2, 3, 2, 4]:
+        standingsCache.read(tournament_id, lambda tid: [(tid,)] * 2)
+    standingsCache.read(5, lambda tid: [(tid,)] * 10)
+    counts = standingsCache.snapshot()
+    if (counts['entries'], counts['rows']) != (2, 4):
+        raise ValueError("The cache should stay within its size: %r" %
+                         counts)
+    if standingsCache.read(2, lambda tid: []) != [(2,), (2,)] or \
+            standingsCache.read(3, lambda tid: []) != []:
+        raise ValueError("The least recently used standings should be "
+                         "evicted first.")
+    print "3. The least recently used standings are evicted to bound size."
+
+
+def testRacingWrite():
+    standingsCache = cache.StandingsCache()
+
+    def loadDuringWrite(tournament_id):
+        standingsCache.invalidate(tournament_id)
+        return [("stale",)]
+    standingsCache.read(1, loadDuringWrite)
+    if standingsCache.read(1, lambda tid: [("fresh",)]) != [("fresh",)]:
+        raise ValueError("Standings read while they were being written "
+                         "should not be cached.")
+
+    standingsCache = cache.StandingsCache(maxAge=0.05)
+    standingsCache.read(1, lambda tid: [("old",)])
+    time.sleep(0.1)
+    if standingsCache.read(1, lambda tid: [("new",)]) != [("new",)]:
+        raise ValueError("Standings should not be served past maxAge.")
+    print "4. Reads racing a write, or past their age, are not served."
+
+
+def onEveryBackend(test):
+    """Runs a test on each backend."""
+    directory = tempfile.mkdtemp()
+    standingsCache = cache.enabled
+    try:
+        tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+        for backend in ['postgresql', 'memory', 'sqlite']:
+            useBackend(backend)
+            try:
+                test()
+            except psycopg2.OperationalError:
+                print "PostgreSQL is not available; skipping it."
+    finally:
+        if standingsCache is None:
+            cache.disable()
+        else:
+            cache.enable(standingsCache)
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    backend = tournament.BACKEND
+    try:
+        onEveryBackend(testHitsAndMisses)
+        print "1. Standings are read through the cache, counting hits."
+        onEveryBackend(testWritesInvalidate)
+        print "2. Writes drop the cached standings they change."
+    finally:
+        useBackend(backend)
+    testBoundedSize()
+    testRacingWrite()
+    print "Success!  All tests pass!"
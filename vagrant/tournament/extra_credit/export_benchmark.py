@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#
+# Benchmark for streaming standings with exportStandings()
+#
+# Registers a scratch tournament of many players, then exports its
+# standings as CSV and JSON and reads them with playerStandings(), reporting
+# the time each takes and how far each raises the process's peak memory.
+# The streaming exports run first, as the peak only ever rises.  The
+# scratch tournament and its players are deleted afterwards.
+
+import argparse
+import os
+import resource
+import time
+
+from tournament import *
+
+
+def peakMemory():
+    """Returns the process's peak resident memory so far, in kilobytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(label, function):
+    """Runs function() and prints how long it took and how far it raised
+    peak memory."""
+    before = peakMemory()
+    start = time.time()
+    function()
+    print "%-16s %8.3f s %10d KB" % (label, time.time() - start,
+                                      peakMemory() - before)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares streaming and reading whole standings.")
+    parser.add_argument('--players', type=int, default=100000)
+    args = parser.parse_args()
+
+    with transaction() as dbcursor:
+        dbcursor.execute("""INSERT INTO tournaments (name)
+                            VALUES ('Export benchmark') RETURNING id;""")
+        tournament_id = dbcursor.fetchone()[0]
+    player_ids = registerPlayers(("Benchmark player %d" % n
+                                  for n in xrange(args.players)),
+                                 tournament_id)
+    try:
+        print "%d players" % args.players
+        with open(os.devnull, 'w') as devnull:
+            measure("Export CSV",
+                    lambda: exportStandings(tournament_id, devnull))
+            measure("Export JSON",
+                    lambda: exportStandings(tournament_id, devnull, 'json'))
+        measure("playerStandings", lambda: playerStandings(tournament_id))
+    finally:
+        with transaction() as dbcursor:
+            dbcursor.execute("""DELETE FROM competitors
+                                WHERE tournament_id = %s;""",
+                             (tournament_id,))
+            dbcursor.execute("DELETE FROM tournaments WHERE id = %s;",
+                             (tournament_id,))
+            dbcursor.execute("DELETE FROM players WHERE id = ANY(%s);",
+                             (player_ids,))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+#
+# Query plan regression tests for the matches indexes in tournament.sql
+#
+# Fills the database with many scratch tournaments, so that a single
+# tournament is a small slice of the matches table, and checks that the
+# standings and havePlayedPreviously() queries reach matches through an
+# index rather than a sequential scan.  The scratch data is deleted
+# afterwards.
+
+import json
+
+from tournament import *
+
+# Realistic table sizes: 100 tournaments of 64 players, each of whom has
+# played the next five players in their tournament (about 30,000 matches)
+TOURNAMENTS = 100
+PLAYERS_PER_TOURNAMENT = 64
+OPPONENTS_PER_PLAYER = 5
+
+
+def createScratchData():
+    """Creates the scratch tournaments.  Returns a list of their ids."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""INSERT INTO tournaments (name)
+                            SELECT 'Index test ' || n
+                            FROM generate_series(1, %s) AS n
+                            RETURNING id;""",
+                         (TOURNAMENTS,))
+        tournament_ids = [row[0] for row in dbcursor.fetchall()]
+        for tournament_id in tournament_ids:
+            dbcursor.execute("""INSERT INTO players (name)
+                                SELECT 'Index test player ' || n
+                                FROM generate_series(1, %s) AS n
+                                RETURNING id;""",
+                             (PLAYERS_PER_TOURNAMENT,))
+            dbcursor.execute("""INSERT INTO competitors (tournament_id,
+                                competitor_id, competitor_bye)
+                                SELECT %s, id, False FROM players
+                                WHERE id = ANY(%s);""",
+                             (tournament_id,
+                              [row[0] for row in dbcursor.fetchall()],))
+        dbcursor.execute("""INSERT INTO matches (tournament_id, player_1_id,
+                            player_2_id, winner_id, draw)
+                            SELECT  c1.tournament_id, c1.competitor_id,
+                                    c2.competitor_id, c2.competitor_id,
+                                    False
+                            FROM    competitors c1 INNER JOIN competitors c2
+                                    ON (c1.tournament_id = c2.tournament_id
+                                        AND c2.competitor_id BETWEEN
+                                            c1.competitor_id + 1 AND
+                                            c1.competitor_id + %s)
+                            WHERE   c1.tournament_id = ANY(%s);""",
+                         (OPPONENTS_PER_PLAYER, tournament_ids,))
+        dbcursor.execute("ANALYZE matches;")
+        dbcursor.execute("ANALYZE competitors;")
+        dbcursor.execute("ANALYZE players;")
+    return tournament_ids
+
+
+def dropScratchData(tournament_ids):
+    """Deletes everything createScratchData() made."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""DELETE FROM matches
+                            WHERE tournament_id = ANY(%s);""",
+                         (tournament_ids,))
+        dbcursor.execute("""DELETE FROM competitors
+                            WHERE tournament_id = ANY(%s)
+                            RETURNING competitor_id;""",
+                         (tournament_ids,))
+        player_ids = [row[0] for row in dbcursor.fetchall()]
+        dbcursor.execute("DELETE FROM tournaments WHERE id = ANY(%s);",
+                         (tournament_ids,))
+        dbcursor.execute("DELETE FROM players WHERE id = ANY(%s);",
+                         (player_ids,))
+
+
+def matchesScans(query, params):
+    """Returns a (node type, index condition) tuple for every plan node that
+    reads the matches table when 'query' is run with 'params'."""
+    with transaction() as dbcursor:
+        dbcursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        plan = dbcursor.fetchone()[0]
+    if isinstance(plan, basestring):
+        plan = json.loads(plan)
+
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        children = node.get('Plans', [])
+        if node.get('Relation Name') == 'matches':
+            # A bitmap heap scan's index condition is on its bitmap index
+            # scan child
+            condition = node.get('Index Cond', '')
+            for child in children:
+                condition += child.get('Index Cond', '')
+            scans.append((node['Node Type'], condition))
+        nodes.extend(children)
+    return scans
+
+
+def assertIndexScans(scans, description, column=None):
+    """Raises ValueError unless every scan of matches uses an index, with
+    'column' in its index condition if given."""
+    if not scans:
+        raise ValueError(description + " should read the matches table.")
+    for (scan, condition) in scans:
+        if scan not in ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'):
+            raise ValueError(description + " reads matches with a " + scan +
+                             " instead of an index scan.")
+        if column is not None and column not in condition:
+            raise ValueError(description + " does not use an index on " +
+                             column + ".")
+
+
+def testStandingsUseIndexes(tournament_id):
+    scans = matchesScans(STANDINGS_QUERY, {'tournament_id': tournament_id})
+    assertIndexScans(scans, "The standings query")
+    print "1. The standings query reads matches through indexes."
+
+
+def testPlayedPreviouslyUsesIndexes(tournament_id):
+    with transaction() as dbcursor:
+        dbcursor.execute("""SELECT player_1_id, player_2_id FROM matches
+                            WHERE tournament_id = %s LIMIT 1;""",
+                         (tournament_id,))
+        player1, player2 = dbcursor.fetchone()
+    scans = matchesScans(PLAYED_PREVIOUSLY_QUERY,
+                         (tournament_id, player1, player2,))
+    assertIndexScans(scans, "havePlayedPreviously()", 'player_2_id')
+    print "2. havePlayedPreviously() reads matches through an index."
+
+
+def testWinnerLookupsUseIndexes(tournament_id):
+    with transaction() as dbcursor:
+        dbcursor.execute("""SELECT competitor_id FROM competitors
+                            WHERE tournament_id = %s LIMIT 1;""",
+                         (tournament_id,))
+        player_id = dbcursor.fetchone()[0]
+    for column in ('winner_id', 'player_2_id'):
+        scans = matchesScans("""SELECT COUNT(*) FROM matches
+                                WHERE tournament_id = %s AND
+                                      """ + column + """ = %s;""",
+                             (tournament_id, player_id,))
+        assertIndexScans(scans, "Looking up matches by " + column, column)
+    print "3. Matches are looked up by winner and player_2_id through " \
+          "indexes."
+
+
+if __name__ == '__main__':
+    tournament_ids = createScratchData()
+    try:
+        middle = tournament_ids[len(tournament_ids) // 2]
+        testStandingsUseIndexes(middle)
+        testPlayedPreviouslyUsesIndexes(middle)
+        testWinnerLookupsUseIndexes(middle)
+    finally:
+        dropScratchData(tournament_ids)
+    print "Success!  All tests pass!"
@@ -0,0 +1,649 @@
+#
+# memory_backend.py -- in-memory storage for the tournament functions
+#
+# Keeps players, tournaments, competitors and matches in Python objects
+# instead of PostgreSQL, for simulations and tests that need thousands of
+# rounds per second.  Select it with TOURNAMENT_BACKEND=memory, or at runtime
+# with tournament.useBackend('memory').
+#
+# The data mirrors tournament.sql: ids are handed out like serial columns,
+# a pair of players can only meet once per tournament, rows that are still
+# referenced cannot be deleted, and every competitor carries a running
+# record that is updated as matches are reported, like the standings table.
+# Nothing is persisted; each MemoryBackend starts empty.
+#
+
+import array
+import functools
+import re
+import threading
+
+import pairing
+
+# The columns of each table, in the order tournament.sql creates them
+TABLES = {
+    'players': ('id', 'name'),
+    'tournaments': ('id', 'name'),
+    'competitors': ('tournament_id', 'competitor_id', 'competitor_bye'),
+    'matches': ('tournament_id', 'player_1_id', 'player_2_id', 'winner_id',
+                'draw', 'id'),
+    'standings': ('tournament_id', 'player_id', 'bye', 'wins', 'draws',
+                  'omw', 'matches'),
+    'rounds': ('tournament_id', 'round', 'bye_id'),
+    'pairings': ('tournament_id', 'round', 'board', 'player_1_id',
+                 'player_2_id'),
+    'ratings': ('player_id', 'rating', 'deviation', 'volatility', 'matches'),
+}
+
+# The only statements MemoryCursor understands
+SELECT_PATTERN = re.compile(r'^\s*SELECT\s+(?P<columns>\*|\w+(\s*,\s*\w+)*)'
+                            r'\s+FROM\s+(?P<table>\w+)\s*;?\s*$',
+                            re.IGNORECASE)
+
+# Stored in place of a missing winner, as ids start at 1
+NO_WINNER = 0
+
+
+def _locked(method):
+    """Runs a MemoryBackend method while holding the backend's lock, so
+    calls from several threads see and leave the data consistent."""
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class Competitor(object):
+    """A player's running record in one tournament."""
+
+    __slots__ = ('id', 'bye', 'wins', 'draws', 'omw', 'matches', 'opponents')
+
+    def __init__(self, competitor_id):
+        self.id = competitor_id
+        self.bye = False
+        self.reset()
+
+    def reset(self):
+        """Clears the record, as if no matches had been played."""
+        self.wins = 0
+        self.draws = 0
+        self.omw = 0
+        self.matches = 0
+        self.opponents = array.array('l')
+
+    def standingsRow(self, name):
+        """Returns the record as a playerStandings() row."""
+        return (self.id, name, self.bye, self.wins, self.draws, self.omw,
+                self.matches)
+
+
+class Tournament(object):
+    """A tournament, its competitors and its matches.
+
+    Matches are stored column by column in arrays, in the order they were
+    reported, each with an id numbering it among the matches of every
+    tournament.  Each round created by createRound() is stored as a (bye_id,
+    pairings) tuple, with the pairings as (player_1_id, player_2_id) tuples
+    in board order.
+    """
+
+    __slots__ = ('id', 'name', 'competitors', 'played', 'player1s',
+                 'player2s', 'winners', 'draws', 'ids', 'rounds')
+
+    def __init__(self, tournament_id, name):
+        self.id = tournament_id
+        self.name = name
+        self.competitors = {}
+        self.clearMatches()
+
+    def clearMatches(self):
+        """Forgets every match and round, and resets every competitor's
+        record."""
+        self.rounds = []
+        self.played = set()
+        self.player1s = array.array('l')
+        self.player2s = array.array('l')
+        self.winners = array.array('l')
+        self.draws = array.array('b')
+        self.ids = array.array('l')
+        for competitor in self.competitors.itervalues():
+            competitor.reset()
+
+    def matchRows(self):
+        """Yields every match as a (player_1_id, player_2_id, winner_id,
+        draw) tuple."""
+        for index in xrange(len(self.player1s)):
+            winner = self.winners[index]
+            yield (self.player1s[index], self.player2s[index],
+                   None if winner == NO_WINNER else winner,
+                   bool(self.draws[index]))
+
+
+class MemoryBackend(object):
+    """Stores tournament data in memory.
+
+    Has a method for each tournament function that touches the database,
+    taking the same arguments and returning the same results.
+    """
+
+    def __init__(self):
+        self._players = {}
+        self._tournaments = {}
+        self._lastPlayerId = 0
+        self._lastTournamentId = 0
+        self._lastMatchId = 0
+
+        # (rating, deviation, volatility, matches) tuples keyed by player id
+        self._ratings = {}
+
+        # Held by every method that reads or changes the data, as callers
+        # such as tournament_async.py share a backend between threads.  It
+        # is also held while a round is created or ratings are updated, as
+        # PostgreSQL's advisory locks are.
+        self._lock = threading.RLock()
+
+    def connect(self):
+        """Returns a MemoryConnection, which can read whole tables."""
+        return MemoryConnection(self)
+
+    @_locked
+    def deleteMatches(self):
+        for tournament in self._tournaments.itervalues():
+            tournament.clearMatches()
+
+    @_locked
+    def deleteCompetitors(self):
+        for tournament in self._tournaments.itervalues():
+            tournament.competitors.clear()
+
+            # Pairings are deleted with the competitors they pair
+            tournament.rounds = [(bye_id, [])
+                                 for (bye_id, pairings) in tournament.rounds]
+
+    @_locked
+    def deleteTournaments(self):
+        for tournament in self._tournaments.itervalues():
+            if tournament.competitors or tournament.player1s:
+                raise ValueError("Tournament %s still has competitors or "
+                                 "matches" % tournament.id)
+        self._tournaments.clear()
+
+    @_locked
+    def deletePlayers(self):
+        for tournament in self._tournaments.itervalues():
+            if tournament.competitors or tournament.player1s:
+                raise ValueError("Players are still competitors in, or have "
+                                 "matches in, tournament %s" % tournament.id)
+        self._players.clear()
+        self._ratings.clear()
+
+    @_locked
+    def countCompetitors(self, tournament_id):
+        tournament = self._tournaments.get(tournament_id)
+        if tournament is None:
+            return 0
+        return len(tournament.competitors)
+
+    @_locked
+    def createTournament(self, name):
+        self._lastTournamentId += 1
+        self._tournaments[self._lastTournamentId] = Tournament(
+            self._lastTournamentId, name)
+
+    @_locked
+    def registerPlayer(self, name):
+        self._lastPlayerId += 1
+        self._players[self._lastPlayerId] = name
+
+    @_locked
+    def registerPlayers(self, names, tournament_id=None):
+        if tournament_id is not None:
+            self._tournament(tournament_id)
+        player_ids = []
+        for name in names:
+            self.registerPlayer(name)
+            player_ids.append(self._lastPlayerId)
+        if tournament_id is not None:
+            self.registerCompetitors(tournament_id, player_ids)
+        return player_ids
+
+    def registerCompetitor(self, tournament_id, competitor_id):
+        self.registerCompetitors(tournament_id, [competitor_id])
+
+    @_locked
+    def registerCompetitors(self, tournament_id, competitor_ids):
+        tournament = self._tournament(tournament_id)
+
+        # Check every player before registering any of them.  A row fetched
+        # from a cursor may be passed as it is, as psycopg2 also accepts it.
+        competitor_ids = [competitor_id[0]
+                          if isinstance(competitor_id, tuple)
+                          else competitor_id
+                          for competitor_id in competitor_ids]
+        if len(set(competitor_ids)) != len(competitor_ids):
+            raise ValueError("A player is registered more than once")
+        for competitor_id in competitor_ids:
+            if competitor_id not in self._players:
+                raise ValueError("Player %s does not exist" % competitor_id)
+            if competitor_id in tournament.competitors:
+                raise ValueError("Player %s is already a competitor in "
+                                 "tournament %s" %
+                                 (competitor_id, tournament_id))
+
+        for competitor_id in competitor_ids:
+            tournament.competitors[competitor_id] = Competitor(competitor_id)
+
+    @_locked
+    def useCompetitorBye(self, tournament_id, competitor_id):
+        tournament = self._tournaments.get(tournament_id)
+        if tournament is not None and competitor_id in tournament.competitors:
+            tournament.competitors[competitor_id].bye = True
+
+    @_locked
+    def playerStandings(self, tournament_id):
+        tournament = self._tournaments.get(tournament_id)
+        if tournament is None:
+            return []
+        competitors = sorted(tournament.competitors.itervalues(),
+                             key=lambda competitor: (
+                                 -competitor.wins, -competitor.draws,
+                                 -competitor.omw, -competitor.matches,
+                                 competitor.id))
+        return [competitor.standingsRow(self._players[competitor.id])
+                for competitor in competitors]
+
+    def streamStandings(self, tournament_id, page_size):
+        """Yields the rows of tournament.iterStandings(), which are in
+        memory already."""
+        for row in self.playerStandings(tournament_id):
+            yield row
+
+    def reportMatch(self, tournament_id, player_1_id, player_2_id, winner,
+                    draw):
+        player1ID = min(player_1_id, player_2_id)
+        player2ID = max(player_1_id, player_2_id)
+        self.insertMatches(tournament_id,
+                           [(tournament_id, player1ID, player2ID, winner,
+                             draw)],
+                           set([player1ID, player2ID]))
+
+    @_locked
+    def insertMatches(self, tournament_id, rows, players):
+        """Records matches already checked by tournament.reportMatches(), as
+        (tournament_id, player_1_id, player_2_id, winner, draw) rows with the
+        lowest player id first."""
+        tournament = self._tournament(tournament_id)
+        # Everything is checked before anything changes, so a rejected call
+        # records nothing, as a rolled back transaction would
+        winners = set(row[3] for row in rows if row[3] is not None)
+        missing = (players | winners) - set(tournament.competitors)
+        if missing:
+            raise ValueError("Players %s are not competitors in tournament "
+                             "%s" % (sorted(missing), tournament_id))
+        pairs = set()
+        for row in rows:
+            if (row[1], row[2]) in tournament.played or \
+                    (row[1], row[2]) in pairs:
+                raise ValueError("Match %s vs. %s has already been played" %
+                                 (row[1], row[2]))
+            pairs.add((row[1], row[2]))
+
+        for (tournament_id, player1, player2, winner, draw) in rows:
+            tournament.played.add((player1, player2))
+            tournament.player1s.append(player1)
+            tournament.player2s.append(player2)
+            tournament.winners.append(NO_WINNER if winner is None
+                                      else winner)
+            tournament.draws.append(1 if draw else 0)
+            self._lastMatchId += 1
+            tournament.ids.append(self._lastMatchId)
+            self._recordStandings(tournament, player1, player2, winner, draw)
+
+    def _recordStandings(self, tournament, player1, player2, winner, draw):
+        """Updates the competitors' records for a match, as
+        tournament._recordStandings() does for the standings table."""
+        competitors = tournament.competitors
+        first = competitors[player1]
+        second = competitors[player2]
+
+        # A bye lists the same player twice, but counts once
+        for competitor in set([first, second]):
+            competitor.matches += 1
+            if draw:
+                competitor.draws += 1
+
+        if winner is not None:
+            winning = competitors[winner]
+            winning.wins += 1
+
+            # The winner's earlier opponents each gain one OMW
+            for opponent_id in winning.opponents:
+                if opponent_id not in (player1, player2):
+                    competitors[opponent_id].omw += 1
+
+        if player1 != player2:
+            # Each player's OMW gains their new opponent's wins, this one
+            # included
+            first.opponents.append(player2)
+            second.opponents.append(player1)
+            first.omw += second.wins
+            second.omw += first.wins
+
+    @_locked
+    def rebuildStandings(self, tournament_id=None):
+        if tournament_id is None:
+            tournaments = self._tournaments.values()
+        else:
+            tournaments = [self._tournament(tournament_id)]
+        for tournament in tournaments:
+            for competitor_id, record in self._computeStandings(
+                    tournament).iteritems():
+                competitor = tournament.competitors[competitor_id]
+                (competitor.wins, competitor.draws, competitor.omw,
+                 competitor.matches, competitor.opponents) = record
+
+    @_locked
+    def standingsDifferences(self, tournament_id):
+        tournament = self._tournament(tournament_id)
+        computed = self._computeStandings(tournament)
+        differences = []
+        for competitor in tournament.competitors.itervalues():
+            record = computed[competitor.id]
+            maintained = competitor.standingsRow(
+                self._players[competitor.id])
+            expected = (competitor.id, maintained[1], competitor.bye) + \
+                record[:4]
+            if maintained != expected:
+                differences.append((maintained, expected))
+        return sorted(differences)
+
+    def _computeStandings(self, tournament):
+        """Computes every competitor's record from scratch from the matches.
+        Returns a dict of (wins, draws, omw, matches, opponents) tuples keyed
+        by competitor id."""
+        wins = dict.fromkeys(tournament.competitors, 0)
+        draws = dict.fromkeys(tournament.competitors, 0)
+        matches = dict.fromkeys(tournament.competitors, 0)
+        opponents = dict((competitor_id, array.array('l'))
+                         for competitor_id in tournament.competitors)
+        for (player1, player2, winner, draw) in tournament.matchRows():
+            for player in set([player1, player2]):
+                matches[player] += 1
+                if draw:
+                    draws[player] += 1
+            if winner is not None:
+                wins[winner] += 1
+            if player1 != player2:
+                opponents[player1].append(player2)
+                opponents[player2].append(player1)
+
+        return dict((competitor_id,
+                     (wins[competitor_id], draws[competitor_id],
+                      sum(wins[opponent]
+                          for opponent in opponents[competitor_id]),
+                      matches[competitor_id], opponents[competitor_id]))
+                    for competitor_id in tournament.competitors)
+
+    @_locked
+    def tiebreakData(self, tournament_id):
+        """Returns the competitors and matches tournament.rankedStandings()
+        needs."""
+        tournament = self._tournaments.get(tournament_id)
+        if tournament is None:
+            return [], []
+        return ([(competitor_id, self._players[competitor_id])
+                 for competitor_id in tournament.competitors],
+                list(tournament.matchRows()))
+
+    @_locked
+    def havePlayedPreviously(self, tournament_id, player1, player2):
+        tournament = self._tournaments.get(tournament_id)
+        return (tournament is not None and
+                pairing.pairKey(player1, player2) in tournament.played)
+
+    @_locked
+    def playedPairs(self, tournament_id):
+        tournament = self._tournaments.get(tournament_id)
+        if tournament is None:
+            return set()
+        return set(tournament.played)
+
+    @_locked
+    def pairingData(self, tournament_id):
+        """Returns the standings and played pairs swissPairings() needs."""
+        tournament = self._tournaments.get(tournament_id)
+        if tournament is None:
+            return [], set()
+        return self.playerStandings(tournament_id), set(tournament.played)
+
+    @_locked
+    def pairingDataForTournaments(self, tournament_ids):
+        """Returns the standings and played pairs of several tournaments,
+        keyed by tournament id."""
+        return dict((tournament_id, self.pairingData(tournament_id))
+                    for tournament_id in tournament_ids)
+
+    @_locked
+    def recordByes(self, byes):
+        """Records (tournament_id, player_id) byes, as useCompetitorBye()
+        and reportMatch() record a single bye."""
+        for (tournament_id, player_id) in byes:
+            self.useCompetitorBye(tournament_id, player_id)
+            self.reportMatch(tournament_id, player_id, player_id, None, False)
+
+    def createRound(self, tournament_id, round_number, pair):
+        """Stores a round for tournament.createRound(), unless it already
+        exists, and returns its pairings."""
+        with self._lock:
+            tournament = self._tournament(tournament_id)
+            lastRound = len(tournament.rounds)
+            if round_number <= lastRound:
+                return self._round(tournament, round_number)[1]
+            if round_number != lastRound + 1:
+                raise ValueError("Round %s of tournament %s cannot be "
+                                 "created before round %s" %
+                                 (round_number, tournament_id,
+                                  lastRound + 1))
+            if lastRound and not self._round(tournament, lastRound)[2]:
+                raise ValueError("Round %s of tournament %s cannot be "
+                                 "created until every result of round %s "
+                                 "is reported" %
+                                 (round_number, tournament_id, lastRound))
+
+            bye, pairings = pair(*self.pairingData(tournament_id))
+            if bye is not None:
+                self.useCompetitorBye(tournament_id, bye)
+                self.reportMatch(tournament_id, bye, bye, None, False)
+            tournament.rounds.append(
+                (bye, [(id1, id2) for (id1, name1, id2, name2) in pairings]))
+            return pairings
+
+    def _round(self, tournament, round_number):
+        """Returns a stored round as a (round_number, pairings, complete)
+        tuple, as tournament.currentRound() does."""
+        bye_id, pairings = tournament.rounds[round_number - 1]
+        return (round_number,
+                [(id1, self._players[id1], id2, self._players[id2])
+                 for (id1, id2) in pairings],
+                all(pairing.pairKey(id1, id2) in tournament.played
+                    for (id1, id2) in pairings))
+
+    @_locked
+    def roundData(self, tournament_id, round_number):
+        """Reads a stored round for tournament.currentRound() and
+        tournament.fetchRound()."""
+        tournament = self._tournaments.get(tournament_id)
+        if tournament is None or not tournament.rounds:
+            return None
+        if round_number is None:
+            round_number = len(tournament.rounds)
+        elif not 1 <= round_number <= len(tournament.rounds):
+            return None
+        return self._round(tournament, round_number)
+
+    def completeRound(self, tournament_id, round_number, rows, players):
+        """Records results already checked by tournament.completeRound()."""
+        with self._lock:
+            stored = self.roundData(tournament_id, round_number)
+            if stored is None:
+                raise ValueError("Round %s of tournament %s has not been "
+                                 "created" % (round_number, tournament_id))
+            if stored[2]:
+                raise ValueError("Round %s of tournament %s is already "
+                                 "complete" % (round_number, tournament_id))
+            if set(pairing.pairKey(id1, id2)
+                   for (id1, name1, id2, name2) in stored[1]) != \
+                    set((row[1], row[2]) for row in rows):
+                raise ValueError("The results do not match the pairings of "
+                                 "round %s of tournament %s" %
+                                 (round_number, tournament_id))
+            self.insertMatches(tournament_id, rows, players)
+
+    @_locked
+    def ratingData(self):
+        return [(player_id, name) + self._ratings.get(player_id, (None,) * 4)
+                for (player_id, name) in sorted(self._players.iteritems())]
+
+    @_locked
+    def updateRatings(self, player_ids, rate):
+        """Replaces some players' ratings for tournament.rateRound()."""
+        missing = set(player_ids) - set(self._players)
+        if missing:
+            raise ValueError("Players %s do not exist" % sorted(missing))
+        with self._lock:
+            stored = dict((player_id, self._ratings[player_id])
+                          for player_id in player_ids
+                          if player_id in self._ratings)
+            for row in rate(stored):
+                self._ratings[row[0]] = tuple(row[1:])
+
+    def rebuildRatings(self, rebuild):
+        """Replaces every rating for tournament.rebuildRatings(), replaying
+        the matches of every tournament in id order."""
+        with self._lock:
+            history = []
+            for tournament in self._tournaments.itervalues():
+                history.extend(zip(tournament.ids, tournament.player1s,
+                                   tournament.player2s, tournament.winners,
+                                   tournament.draws))
+            history.sort()
+            rows = rebuild([row[1:] for row in history])
+            self._ratings = dict((row[0], tuple(row[1:])) for row in rows)
+
+    @_locked
+    def tableRows(self, table):
+        """Returns every row of one of the tables in TABLES, as tuples of
+        its columns."""
+        if table == 'players':
+            return sorted(self._players.iteritems())
+        if table == 'tournaments':
+            return sorted((tournament.id, tournament.name)
+                          for tournament in self._tournaments.itervalues())
+        if table == 'ratings':
+            return sorted((player_id,) + row
+                          for (player_id, row) in self._ratings.iteritems())
+
+        rows = []
+        for tournament in sorted(self._tournaments.itervalues(),
+                                 key=lambda tournament: tournament.id):
+            if table == 'competitors':
+                rows.extend(sorted((tournament.id, competitor.id,
+                                    competitor.bye)
+                                   for competitor in
+                                   tournament.competitors.itervalues()))
+            elif table == 'matches':
+                rows.extend((tournament.id,) + row + (match_id,)
+                            for (row, match_id) in zip(tournament.matchRows(),
+                                                       tournament.ids))
+            elif table == 'rounds':
+                rows.extend((tournament.id, number, bye_id)
+                            for number, (bye_id, pairings)
+                            in enumerate(tournament.rounds, 1))
+            elif table == 'pairings':
+                for number, (bye_id, pairings) in enumerate(
+                        tournament.rounds, 1):
+                    rows.extend((tournament.id, number, board) + pair
+                                for board, pair in enumerate(pairings, 1))
+            elif table == 'standings':
+                rows.extend(sorted((tournament.id, competitor.id,
+                                    competitor.bye, competitor.wins,
+                                    competitor.draws, competitor.omw,
+                                    competitor.matches)
+                                   for competitor in
+                                   tournament.competitors.itervalues()))
+            else:
+                raise ValueError("Unknown table '%s'" % table)
+        return rows
+
+    def _tournament(self, tournament_id):
+        """Returns a Tournament, or raises ValueError if it does not
+        exist."""
+        try:
+            return self._tournaments[tournament_id]
+        except KeyError:
+            raise ValueError("Tournament %s does not exist" % tournament_id)
+
+
+class MemoryConnection(object):
+    """Stands in for a database connection to a MemoryBackend.
+
+    Its cursors can only read whole tables, with statements of the form
+    'SELECT column, ... FROM table'.  There is nothing to commit.
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def cursor(self):
+        return MemoryCursor(self._backend)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryCursor(object):
+    """A cursor on a MemoryConnection."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._rows = []
+
+    def execute(self, query, params=None):
+        match = SELECT_PATTERN.match(query)
+        if match is None:
+            raise ValueError("The memory backend can only run 'SELECT "
+                             "column, ... FROM table' statements, not " +
+                             repr(query))
+        table = match.group('table').lower()
+        if table not in TABLES:
+            raise ValueError("Unknown table '%s'" % table)
+        columns = TABLES[table]
+        if match.group('columns') == '*':
+            indexes = range(len(columns))
+        else:
+            try:
+                indexes = [columns.index(column.strip().lower())
+                           for column in match.group('columns').split(',')]
+            except ValueError:
+                raise ValueError("Unknown column in " + repr(query))
+        self._rows = [tuple(row[index] for index in indexes)
+                      for row in self._backend.tableRows(table)]
+
+    def fetchone(self):
+        if not self._rows:
+            return None
+        return self._rows.pop(0)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        self._rows = []
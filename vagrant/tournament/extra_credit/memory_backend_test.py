@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# Test cases for memory_backend.py
+#
+# Runs the tournament functions against the in-memory backend, so no
+# database is needed.
+
+import random
+
+import tournament
+from tournament import *
+
+
+def newTournament(playerCount):
+    """Selects a new, empty in-memory backend and registers players in a
+    tournament on it.  Returns (tournament_id, player_ids)."""
+    useBackend('memory')
+    createTournament("Memory test")
+    with transaction() as dbcursor:
+        dbcursor.execute("SELECT id FROM tournaments;")
+        tournament_id = dbcursor.fetchone()[0]
+    player_ids = registerPlayers(["Memory test player %d" % n
+                                  for n in range(playerCount)],
+                                 tournament_id)
+    return tournament_id, player_ids
+
+
+def testTablesCanBeRead():
+    tournament_id, player_ids = newTournament(3)
+    dbconnection = connect()
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("SELECT competitor_id, tournament_id FROM competitors;")
+    if dbcursor.fetchall() != [(player_id, tournament_id)
+                               for player_id in player_ids]:
+        raise ValueError("The memory backend's cursors should read whole "
+                         "tables.")
+    try:
+        dbcursor.execute("DELETE FROM players;")
+    except ValueError:
+        pass
+    else:
+        raise ValueError("The memory backend's cursors should only read.")
+    dbconnection.close()
+    print "1. Tables can be read through connect()."
+
+
+def testStandingsAreKept():
+    tournament_id, player_ids = newTournament(13)
+    rng = random.Random(0)
+    for roundNumber in range(6):
+        for (id1, name1, id2, name2) in swissPairings(tournament_id):
+            outcome = rng.random()
+            if outcome < 0.2:
+                reportMatch(tournament_id, id1, id2, None, True)
+            else:
+                winner = id1 if outcome < 0.6 else id2
+                reportMatch(tournament_id, id1, id2, winner, False)
+        differences = standingsDifferences(tournament_id)
+        if differences:
+            raise ValueError("After round " + str(roundNumber + 1) + ", the "
+                             "running records should match the matches. "
+                             "First difference (maintained, computed): " +
+                             repr(differences[0]))
+    byes = [row for row in playerStandings(tournament_id) if row[2]]
+    if len(byes) != 6:
+        raise ValueError("Each odd round should give one player a bye.")
+    print "2. Wins, draws, OMW, matches and byes are kept up to date."
+
+
+def testConstraints():
+    tournament_id, [id1, id2, id3] = newTournament(3)
+    reportMatch(tournament_id, id1, id2, id1, False)
+    for call in (lambda: reportMatch(tournament_id, id2, id1, id2, False),
+                 lambda: reportMatches(tournament_id,
+                                       [(id1, id3, id1, False),
+                                        (id1, id2, id2, False)]),
+                 lambda: reportMatch(tournament_id, id2, id3,
+                                     max(id1, id2, id3) + 1, False),
+                 lambda: registerCompetitor(tournament_id, id1),
+                 lambda: deletePlayers()):
+        try:
+            call()
+        except ValueError:
+            pass
+        else:
+            raise ValueError("The memory backend should enforce the "
+                             "constraints in tournament.sql.")
+    if len(playedPairs(tournament_id)) != 1 or \
+            sum(row[6] for row in playerStandings(tournament_id)) != 2:
+        raise ValueError("A rejected call should not record anything.")
+    print "3. Rematches, duplicate competitors and referenced rows are " \
+          "rejected."
+
+
+if __name__ == '__main__':
+    backend = tournament.BACKEND
+    try:
+        testTablesCanBeRead()
+        testStandingsAreKept()
+        testConstraints()
+    finally:
+        useBackend(backend)
+    print "Success!  All tests pass!"
@@ -0,0 +1,204 @@
+#
+# metrics.py -- instrumentation for the tournament functions
+#
+# While a MetricsRegistry is enabled, every call to a public function in
+# tournament.py is measured: the connections it opens, the statements it
+# executes, the rows it fetches and its wall time.  Each measurement is added
+# to the registry's totals and handed to its callbacks, so a caller can log
+# slow calls or spot N+1 query patterns.
+#
+# While no registry is enabled, nothing is wrapped or counted; each call only
+# checks that 'enabled' is None.
+#
+
+import threading
+import time
+
+# The registry that measurements are recorded in, or None while disabled
+enabled = None
+
+# The call being measured on each thread
+_local = threading.local()
+
+
+class CallMetrics(object):
+    """The measurements of one call to a tournament function."""
+
+    __slots__ = ('name', 'connections', 'statements', 'rows', 'seconds')
+
+    def __init__(self, name):
+        self.name = name
+        self.connections = 0
+        self.statements = 0
+        self.rows = 0
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return ("<CallMetrics %s: %d connections, %d statements, %d rows, "
+                "%.6f s>" % (self.name, self.connections, self.statements,
+                             self.rows, self.seconds))
+
+
+class MetricsRegistry(object):
+    """Totals the measurements of each tournament function, and passes
+    every measurement to its callbacks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.reset()
+
+    def addCallback(self, callback):
+        """Calls 'callback' with the CallMetrics of every measured call,
+        on the thread that made the call."""
+        with self._lock:
+            self._callbacks = self._callbacks + [callback]
+
+    def removeCallback(self, callback):
+        """Stops calling a callback added with addCallback()."""
+        with self._lock:
+            self._callbacks = [other for other in self._callbacks
+                               if other != callback]
+
+    def reset(self):
+        """Forgets every total."""
+        with self._lock:
+            self._totals = {}
+
+    def record(self, call):
+        """Adds one call's measurements to the totals and passes them to the
+        callbacks."""
+        with self._lock:
+            totals = self._totals.get(call.name)
+            if totals is None:
+                totals = self._totals[call.name] = [0, 0, 0, 0, 0.0]
+            totals[0] += 1
+            totals[1] += call.connections
+            totals[2] += call.statements
+            totals[3] += call.rows
+            totals[4] += call.seconds
+            callbacks = self._callbacks
+        for callback in callbacks:
+            callback(call)
+
+    def snapshot(self):
+        """Returns the totals so far, as a dict keyed by function name of
+        dicts with 'calls', 'connections', 'statements', 'rows' and
+        'seconds'."""
+        with self._lock:
+            return dict((name, dict(zip(('calls', 'connections',
+                                         'statements', 'rows', 'seconds'),
+                                        totals)))
+                        for name, totals in self._totals.iteritems())
+
+
+def enable(registry=None):
+    """Starts measuring tournament function calls.
+
+    Args:
+      registry: the MetricsRegistry to record in; a new one if not given
+
+    Returns:
+      The registry.
+    """
+    global enabled
+    if registry is None:
+        registry = MetricsRegistry()
+    enabled = registry
+    return registry
+
+
+def disable():
+    """Stops measuring tournament function calls."""
+    global enabled
+    enabled = None
+
+
+def measure(name, function, args, kwargs):
+    """Calls function(*args, **kwargs), recording it in the enabled registry
+    as a call to 'name'.  Calls made from inside another measured call count
+    towards the outer call only."""
+    registry = enabled
+    if registry is None or getattr(_local, 'call', None) is not None:
+        return function(*args, **kwargs)
+
+    call = _local.call = CallMetrics(name)
+    start = time.time()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        call.seconds = time.time() - start
+        _local.call = None
+        registry.record(call)
+
+
+def instrumentConnection(connection):
+    """Returns 'connection', counted and wrapped to count its statements and
+    rows if a call is being measured on this thread."""
+    if enabled is None:
+        return connection
+    call = getattr(_local, 'call', None)
+    if call is None:
+        return connection
+    call.connections += 1
+    return InstrumentedConnection(connection, call)
+
+
+class InstrumentedConnection(object):
+    """A database connection whose cursors count towards a CallMetrics."""
+
+    def __init__(self, connection, call):
+        self._connection = connection
+        self._call = call
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs),
+                                  self._call)
+
+
+class InstrumentedCursor(object):
+    """A database cursor that counts its statements and fetched rows towards
+    a CallMetrics."""
+
+    def __init__(self, cursor, call):
+        self._cursor = cursor
+        self._call = call
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._call.rows += 1
+            yield row
+
+    def execute(self, *args, **kwargs):
+        self._call.statements += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._call.statements += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def copy_expert(self, *args, **kwargs):
+        self._call.statements += 1
+        return self._cursor.copy_expert(*args, **kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._call.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._call.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._call.rows += len(rows)
+        return rows
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#
+# Test cases for metrics.py
+#
+# Measures calls against a scratch SQLite database, so no PostgreSQL server
+# is needed.
+
+import os
+import shutil
+import tempfile
+
+import metrics
+import tournament
+from tournament import *
+
+
+def newTournament(directory, playerCount):
+    """Selects a new SQLite database and registers players in a tournament
+    on it.  Returns (tournament_id, player_ids)."""
+    tournament.SQLITE_PATH = os.path.join(directory,
+                                          'metrics%d.db' % playerCount)
+    useBackend('sqlite')
+    createTournament("Metrics test")
+    player_ids = registerPlayers(["Metrics test player %d" % n
+                                  for n in range(playerCount)], 1)
+    return 1, player_ids
+
+
+def testDisabled(directory):
+    metrics.disable()
+    tournament_id, player_ids = newTournament(directory, 4)
+    dbconnection = metrics.instrumentConnection(connect())
+    if isinstance(dbconnection, metrics.InstrumentedConnection):
+        raise ValueError("Nothing should be wrapped while metrics are "
+                         "disabled.")
+    print "1. Nothing is measured while metrics are disabled."
+
+
+def testCallsAreMeasured(directory):
+    tournament_id, player_ids = newTournament(directory, 6)
+    registry = metrics.enable()
+    calls = []
+    registry.addCallback(calls.append)
+    playerStandings(tournament_id)
+    registry.removeCallback(calls.append)
+    playerStandings(tournament_id)
+    metrics.disable()
+
+    if len(calls) != 1:
+        raise ValueError("Callbacks should see each call until they are "
+                         "removed.")
+    call = calls[0]
+    if (call.name, call.connections, call.statements, call.rows) != \
+            ('playerStandings', 1, 1, 6):
+        raise ValueError("playerStandings() should use one connection and "
+                         "one statement to fetch six rows, not " +
+                         repr(call))
+    totals = registry.snapshot()['playerStandings']
+    if totals['calls'] != 2 or totals['rows'] != 12:
+        raise ValueError("The registry should total every call.")
+    print "2. Connections, statements, rows and time are measured per call."
+
+
+def testNestedCalls(directory):
+    tournament_id, player_ids = newTournament(directory, 5)
+    registry = metrics.enable()
+    swissPairings(tournament_id)
+    metrics.disable()
+
+    totals = registry.snapshot()
+    if sorted(totals) != ['swissPairings']:
+        raise ValueError("The bye swissPairings() reports should count "
+                         "towards swissPairings() only.")
+    if totals['swissPairings']['statements'] <= 3:
+        raise ValueError("swissPairings() should include the statements "
+                         "that record the bye.")
+    print "3. Calls made by other tournament functions count towards them."
+
+
+def testNPlusOne(directory):
+    tournament_id, player_ids = newTournament(directory, 8)
+    registry = metrics.enable()
+    for player in player_ids[1:]:
+        havePlayedPreviously(tournament_id, player_ids[0], player)
+    playedPairs(tournament_id)
+    metrics.disable()
+
+    totals = registry.snapshot()
+    if totals['havePlayedPreviously']['statements'] != 7 or \
+            totals['playedPairs']['statements'] != 1:
+        raise ValueError("A loop of havePlayedPreviously() calls should "
+                         "show one statement per call.")
+    print "4. A loop of single-row queries shows up in the totals."
+
+
+if __name__ == '__main__':
+    backend = tournament.BACKEND
+    directory = tempfile.mkdtemp()
+    try:
+        testDisabled(directory)
+        testCallsAreMeasured(directory)
+        testNestedCalls(directory)
+        testNPlusOne(directory)
+    finally:
+        metrics.disable()
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        useBackend(backend)
+        shutil.rmtree(directory)
+    print "Success!  All tests pass!"
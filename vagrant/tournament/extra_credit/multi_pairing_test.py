@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#
+# Test cases for swissPairingsForTournaments()
+#
+# Plays the same seeded tournaments twice on each backend, pairing one copy
+# with swissPairingsForTournaments() and the other one tournament at a time,
+# and checks that both copies are paired and ranked in the same way.
+# PostgreSQL is skipped if the database cannot be reached.  Like
+# extra_credit_tests.py, this empties the tables of each backend first.
+
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+
+import psycopg2
+
+import tournament
+from tournament import *
+
+# Odd sizes as well as even ones, so that byes are handed out
+SIZES = [5, 6, 7, 8, 9, 12]
+ROUNDS = 3
+
+
+def clearAllTables():
+    """Empties all tables of the selected backend."""
+    deleteMatches()
+    deleteCompetitors()
+    deleteTournaments()
+    deletePlayers()
+
+
+def newTournament(playerCount):
+    """Creates a tournament of new players on the selected backend.  Returns
+    (tournament_id, positions), where positions numbers the players in
+    registration order."""
+    createTournament("Multi pairing test")
+    dbconnection = connect()
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("SELECT id FROM tournaments;")
+    tournament_id = max(row[0] for row in dbcursor.fetchall())
+    dbconnection.close()
+    player_ids = registerPlayers(["Multi pairing test player %d" % n
+                                  for n in range(playerCount)],
+                                 tournament_id)
+    return tournament_id, dict((player_id, position)
+                               for (position, player_id)
+                               in enumerate(player_ids))
+
+
+def reportRound(tournament_id, pairings, rng):
+    """Reports random results for a round's pairings."""
+    for (id1, name1, id2, name2) in pairings:
+        outcome = rng.random()
+        if outcome < 0.2:
+            reportMatch(tournament_id, id1, id2, None, True)
+        else:
+            winner = id1 if outcome < 0.6 else id2
+            reportMatch(tournament_id, id1, id2, winner, False)
+
+
+def playBothWays():
+    """Plays every size in SIZES twice on the selected backend, pairing the
+    first copies together and the second one at a time.  Returns the two
+    histories, with players numbered in registration order."""
+    clearAllTables()
+    together = [newTournament(size) for size in SIZES]
+    separate = [newTournament(size) for size in SIZES]
+    rngs = [(random.Random(size), random.Random(size)) for size in SIZES]
+
+    histories = ([], [])
+    for roundNumber in range(ROUNDS):
+        pairings = swissPairingsForTournaments(
+            [tournament_id for (tournament_id, positions) in together],
+            processes=2)
+        for index in range(len(SIZES)):
+            for (copy, (tournament_id, positions)) in enumerate(
+                    [together[index], separate[index]]):
+                if copy == 0:
+                    roundPairings = pairings[tournament_id]
+                else:
+                    roundPairings = swissPairings(tournament_id)
+                reportRound(tournament_id, roundPairings, rngs[index][copy])
+                if standingsDifferences(tournament_id):
+                    raise ValueError(BACKEND + " standings should match "
+                                     "the matches after every round.")
+                histories[copy].append((
+                    [(positions[id1], positions[id2])
+                     for (id1, name1, id2, name2) in roundPairings],
+                    [(positions[row[0]],) + tuple(row[2:])
+                     for row in playerStandings(tournament_id)]))
+    return histories
+
+
+def testSameAsOneAtATime():
+    directory = tempfile.mkdtemp()
+    try:
+        backends = ['postgresql', 'memory', 'sqlite']
+        tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+        for backend in backends:
+            useBackend(backend)
+            try:
+                together, separate = playBothWays()
+            except psycopg2.OperationalError:
+                print "PostgreSQL is not available; skipping it."
+                continue
+            if together != separate:
+                raise ValueError(backend + " should pair tournaments the "
+                                 "same way together as one at a time.")
+    finally:
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        shutil.rmtree(directory)
+    print "1. Tournaments paired together are paired as they are one at a " \
+          "time."
+
+
+def testForkedProcessesGetTheirOwnPool():
+    useBackend('postgresql')
+    try:
+        clearAllTables()
+    except psycopg2.OperationalError:
+        print "PostgreSQL is not available; skipping it."
+        return
+    tournament_ids = [newTournament(size)[0] for size in SIZES]
+    expected = [countCompetitors(tournament_id)
+                for tournament_id in tournament_ids]
+
+    # The workers are forked from a process whose pool is already open
+    workers = multiprocessing.Pool(2)
+    try:
+        counted = workers.map(countCompetitors, tournament_ids)
+    finally:
+        workers.terminate()
+        workers.join()
+    if counted != expected:
+        raise ValueError("Forked processes should be able to use the "
+                         "tournament functions.")
+    if [countCompetitors(tournament_id)
+            for tournament_id in tournament_ids] != expected:
+        raise ValueError("The parent's connections should still work after "
+                         "forked processes have used the database.")
+    clearAllTables()
+    print "2. Forked processes do not share the parent's connections."
+
+
+def failPairing(currentStandings, previousPairs, mode):
+    """Stands in for tournament._pairStandings() to make pairing fail."""
+    raise RuntimeError("Pairing failed")
+
+
+def testFailedPairingRecordsNoByes():
+    directory = tempfile.mkdtemp()
+    pairStandings = tournament._pairStandings
+    try:
+        tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+        for backend in ['postgresql', 'memory', 'sqlite']:
+            useBackend(backend)
+            try:
+                clearAllTables()
+            except psycopg2.OperationalError:
+                print "PostgreSQL is not available; skipping it."
+                continue
+            tournament_ids = [newTournament(size)[0] for size in SIZES]
+            # Workers are forked after the stand-in is in place
+            tournament._pairStandings = failPairing
+            for processes in [1, 2]:
+                try:
+                    swissPairingsForTournaments(tournament_ids,
+                                                processes=processes)
+                except RuntimeError:
+                    pass
+                else:
+                    raise ValueError("swissPairingsForTournaments() should "
+                                     "raise when pairing fails.")
+            tournament._pairStandings = pairStandings
+            for tournament_id in tournament_ids:
+                if any(row[2] or row[6] for row
+                       in playerStandings(tournament_id)):
+                    raise ValueError(backend + " should record no byes "
+                                     "when pairing fails.")
+            clearAllTables()
+    finally:
+        tournament._pairStandings = pairStandings
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        shutil.rmtree(directory)
+    print "3. No byes are recorded when pairing fails."
+
+
+if __name__ == '__main__':
+    backend = tournament.BACKEND
+    try:
+        testSameAsOneAtATime()
+        testForkedProcessesGetTheirOwnPool()
+        testFailedPairingRecordsNoByes()
+    finally:
+        useBackend(backend)
+    print "Success!  All tests pass!"
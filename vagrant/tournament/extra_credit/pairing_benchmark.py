@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# Benchmark for the in-memory pairing engine in pairing.py
+#
+# Simulates a Swiss event of each size entirely in memory and reports how
+# long the pairing engine takes to generate the next round, in both greedy
+# and optimal (maximum-weight matching) modes.  For comparison it also counts
+# how many havePlayedPreviously() queries the old first-fit loop in
+# swissPairings() would have sent to the database for the same round.
+
+import argparse
+import random
+import timeit
+
+import pairing
+
+
+def wins(row):
+    """Score function for standings rows of the form (id, name, wins)."""
+    return row[2]
+
+
+def simulateEvent(playerCount, rounds, seed):
+    """Plays 'rounds' random rounds between 'playerCount' players.
+
+    Returns:
+      A tuple of (standings, playedPairs) ready for the next round.
+    """
+    rng = random.Random(seed)
+    scores = dict((playerId, 0) for playerId in range(1, playerCount + 1))
+    played = set()
+    for _ in range(rounds):
+        standings = standingsFor(scores)
+        for (id1, name1, id2, name2) in pairing.pairRound(standings, played,
+                                                          wins):
+            played.add(pairing.pairKey(id1, id2))
+            scores[id1 if rng.random() < 0.5 else id2] += 1
+    return standingsFor(scores), played
+
+
+def standingsFor(scores):
+    """Builds (id, name, wins) standings rows sorted best first."""
+    return sorted([(playerId, "Player %d" % playerId, score)
+                   for playerId, score in scores.items()],
+                  key=lambda row: (-row[2], row[0]))
+
+
+def legacyQueryCount(standings, played):
+    """Counts the havePlayedPreviously() calls the old nested loop in
+    swissPairings() makes to pair one round, one query per call."""
+    queries = 0
+    paired = set()
+    for player in standings:
+        if player[0] in paired:
+            continue
+        for player2 in standings:
+            if player[0] == player2[0] or player2[0] in paired:
+                continue
+            queries += 1
+            if pairing.pairKey(player[0], player2[0]) not in played:
+                paired.update((player[0], player2[0]))
+                break
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times round generation against player count.")
+    parser.add_argument('--players', type=int, nargs='+',
+                        default=[16, 128, 1000, 10000, 100000])
+    parser.add_argument('--rounds', type=int, default=5,
+                        help='rounds already played before timing')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--legacy-limit', type=int, default=10000,
+                        help='largest event to count legacy queries for')
+    parser.add_argument('--optimal-limit', type=int, default=10000,
+                        help='largest event to time optimal pairing for')
+    args = parser.parse_args()
+
+    print "Players  | Greedy (s) | Optimal (s) | Queries | Legacy queries"
+    print "---------------------------------------------------------------"
+    for playerCount in args.players:
+        standings, played = simulateEvent(playerCount, args.rounds, args.seed)
+        seconds = min(timeit.repeat(
+            lambda: pairing.pairRound(standings, played, wins),
+            repeat=args.repeat, number=1))
+        if playerCount <= args.optimal_limit:
+            optimal = "%11.4f" % min(timeit.repeat(
+                lambda: pairing.optimalPairRound(standings, played, wins),
+                repeat=args.repeat, number=1))
+        else:
+            optimal = "%11s" % "-"
+        if playerCount <= args.legacy_limit:
+            legacy = str(legacyQueryCount(standings, played))
+        else:
+            legacy = "-"
+        # The engine needs two queries per round: standings and played pairs
+        print "%-8d | %10.4f | %s | %7d | %s" % (playerCount, seconds,
+                                                 optimal, 2, legacy)
+
+
+if __name__ == '__main__':
+    main()
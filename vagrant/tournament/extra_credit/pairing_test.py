@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#
+# Test cases for pairing.py
+
+from pairing import *
+import matching
+
+
+def wins(row):
+    """Score function for standings rows of the form (id, name, wins)."""
+    return row[2]
+
+
+def testPairKey():
+    if pairKey(7, 3) != (3, 7) or pairKey(3, 7) != (3, 7):
+        raise ValueError("pairKey() should put the lowest id first.")
+    if playedPairSet([(5, 2), (2, 5), (1, 4)]) != set([(2, 5), (1, 4)]):
+        raise ValueError("playedPairSet() should hold each pair once.")
+    print "1. Pairs are keyed the same way in either order."
+
+
+def testScoreGroups():
+    standings = [(1, "A", 2), (2, "B", 2), (3, "C", 1), (4, "D", 0),
+                 (5, "E", 0)]
+    groups = scoreGroups(standings, wins)
+    if [[row[0] for row in group] for group in groups] != [[1, 2], [3],
+                                                            [4, 5]]:
+        raise ValueError("scoreGroups() should split standings by score, "
+                         "keeping standings order.")
+    print "2. Standings are split into ordered score groups."
+
+
+def testPairWithinGroups():
+    standings = [(1, "A", 1), (2, "B", 1), (3, "C", 0), (4, "D", 0)]
+    pairs = pairRound(standings, set([(1, 3), (2, 4)]), wins)
+    if pairs != [(1, "A", 2, "B"), (3, "C", 4, "D")]:
+        raise ValueError("Players with equal scores should be paired.")
+    print "3. Players are paired within their score group."
+
+
+def testNoRematches():
+    standings = [(1, "A", 1), (2, "B", 1), (3, "C", 0), (4, "D", 0)]
+    played = set([(1, 2), (3, 4)])
+    pairs = pairRound(standings, played, wins)
+    if len(pairs) != 2:
+        raise ValueError("Four players should give two pairs.")
+    for (id1, name1, id2, name2) in pairs:
+        if pairKey(id1, id2) in played:
+            raise ValueError("pairRound() should never pair a rematch.")
+    print "4. Players who have already met are not paired again."
+
+
+def testFloaters():
+    standings = [(1, "A", 2), (2, "B", 2), (3, "C", 2), (4, "D", 1),
+                 (5, "E", 1), (6, "F", 1)]
+    pairs = pairRound(standings, set(), wins)
+    if pairs[1] != (3, "C", 4, "D"):
+        raise ValueError("The odd player out of a score group should be "
+                         "paired with the top of the next group.")
+    print "5. The odd player out of a score group floats down."
+
+
+def testMaxWeightMatching():
+    mate = matching.maxWeightMatching([(0, 1, 5), (1, 2, 11), (2, 3, 5)])
+    if mate != [-1, 2, 1, -1]:
+        raise ValueError("maxWeightMatching() should pick the heaviest "
+                         "matching.")
+    mate = matching.maxWeightMatching([(0, 1, 5), (1, 2, 11), (2, 3, 5)],
+                                      maxCardinality=True)
+    if mate != [1, 0, 3, 2]:
+        raise ValueError("maxWeightMatching() should pick the heaviest of the "
+                         "largest matchings.")
+    print "6. The blossom algorithm finds maximum-weight matchings."
+
+
+def testOptimalPairingAvoidsDeadEnds():
+    # Greedy pairing gives 1-2 and 3-4, leaving 5 and 6 who have already met
+    standings = [(1, "A", 2), (2, "B", 2), (3, "C", 1), (4, "D", 1),
+                 (5, "E", 0), (6, "F", 0)]
+    played = set([(5, 6), (3, 5), (4, 6)])
+    if len(pairRound(standings, played, wins)) != 2:
+        raise ValueError("Expected greedy pairing to dead-end here.")
+    pairs = optimalPairRound(standings, played, wins)
+    if len(pairs) != 3:
+        raise ValueError("optimalPairRound() should pair every player when "
+                         "a complete pairing exists.")
+    for (id1, name1, id2, name2) in pairs:
+        if pairKey(id1, id2) in played:
+            raise ValueError("optimalPairRound() should never pair a "
+                             "rematch.")
+    print "7. Optimal pairing finds a complete round where greedy dead-ends."
+
+
+def testOptimalPairingAcrossBlocks():
+    standings = [(playerId, "P%d" % playerId, 0) for playerId in range(1, 41)]
+    # Player 10 has already met everyone else in the first block
+    played = set(pairKey(10, other) for other in range(1, 10))
+    pairs = optimalPairRound(standings, played, wins, window=4, blockSize=10)
+    if len(pairs) != 20:
+        raise ValueError("Players left over in one block should be carried "
+                         "into the next.")
+    print "8. Optimal pairing carries unpaired players between blocks."
+
+
+def testOptimalPairingRepairsLastBlock():
+    standings = [(playerId, "P%d" % playerId, 0) for playerId in range(1, 41)]
+    # Player 40 has already met everyone else in the last block, so the
+    # last block leaves 40 and one other player, who have met too
+    played = set(pairKey(40, other) for other in range(31, 40))
+    pairs = optimalPairRound(standings, played, wins, window=4, blockSize=10)
+    paired = set(playerId for (id1, name1, id2, name2) in pairs
+                 for playerId in (id1, id2))
+    if len(pairs) != 20 or len(paired) != 40:
+        raise ValueError("Players left over after the last block should be "
+                         "paired with players from earlier blocks.")
+    if any(pairKey(id1, id2) in played for (id1, name1, id2, name2) in pairs):
+        raise ValueError("optimalPairRound() should never pair a rematch.")
+    print "9. Optimal pairing re-pairs players left over after the last block."
+
+
+if __name__ == '__main__':
+    testPairKey()
+    testScoreGroups()
+    testPairWithinGroups()
+    testNoRematches()
+    testFloaters()
+    testMaxWeightMatching()
+    testOptimalPairingAvoidsDeadEnds()
+    testOptimalPairingAcrossBlocks()
+    testOptimalPairingRepairsLastBlock()
+    print "Success!  All tests pass!"
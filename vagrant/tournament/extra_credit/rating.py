@@ -0,0 +1,299 @@
+#
+# rating.py -- vectorized Elo and Glicko-2 ratings for tournament players
+#
+# Ratings are updated one rating period at a time: every result of a period
+# is rated against the ratings players had when it began, so a whole round
+# is a handful of NumPy operations over arrays of results rather than a loop
+# over matches.  Players who play nothing in a period are left as they are.
+#
+# Replaying a match history splits it into the shortest run of periods in
+# which every player's matches stay in the order they were played: each
+# match goes in the period after the later of its players' previous
+# matches.  A history reported a round at a time is split back into its
+# rounds, with rounds of different tournaments sharing periods.
+#
+# A bye, stored as a match against oneself, is not rated.
+#
+
+import math
+
+import numpy
+
+# Every rating starts here, on both scales
+INITIAL_RATING = 1500.0
+
+# How far an Elo rating moves for each point scored above expectation
+ELO_K_FACTOR = 32.0
+
+# The rating deviation and volatility a Glicko-2 rating starts with, and
+# the system constant that limits how fast volatility changes
+GLICKO2_DEVIATION = 350.0
+GLICKO2_VOLATILITY = 0.06
+GLICKO2_TAU = 0.5
+
+# Converts between the Glicko and Glicko-2 scales
+GLICKO2_SCALE = 173.7178
+
+# How closely each new Glicko-2 volatility is solved for, and the most
+# iterations spent on it
+CONVERGENCE = 0.000001
+MAX_ITERATIONS = 100
+
+
+class Elo(object):
+    """The Elo rating system.  Ratings have no deviation or volatility."""
+
+    name = 'elo'
+    deviation = 0.0
+    volatility = 0.0
+
+    def __init__(self, k=ELO_K_FACTOR):
+        self.k = k
+
+    def rate(self, ratings, deviations, volatilities, players, opponents,
+             scores):
+        """Updates the ratings of every player in a period, in place.
+
+        Args:
+          ratings, deviations, volatilities: arrays of every player's
+                                             rating, indexed by player
+          players: each result's player, once from each side
+          opponents: each result's opponent, in the same order
+          scores: what each player scored: 1, 0.5 or 0
+        """
+        expected = 1.0 / (1.0 + 10.0 ** ((ratings[opponents] -
+                                          ratings[players]) / 400.0))
+        rated, inverse = numpy.unique(players, return_inverse=True)
+        ratings[rated] += self.k * numpy.bincount(inverse, scores - expected)
+
+
+class Glicko2(object):
+    """Mark Glickman's Glicko-2 rating system."""
+
+    name = 'glicko2'
+    deviation = GLICKO2_DEVIATION
+    volatility = GLICKO2_VOLATILITY
+
+    def __init__(self, tau=GLICKO2_TAU):
+        self.tau = tau
+
+    def rate(self, ratings, deviations, volatilities, players, opponents,
+             scores):
+        """Updates the ratings, deviations and volatilities of every player
+        in a period, in place, as Elo.rate() does."""
+        mu = (ratings[players] - INITIAL_RATING) / GLICKO2_SCALE
+        opponentMu = (ratings[opponents] - INITIAL_RATING) / GLICKO2_SCALE
+        opponentPhi = deviations[opponents] / GLICKO2_SCALE
+        g = 1.0 / numpy.sqrt(1.0 + 3.0 * opponentPhi ** 2 / math.pi ** 2)
+        expected = 1.0 / (1.0 + numpy.exp(-g * (mu - opponentMu)))
+
+        rated, inverse = numpy.unique(players, return_inverse=True)
+        variance = 1.0 / numpy.bincount(inverse,
+                                        g ** 2 * expected * (1.0 - expected))
+        improvement = numpy.bincount(inverse, g * (scores - expected))
+        phi = deviations[rated] / GLICKO2_SCALE
+        sigma = self._volatility(phi, volatilities[rated], variance,
+                                 variance * improvement)
+
+        phi = 1.0 / numpy.sqrt(1.0 / (phi ** 2 + sigma ** 2) +
+                               1.0 / variance)
+        ratings[rated] += GLICKO2_SCALE * phi ** 2 * improvement
+        deviations[rated] = GLICKO2_SCALE * phi
+        volatilities[rated] = sigma
+
+    def _volatility(self, phi, sigma, variance, delta):
+        """Solves for every player's new volatility at once, with the
+        Illinois algorithm of step 5 of Glickman's description."""
+        tau = self.tau
+        a = numpy.log(sigma ** 2)
+
+        def f(x):
+            ex = numpy.exp(x)
+            return (ex * (delta ** 2 - phi ** 2 - variance - ex) /
+                    (2.0 * (phi ** 2 + variance + ex) ** 2) -
+                    (x - a) / tau ** 2)
+
+        # Bracket each root between A and B
+        large = delta ** 2 > phi ** 2 + variance
+        low = numpy.log(numpy.where(large, delta ** 2 - phi ** 2 - variance,
+                                    1.0))
+        k = numpy.ones(len(a))
+        while True:
+            short = ~large & (f(a - k * tau) < 0)
+            if not short.any():
+                break
+            k[short] += 1
+        A = a
+        B = numpy.where(large, low, a - k * tau)
+        fA = f(A)
+        fB = f(B)
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            for iteration in xrange(MAX_ITERATIONS):
+                unsettled = numpy.abs(B - A) > CONVERGENCE
+                if not unsettled.any():
+                    break
+                C = A + (A - B) * fA / (fB - fA)
+                fC = f(C)
+                swap = fC * fB <= 0
+                A = numpy.where(unsettled & swap, B, A)
+                fA = numpy.where(unsettled,
+                                 numpy.where(swap, fB, fA / 2.0), fA)
+                B = numpy.where(unsettled, C, B)
+                fB = numpy.where(unsettled, fC, fB)
+        return numpy.exp(A / 2.0)
+
+
+# Every rating system, by the name tournament.py takes
+SYSTEMS = {
+    'elo': Elo,
+    'glicko2': Glicko2,
+}
+
+
+def ratingSystem(name):
+    """Returns a new instance of the rating system called 'name'.
+
+    Raises:
+      ValueError: if the name is not in SYSTEMS
+    """
+    if name not in SYSTEMS:
+        raise ValueError("Unknown rating system '%s'; choose from %s" %
+                         (name, ', '.join(sorted(SYSTEMS))))
+    return SYSTEMS[name]()
+
+
+class Ratings(object):
+    """The ratings of a set of players, as arrays indexed by position in
+    'ids'."""
+
+    def __init__(self, system, ids, rows=None):
+        """Starts every player in 'ids' at the system's initial rating, or
+        at their row in 'rows', a dict of (rating, deviation, volatility,
+        matches) tuples keyed by player id."""
+        self.system = system
+        self.ids = list(ids)
+        self.index = dict((player_id, position)
+                          for (position, player_id) in enumerate(self.ids))
+        count = len(self.ids)
+        self.ratings = numpy.full(count, INITIAL_RATING)
+        self.deviations = numpy.full(count, float(system.deviation))
+        self.volatilities = numpy.full(count, float(system.volatility))
+        self.matches = numpy.zeros(count, dtype=numpy.int64)
+        for (player_id, row) in (rows or {}).iteritems():
+            position = self.index[player_id]
+            (self.ratings[position], self.deviations[position],
+             self.volatilities[position], self.matches[position]) = row
+
+    def ratePeriod(self, player1s, player2s, scores):
+        """Rates one period of results.
+
+        Args:
+          player1s, player2s: arrays of each result's players, by position
+          scores: what each result's first player scored: 1, 0.5 or 0
+        """
+        players = numpy.concatenate((player1s, player2s))
+        self.system.rate(self.ratings, self.deviations, self.volatilities,
+                         players, numpy.concatenate((player2s, player1s)),
+                         numpy.concatenate((scores, 1.0 - scores)))
+        self.matches += numpy.bincount(players, minlength=len(self.ids))
+
+    def rows(self):
+        """Returns a (player_id, rating, deviation, volatility, matches)
+        tuple for every player."""
+        return zip(self.ids, self.ratings.tolist(),
+                   self.deviations.tolist(), self.volatilities.tolist(),
+                   self.matches.tolist())
+
+
+def scoreResults(player1s, winners, draws):
+    """Returns what each first player scored: 1 for a win, 0.5 for a draw
+    and 0 for a loss.  All four arguments are arrays of the same length."""
+    return numpy.where(draws, 0.5, numpy.where(winners == player1s, 1.0, 0.0))
+
+
+def ratingPeriods(player1s, player2s, count):
+    """Returns the period each match of a history is rated in, counting
+    from 1, as described at the top of this file.
+
+    Args:
+      player1s, player2s: arrays of each match's players, by position
+      count: the number of players
+    """
+    last = [0] * count
+    periods = []
+    append = periods.append
+    for (player1, player2) in zip(player1s.tolist(), player2s.tolist()):
+        period = max(last[player1], last[player2]) + 1
+        last[player1] = last[player2] = period
+        append(period)
+    return numpy.array(periods, dtype=numpy.int64)
+
+
+def replay(system, history):
+    """Rates a whole match history from scratch.
+
+    Args:
+      system: an instance of a class in SYSTEMS
+      history: an integer array with a (player_1_id, player_2_id,
+               winner_id, draw) row for every match in the order they were
+               played, with 0 for no winner and 1 for a draw
+
+    Returns:
+      The Ratings of every player who played a match other than a bye or a
+      match with no result.
+    """
+    history = numpy.asarray(history, dtype=numpy.int64).reshape(-1, 4)
+    # Byes, and matches with neither a winner nor a draw, are not rated
+    history = history[(history[:, 0] != history[:, 1]) &
+                      ((history[:, 2] != 0) | (history[:, 3] != 0))]
+    ids, positions = numpy.unique(history[:, :2], return_inverse=True)
+    positions = positions.reshape(-1, 2)
+    player1s = positions[:, 0]
+    player2s = positions[:, 1]
+    scores = scoreResults(history[:, 0], history[:, 2], history[:, 3] != 0)
+
+    ratings = Ratings(system, ids.tolist())
+    periods = ratingPeriods(player1s, player2s, len(ids))
+    order = numpy.argsort(periods, kind='mergesort')
+    bounds = numpy.searchsorted(periods[order],
+                                numpy.arange(1, periods.max() + 2)
+                                if len(periods) else [1])
+    for (start, end) in zip(bounds[:-1], bounds[1:]):
+        period = order[start:end]
+        ratings.ratePeriod(player1s[period], player2s[period],
+                           scores[period])
+    return ratings
+
+
+def rateResults(system, stored, results):
+    """Rates one period of results, such as a round, for the players in it.
+
+    Args:
+      system: an instance of a class in SYSTEMS
+      stored: a dict of (rating, deviation, volatility, matches) tuples,
+              keyed by player id, for the players who already have a rating
+      results: (player_1_id, player_2_id, winner_id, draw) tuples, without
+               byes.  Matches with neither a winner nor a draw are skipped
+
+    Returns:
+      A (player_id, rating, deviation, volatility, matches) tuple for every
+      player in the results.
+    """
+    results = numpy.array([(player1, player2, winner or 0, bool(draw))
+                           for (player1, player2, winner, draw) in results
+                           if winner is not None or draw],
+                          dtype=numpy.int64).reshape(-1, 4)
+    ids = numpy.unique(results[:, :2]).tolist()
+    ratings = Ratings(system, ids, stored)
+    positions = numpy.searchsorted(ids, results[:, :2])
+    ratings.ratePeriod(positions[:, 0], positions[:, 1],
+                       scoreResults(results[:, 0], results[:, 2],
+                                    results[:, 3] != 0))
+    return ratings.rows()
+
+
+def loadHistory(text):
+    """Reads a match history for replay() from the text PostgreSQL's COPY
+    ... TO writes, which parses far faster than rows fetched one by one."""
+    return numpy.fromstring(text, dtype=numpy.int64, sep=' ').reshape(-1, 4)
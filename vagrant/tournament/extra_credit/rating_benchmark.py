@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+#
+# Benchmark for replaying match histories with the rating engine in
+# rating.py
+#
+# Builds a random history of each size entirely in memory, in the integer
+# form rebuildRatings() reads from the database, and reports how long a
+# full replay takes under each rating system.
+
+import argparse
+import timeit
+
+import numpy
+
+import rating
+
+
+def randomHistory(matchCount, playerCount, seed):
+    """Returns a history of random matches between 'playerCount' players,
+    as (player_1_id, player_2_id, winner_id, draw) rows, one in ten of them
+    drawn."""
+    rng = numpy.random.RandomState(seed)
+    player1s = rng.randint(1, playerCount + 1, matchCount)
+    player2s = rng.randint(1, playerCount, matchCount)
+
+    # Never pairs a player with themself, which would be a bye
+    player2s[player2s >= player1s] += 1
+    draws = rng.random_sample(matchCount) < 0.1
+    winners = numpy.where(rng.random_sample(matchCount) < 0.5, player1s,
+                          player2s)
+    winners[draws] = 0
+    return numpy.column_stack((numpy.minimum(player1s, player2s),
+                               numpy.maximum(player1s, player2s),
+                               winners, draws))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times full rating replays against history size.")
+    parser.add_argument('--matches', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--players', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    systems = sorted(rating.SYSTEMS)
+    print "Matches  | Periods | " + " | ".join("%11s" % ("%s (s)" % name)
+                                                for name in systems)
+    print "-" * (20 + 14 * len(systems))
+    for matchCount in args.matches:
+        history = randomHistory(matchCount, args.players, args.seed)
+        ids, positions = numpy.unique(history[:, :2], return_inverse=True)
+        positions = positions.reshape(-1, 2)
+        periods = rating.ratingPeriods(positions[:, 0], positions[:, 1],
+                                       len(ids)).max()
+        times = [min(timeit.repeat(
+            lambda: rating.replay(rating.ratingSystem(name), history),
+            repeat=args.repeat, number=1)) for name in systems]
+        print "%-8d | %7d | %s" % (matchCount, periods,
+                                   " | ".join("%11.3f" % seconds
+                                              for seconds in times))
+
+
+if __name__ == '__main__':
+    main()
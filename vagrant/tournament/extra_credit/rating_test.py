@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+#
+# Test cases for rating.py, rateRound(), rebuildRatings() and
+# playerRatings()
+#
+# The database tests run on PostgreSQL, in memory and on SQLite.
+# PostgreSQL is skipped if the database cannot be reached.  Like
+# extra_credit_tests.py, this empties the tables of each backend first.
+
+import collections
+import os
+import random
+import shutil
+import tempfile
+
+import numpy
+import psycopg2
+
+import rating
+import tournament
+from tournament import *
+
+PLAYERS = 9
+ROUNDS = 4
+
+# How far ratings computed in different ways may differ
+TOLERANCE = 0.000001
+
+
+def clearAllTables():
+    """Empties all tables of the selected backend."""
+    deleteMatches()
+    deleteCompetitors()
+    deleteTournaments()
+    deletePlayers()
+
+
+def newTournament():
+    """Creates a tournament of PLAYERS new players on the selected backend.
+    Returns its id."""
+    createTournament("Rating test")
+    dbconnection = connect()
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("SELECT id FROM tournaments;")
+    tournament_id = max(row[0] for row in dbcursor.fetchall())
+    dbconnection.close()
+    registerPlayers(["Rating test player %d" % n for n in range(PLAYERS)],
+                    tournament_id)
+    return tournament_id
+
+
+def sameRatings(first, second):
+    """Returns whether two lists of playerRatings() rows agree to within
+    TOLERANCE."""
+    return len(first) == len(second) and all(
+        row1[:2] == row2[:2] and row1[5] == row2[5] and
+        numpy.allclose(row1[2:5], row2[2:5], rtol=0, atol=TOLERANCE)
+        for (row1, row2) in zip(first, second))
+
+
+def testPublishedExamples():
+    ratings = numpy.array([1500.0, 1400.0, 1550.0, 1700.0])
+    deviations = numpy.array([200.0, 30.0, 100.0, 300.0])
+    volatilities = numpy.full(4, 0.06)
+    rating.Glicko2().rate(ratings, deviations, volatilities,
+                          numpy.array([0, 0, 0]), numpy.array([1, 2, 3]),
+                          numpy.array([1.0, 0.0, 0.0]))
+    if (round(ratings[0], 2), round(deviations[0], 2),
+            round(volatilities[0], 5)) != (1464.05, 151.52, 0.06):
+        raise ValueError("Glicko-2 should reproduce the example in "
+                         "Glickman's description.")
+    rows = rating.rateResults(rating.Elo(), {}, [(1, 2, 1, False),
+                                                 (3, 4, None, True)])
+    if [row[1] for row in rows] != [1516.0, 1484.0, 1500.0, 1500.0]:
+        raise ValueError("A win between equal Elo ratings should move each "
+                         "by half the K-factor, and a draw by nothing.")
+    print "1. Ratings are updated as their systems define."
+
+
+def testRatingPeriods():
+    # Two rounds of one tournament and a round of another, interleaved
+    player1s = numpy.array([0, 2, 4, 0, 1, 5])
+    player2s = numpy.array([1, 3, 5, 2, 3, 6])
+    if rating.ratingPeriods(player1s, player2s, 7).tolist() != \
+            [1, 1, 1, 2, 2, 2]:
+        raise ValueError("A history should be split back into its rounds.")
+    history = [(1, 2, 1, 0), (3, 4, 0, 1), (1, 1, 0, 0), (1, 3, 3, 0)]
+    replayed = rating.replay(rating.Elo(), history)
+    if replayed.ids != [1, 2, 3, 4] or replayed.matches.tolist() != \
+            [2, 1, 2, 1]:
+        raise ValueError("A replay should rate every match but byes.")
+    print "2. A match history is replayed round by round."
+
+
+def testRebuildMatchesRounds():
+    rng = random.Random(0)
+    for system in sorted(rating.SYSTEMS):
+        clearAllTables()
+        tournament_ids = [newTournament(), newTournament()]
+        played = collections.Counter()
+        for roundNumber in range(ROUNDS):
+            for tournament_id in tournament_ids:
+                results = []
+                for (id1, name1, id2, name2) in swissPairings(tournament_id):
+                    outcome = rng.random()
+                    if outcome < 0.2:
+                        results.append((id1, id2, None, True))
+                    else:
+                        results.append((id1, id2,
+                                        id1 if outcome < 0.6 else id2, False))
+                reportMatches(tournament_id, results)
+                played.update(player_id for result in results
+                              for player_id in result[:2])
+                rateRound(results, system)
+        tournament.RATING_SYSTEM = system
+        kept = playerRatings()
+        if len(kept) != 2 * PLAYERS or \
+                any(row[5] != played[row[0]] for row in kept):
+            raise ValueError("rateRound() should rate every player in a "
+                             "round once.")
+        rebuildRatings()
+        if not sameRatings(playerRatings(), kept):
+            raise ValueError("rebuildRatings() should reproduce the ratings "
+                             "kept round by round with " + system)
+
+
+def testDeletingPlayers():
+    clearAllTables()
+    tournament_id = newTournament()
+    player_ids = [row[0] for row in playerStandings(tournament_id)]
+    rateRound([(player_ids[0], player_ids[1], player_ids[0], False),
+               (player_ids[2], player_ids[2], None, False)], 'elo')
+    tournament.RATING_SYSTEM = 'elo'
+    rated = dict((row[0], row[2:]) for row in playerRatings())
+    if rated[player_ids[2]] != (1500.0, 0.0, 0.0, 0):
+        raise ValueError("A bye should not be rated.")
+    if rated[player_ids[0]][0] <= rated[player_ids[1]][0]:
+        raise ValueError("The winner should be rated above the loser.")
+    clearAllTables()
+    if playerRatings():
+        raise ValueError("Ratings should be deleted with their players.")
+
+
+def testNoResult():
+    clearAllTables()
+    tournament_id = newTournament()
+    player_ids = [row[0] for row in playerStandings(tournament_id)]
+    results = [(player_ids[0], player_ids[1], None, False),
+               (player_ids[2], player_ids[3], player_ids[2], False)]
+    reportMatches(tournament_id, results)
+    tournament.RATING_SYSTEM = 'elo'
+    for rate in [lambda: rateRound(results), rebuildRatings]:
+        rate()
+        rated = dict((row[0], row[2:]) for row in playerRatings())
+        if rated[player_ids[0]] != (1500.0, 0.0, 0.0, 0) or \
+                rated[player_ids[1]] != (1500.0, 0.0, 0.0, 0):
+            raise ValueError("A match with no result should not be rated.")
+        if rated[player_ids[2]][0] <= rated[player_ids[3]][0]:
+            raise ValueError("The winner should be rated above the loser.")
+
+
+def onEveryBackend(test):
+    """Runs a test on each backend."""
+    directory = tempfile.mkdtemp()
+    system = tournament.RATING_SYSTEM
+    try:
+        tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+        for backend in ['postgresql', 'memory', 'sqlite']:
+            useBackend(backend)
+            try:
+                test()
+            except psycopg2.OperationalError:
+                print "PostgreSQL is not available; skipping it."
+    finally:
+        tournament.RATING_SYSTEM = system
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    testPublishedExamples()
+    testRatingPeriods()
+    backend = tournament.BACKEND
+    try:
+        onEveryBackend(testRebuildMatchesRounds)
+        print "3. Rebuilding ratings reproduces the ratings kept by round."
+        onEveryBackend(testDeletingPlayers)
+        print "4. Byes are not rated, and ratings go with their players."
+        onEveryBackend(testNoResult)
+        print "5. Matches with no result are not rated."
+    finally:
+        useBackend(backend)
+    print "Success!  All tests pass!"
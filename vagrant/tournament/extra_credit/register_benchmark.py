@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# Benchmark for registering players
+#
+# Registers the same number of players into a scratch tournament with
+# registerPlayer() and registerCompetitor() one at a time, and with
+# registerPlayers() in bulk, and prints the throughput of each.  The scratch
+# tournaments and their players are deleted afterwards.
+
+import argparse
+import time
+
+from tournament import *
+
+
+def createScratchTournament():
+    """Creates an empty tournament.  Returns its id."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""INSERT INTO tournaments (name)
+                            VALUES ('Register benchmark') RETURNING id;""")
+        return dbcursor.fetchone()[0]
+
+
+def dropScratchTournament(tournament_id):
+    """Deletes a scratch tournament and its players."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""DELETE FROM competitors WHERE tournament_id = %s
+                            RETURNING competitor_id;""",
+                         (tournament_id,))
+        player_ids = [row[0] for row in dbcursor.fetchall()]
+        dbcursor.execute("DELETE FROM tournaments WHERE id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM players WHERE id = ANY(%s);",
+                         (player_ids,))
+
+
+def registerOneByOne(tournament_id, names):
+    """Registers players with one registerPlayer() and registerCompetitor()
+    call each."""
+    for name in names:
+        registerPlayer(name)
+        with transaction() as dbcursor:
+            dbcursor.execute("SELECT currval(pg_get_serial_sequence("
+                             "'players', 'id'));")
+            player_id = dbcursor.fetchone()[0]
+        registerCompetitor(tournament_id, player_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times registerPlayer() against registerPlayers().")
+    parser.add_argument('--players', type=int, default=10000)
+    args = parser.parse_args()
+
+    names = ["Benchmark player %d" % n for n in range(args.players)]
+    single = createScratchTournament()
+    bulk = createScratchTournament()
+    try:
+        start = time.time()
+        registerOneByOne(single, names)
+        singleSeconds = time.time() - start
+
+        start = time.time()
+        registerPlayers(names, bulk)
+        bulkSeconds = time.time() - start
+
+        if countCompetitors(single) != countCompetitors(bulk):
+            raise ValueError("Both paths should register every player.")
+
+        print "%d players registered into a tournament" % args.players
+        for label, seconds in (("One by one", singleSeconds),
+                               ("registerPlayers", bulkSeconds)):
+            print "%-16s %8.3f s %10.0f players/s" % (label, seconds,
+                                                      args.players / seconds)
+    finally:
+        dropScratchTournament(single)
+        dropScratchTournament(bulk)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+#
+# Benchmark for recording match results
+#
+# Plays rounds of a scratch tournament twice: once reporting each match with
+# reportMatch(), and once reporting each round with reportMatches().  Checks
+# that both leave the same standings and prints the throughput of each.  The
+# scratch tournaments and their players are deleted afterwards.
+
+import argparse
+import random
+import time
+
+from tournament import *
+
+
+def createScratchTournament(playerCount):
+    """Creates a tournament of new players.  Returns (tournament_id,
+    player_ids)."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""INSERT INTO tournaments (name)
+                            VALUES ('Report benchmark') RETURNING id;""")
+        tournament_id = dbcursor.fetchone()[0]
+        dbcursor.execute("""INSERT INTO players (name)
+                            SELECT 'Benchmark player ' || n
+                            FROM generate_series(1, %s) AS n
+                            RETURNING id;""",
+                         (playerCount,))
+        player_ids = [row[0] for row in dbcursor.fetchall()]
+        dbcursor.execute("""INSERT INTO competitors (tournament_id,
+                            competitor_id, competitor_bye)
+                            SELECT %s, id, False FROM players
+                            WHERE id = ANY(%s);""",
+                         (tournament_id, player_ids,))
+        # Give the planner row counts that include the new competitors
+        dbcursor.execute("ANALYZE competitors;")
+        dbcursor.execute("ANALYZE players;")
+    rebuildStandings(tournament_id)
+    return tournament_id, player_ids
+
+
+def dropScratchTournament(tournament_id, player_ids):
+    """Deletes everything createScratchTournament() made."""
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM matches WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM competitors WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM tournaments WHERE id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM players WHERE id = ANY(%s);",
+                         (player_ids,))
+
+
+def randomRounds(playerCount, roundCount, seed):
+    """Returns rounds of random results between player positions, in which
+    no pair of positions meets twice.  Player position i meets position
+    i + r (mod playerCount) in round r."""
+    rng = random.Random(seed)
+    rounds = []
+    for roundNumber in range(1, roundCount + 1):
+        offset = roundNumber * 2 - 1
+        results = []
+        for position in range(0, playerCount, 2):
+            opponent = (position + offset) % playerCount
+            outcome = rng.random()
+            if outcome < 0.1:
+                results.append((position, opponent, None, True))
+            else:
+                winner = position if outcome < 0.55 else opponent
+                results.append((position, opponent, winner, False))
+        rounds.append(results)
+    return rounds
+
+
+def resultsFor(results, player_ids):
+    """Maps the player positions in 'results' to player ids."""
+    return [(player_ids[player1], player_ids[player2],
+             None if winner is None else player_ids[winner], draw)
+            for (player1, player2, winner, draw) in results]
+
+
+def standingsByPosition(tournament_id, player_ids):
+    """Returns the standings of a tournament keyed by player position."""
+    positions = dict((player_id, position)
+                     for (position, player_id) in enumerate(player_ids))
+    return sorted((positions[row[0]],) + tuple(row[2:])
+                  for row in playerStandings(tournament_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times reportMatch() against reportMatches().")
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.players % 2 or args.rounds * 2 > args.players:
+        parser.error("--players must be even and at least twice --rounds")
+
+    rounds = randomRounds(args.players, args.rounds, args.seed)
+    matchCount = sum(len(results) for results in rounds)
+    single = createScratchTournament(args.players)
+    bulk = createScratchTournament(args.players)
+    try:
+        tournament_id, player_ids = single
+        start = time.time()
+        for results in rounds:
+            for result in resultsFor(results, player_ids):
+                reportMatch(tournament_id, *result)
+        singleSeconds = time.time() - start
+
+        tournament_id, player_ids = bulk
+        start = time.time()
+        for results in rounds:
+            reportMatches(tournament_id, resultsFor(results, player_ids))
+        bulkSeconds = time.time() - start
+
+        if standingsByPosition(*single) != standingsByPosition(*bulk):
+            raise ValueError("reportMatch() and reportMatches() leave "
+                             "different standings.")
+
+        print "%d players, %d rounds, %d matches: both paths leave the " \
+              "same standings" % (args.players, args.rounds, matchCount)
+        for label, seconds in (("reportMatch", singleSeconds),
+                               ("reportMatches", bulkSeconds)):
+            print "%-14s %8.3f s %10.0f matches/s" % (label, seconds,
+                                                      matchCount / seconds)
+    finally:
+        dropScratchTournament(*single)
+        dropScratchTournament(*bulk)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+#
+# Test cases for createRound(), currentRound(), fetchRound() and
+# completeRound()
+#
+# Runs on PostgreSQL, in memory and on SQLite.  PostgreSQL is skipped if the
+# database cannot be reached.  Like extra_credit_tests.py, this empties the
+# tables of each backend first.
+
+import os
+import shutil
+import tempfile
+import threading
+
+import psycopg2
+
+import tournament
+from tournament import *
+
+PLAYERS = 9
+WORKERS = 8
+
+
+def clearAllTables():
+    """Empties all tables of the selected backend."""
+    deleteMatches()
+    deleteCompetitors()
+    deleteTournaments()
+    deletePlayers()
+
+
+def newTournament():
+    """Creates a tournament of PLAYERS new players on the selected backend.
+    Returns its id."""
+    clearAllTables()
+    createTournament("Rounds test")
+    dbconnection = connect()
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("SELECT id FROM tournaments;")
+    tournament_id = dbcursor.fetchall()[0][0]
+    dbconnection.close()
+    registerPlayers(["Rounds test player %d" % n for n in range(PLAYERS)],
+                    tournament_id)
+    return tournament_id
+
+
+def countByes(tournament_id):
+    """Returns the number of byes given in a tournament."""
+    return len([row for row in playerStandings(tournament_id) if row[2]])
+
+
+def testRetryReturnsTheSameRound():
+    tournament_id = newTournament()
+    pairings = createRound(tournament_id, 1)
+    if len(pairings) != PLAYERS // 2:
+        raise ValueError("createRound() should pair every player but the "
+                         "one with the bye.")
+    if createRound(tournament_id, 1) != pairings:
+        raise ValueError("Creating a round again should return its stored "
+                         "pairings.")
+    if countByes(tournament_id) != 1:
+        raise ValueError("Creating a round again should not give another "
+                         "bye.")
+    if standingsDifferences(tournament_id):
+        raise ValueError("The bye should be recorded in the standings.")
+
+
+def testRoundsAreCreatedInOrder():
+    tournament_id = newTournament()
+    createRound(tournament_id, 1)
+    try:
+        createRound(tournament_id, 3)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("createRound() should not skip a round.")
+    for round_number in [0, -1]:
+        try:
+            createRound(tournament_id, round_number)
+        except ValueError:
+            pass
+        else:
+            raise ValueError("createRound() should reject round %s." %
+                             round_number)
+    first = set()
+    for (id1, name1, id2, name2) in createRound(tournament_id, 1):
+        reportMatch(tournament_id, id1, id2, id1, False)
+        first.add(frozenset([id1, id2]))
+    for (id1, name1, id2, name2) in createRound(tournament_id, 2):
+        if frozenset([id1, id2]) in first:
+            raise ValueError("The second round should not repeat a pairing.")
+    if countByes(tournament_id) != 2:
+        raise ValueError("Each round should give one bye.")
+
+
+def testConcurrentCalls():
+    tournament_id = newTournament()
+    results = []
+    errors = []
+
+    def worker():
+        try:
+            results.append(createRound(tournament_id, 1))
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker) for _ in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    if len(results) != WORKERS or any(result != results[0]
+                                      for result in results):
+        raise ValueError("Every caller should get the same pairings.")
+    if countByes(tournament_id) != 1:
+        raise ValueError("Concurrent callers should give one bye between "
+                         "them.")
+
+
+def testReadingRounds():
+    tournament_id = newTournament()
+    if currentRound(tournament_id) is not None:
+        raise ValueError("A tournament without rounds has no current round.")
+    pairings = createRound(tournament_id, 1)
+    for _ in range(3):
+        if currentRound(tournament_id) != (1, pairings, False):
+            raise ValueError("currentRound() should return the stored "
+                             "pairings of the latest round.")
+    if countByes(tournament_id) != 1:
+        raise ValueError("Reading a round should not give another bye.")
+    try:
+        fetchRound(tournament_id, 2)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("fetchRound() should reject a round that has not "
+                         "been created.")
+
+
+def testCompletingRounds():
+    tournament_id = newTournament()
+    pairings = createRound(tournament_id, 1)
+    try:
+        createRound(tournament_id, 2)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("A round should not be created before the last "
+                         "one is complete.")
+
+    results = [(id1, id2, id1, False) for (id1, name1, id2, name2)
+               in pairings]
+    for invalid in [results[1:], results + [(pairings[0][0],
+                                             pairings[1][0], None, True)]]:
+        try:
+            completeRound(tournament_id, 1, invalid)
+        except ValueError:
+            pass
+        else:
+            raise ValueError("completeRound() should reject results that "
+                             "do not match the round's pairings.")
+    completeRound(tournament_id, 1, results)
+    if fetchRound(tournament_id, 1) != (1, pairings, True):
+        raise ValueError("A round should be complete once its results are "
+                         "recorded.")
+    if standingsDifferences(tournament_id):
+        raise ValueError("completeRound() should update the standings.")
+    try:
+        completeRound(tournament_id, 1, results)
+    except ValueError:
+        pass
+    else:
+        raise ValueError("A round should only be completed once.")
+    if currentRound(tournament_id)[0] != 1 or \
+            createRound(tournament_id, 2) != currentRound(tournament_id)[1]:
+        raise ValueError("The next round should be created once the last "
+                         "one is complete.")
+
+
+def onEveryBackend(test):
+    """Runs a test on each backend."""
+    directory = tempfile.mkdtemp()
+    try:
+        tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+        for backend in ['postgresql', 'memory', 'sqlite']:
+            useBackend(backend)
+            try:
+                test()
+            except psycopg2.OperationalError:
+                print "PostgreSQL is not available; skipping it."
+    finally:
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    backend = tournament.BACKEND
+    try:
+        onEveryBackend(testRetryReturnsTheSameRound)
+        print "1. Creating a round again returns the same pairings."
+        onEveryBackend(testRoundsAreCreatedInOrder)
+        print "2. Rounds are created in order, each with its own bye."
+        onEveryBackend(testConcurrentCalls)
+        print "3. Concurrent callers create a round once, with one bye."
+        onEveryBackend(testReadingRounds)
+        print "4. Stored rounds are read without side effects."
+        onEveryBackend(testCompletingRounds)
+        print "5. A round is completed with exactly one result per pairing."
+    finally:
+        useBackend(backend)
+    print "Success!  All tests pass!"
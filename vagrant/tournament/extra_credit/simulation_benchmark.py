@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+#
+# Simulation benchmark for the tournament API
+#
+# Plays full Swiss events of each size through tournament.py, with seeded
+# random results, and records the latency of every swissPairings(),
+# reportMatch() and playerStandings() call through metrics.py.  Prints
+# latency percentiles and, on PostgreSQL and SQLite, the number of statements
+# each call sends, and can write the results as JSON so that runs of
+# different versions can be compared.
+#
+# Each event is played in a scratch tournament.  On PostgreSQL it is deleted
+# afterwards; the memory and SQLite backends start from empty data.
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+
+import metrics
+import tournament
+from tournament import *
+
+# The calls that are timed, in the order they are reported
+OPERATIONS = ('registerPlayers', 'swissPairings', 'reportMatch',
+              'reportMatches', 'playerStandings')
+
+
+class Recorder(object):
+    """Collects the measurements of every call to the timed functions.  Is
+    added to a metrics.MetricsRegistry as a callback."""
+
+    def __init__(self):
+        self.calls = dict((operation, []) for operation in OPERATIONS)
+
+    def __call__(self, call):
+        if call.name in self.calls:
+            self.calls[call.name].append(call)
+
+    def summary(self, countStatements):
+        """Returns the percentiles of each operation that was called."""
+        summary = {}
+        for operation in OPERATIONS:
+            calls = self.calls[operation]
+            if not calls:
+                continue
+            latencies = sorted(call.seconds for call in calls)
+            summary[operation] = {
+                'calls': len(calls),
+                'mean': sum(latencies) / len(latencies),
+                'p50': percentile(latencies, 0.50),
+                'p90': percentile(latencies, 0.90),
+                'p99': percentile(latencies, 0.99),
+                'max': latencies[-1],
+                'statements_per_call':
+                    float(sum(call.statements for call in calls)) /
+                    len(calls) if countStatements else None,
+                'rows_per_call':
+                    float(sum(call.rows for call in calls)) / len(calls)
+                    if countStatements else None,
+            }
+        return summary
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of a sorted list of values."""
+    index = int(math.ceil(fraction * len(values))) - 1
+    return values[max(index, 0)]
+
+
+def swissRounds(playerCount):
+    """Returns the number of rounds in a full Swiss event: enough for one
+    player to finish with a perfect score."""
+    return max(1, int(math.ceil(math.log(playerCount, 2))))
+
+
+def createScratchTournament(playerCount):
+    """Creates a tournament of new players.  Returns (tournament_id,
+    player_ids)."""
+    createTournament("Simulation benchmark")
+    dbconnection = connect()
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("SELECT id FROM tournaments;")
+    tournament_id = max(row[0] for row in dbcursor.fetchall())
+    dbconnection.close()
+    player_ids = registerPlayers(["Simulated player %d" % n
+                                  for n in range(playerCount)],
+                                 tournament_id)
+    return tournament_id, player_ids
+
+
+def dropScratchTournament(tournament_id, player_ids):
+    """Deletes a scratch tournament from PostgreSQL."""
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM matches WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM competitors WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM tournaments WHERE id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM players WHERE id = ANY(%s);",
+                         (player_ids,))
+
+
+def playEvent(tournament_id, rounds, mode, drawRate, bulk, rng):
+    """Plays 'rounds' rounds of random results.  Returns the number of
+    matches reported, not counting byes."""
+    matchCount = 0
+    for _ in range(rounds):
+        pairings = swissPairings(tournament_id, mode)
+        results = []
+        for (id1, name1, id2, name2) in pairings:
+            outcome = rng.random()
+            if outcome < drawRate:
+                results.append((id1, id2, None, True))
+            else:
+                winner = id1 if rng.random() < 0.5 else id2
+                results.append((id1, id2, winner, False))
+        if bulk:
+            reportMatches(tournament_id, results)
+        else:
+            for result in results:
+                reportMatch(tournament_id, *result)
+        playerStandings(tournament_id)
+        matchCount += len(results)
+    return matchCount
+
+
+def runEvent(args, playerCount, registry, directory):
+    """Plays one event on the selected backend.  Returns its results."""
+    if args.backend == 'sqlite':
+        tournament.SQLITE_PATH = os.path.join(directory,
+                                              'event%d.db' % playerCount)
+    useBackend(args.backend)
+    recorder = Recorder()
+    registry.addCallback(recorder)
+    rounds = args.rounds or swissRounds(playerCount)
+    start = time.time()
+    tournament_id, player_ids = createScratchTournament(playerCount)
+    try:
+        matchCount = playEvent(tournament_id, rounds, args.mode,
+                               args.draw_rate, args.bulk,
+                               random.Random(args.seed))
+    finally:
+        registry.removeCallback(recorder)
+        if args.backend == 'postgresql':
+            dropScratchTournament(tournament_id, player_ids)
+        elif args.backend == 'sqlite':
+            tournament._backend.close()
+    return {
+        'players': playerCount,
+        'rounds': rounds,
+        'matches': matchCount,
+        'seconds': time.time() - start,
+        'operations': recorder.summary(args.backend != 'memory'),
+    }
+
+
+def printResults(result):
+    """Prints one event's results as a table, in milliseconds."""
+    print "%d players, %d rounds, %d matches in %.2f s" % (
+        result['players'], result['rounds'], result['matches'],
+        result['seconds'])
+    print "Operation       |   Calls |   Mean |    p50 |    p90 |    p99 |" \
+          "    Max | Statements"
+    print "-" * 84
+    for operation in OPERATIONS:
+        stats = result['operations'].get(operation)
+        if stats is None:
+            continue
+        statements = stats['statements_per_call']
+        print "%-15s | %7d | %6.2f | %6.2f | %6.2f | %6.2f | %6.2f | %s" % (
+            operation, stats['calls'], stats['mean'] * 1000,
+            stats['p50'] * 1000, stats['p90'] * 1000, stats['p99'] * 1000,
+            stats['max'] * 1000,
+            "-" if statements is None else "%.1f" % statements)
+    print
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulates Swiss events and times the tournament API.")
+    parser.add_argument('--players', type=int, nargs='+',
+                        default=[10, 100, 1000])
+    parser.add_argument('--rounds', type=int, default=None,
+                        help='rounds per event (default: a full Swiss '
+                             'event, ceil(log2(players)))')
+    parser.add_argument('--backend', default=tournament.BACKEND,
+                        choices=['postgresql', 'memory', 'sqlite'])
+    parser.add_argument('--mode', default=tournament.PAIRING_MODE,
+                        choices=['greedy', 'optimal'])
+    parser.add_argument('--draw-rate', type=float, default=0.1)
+    parser.add_argument('--bulk', action='store_true',
+                        help='report each round with reportMatches()')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', default='',
+                        help='a name for this run, such as a version')
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args()
+
+    registry = metrics.enable()
+    directory = tempfile.mkdtemp()
+    results = []
+    try:
+        for playerCount in args.players:
+            result = runEvent(args, playerCount, registry, directory)
+            printResults(result)
+            results.append(result)
+    finally:
+        metrics.disable()
+        shutil.rmtree(directory)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'label': args.label,
+                'time': datetime.datetime.utcnow().isoformat() + 'Z',
+                'python': platform.python_version(),
+                'backend': args.backend,
+                'mode': args.mode,
+                'draw_rate': args.draw_rate,
+                'bulk': args.bulk,
+                'seed': args.seed,
+                'events': results,
+            }, output, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,706 @@
+#
+# sqlite_backend.py -- SQLite storage for the tournament functions
+#
+# For venues without a PostgreSQL server.  Select it with
+# TOURNAMENT_BACKEND=sqlite, setting TOURNAMENT_SQLITE_PATH to the database
+# file, or at runtime with tournament.useBackend('sqlite').
+#
+# The schema in tournament_sqlite.sql reproduces tournament.sql, and the
+# queries below reproduce the ones in tournament.py, so standings are kept
+# and ordered the same way.  Each thread keeps one connection open in WAL
+# mode, so readers do not block the writer, and the statements below stay
+# prepared in that connection's statement cache.
+#
+
+import contextlib
+import os
+import sqlite3
+import threading
+
+import metrics
+import pairing
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'tournament_sqlite.sql')
+
+# How many prepared statements each connection keeps; more than the number
+# of distinct statements below, so none are ever evicted
+CACHED_STATEMENTS = 64
+
+# How long to wait for another connection's write lock, in seconds
+BUSY_TIMEOUT = 30
+
+# The most host parameters one statement may take.  SQLite builds before
+# 3.32, including those shipped with many Python 2.7 installs, allow 999
+MAX_VARIABLES = 999
+
+MAINTAINED_STANDINGS_QUERY = """
+    SELECT  players.id, players.name, standings.bye, standings.wins,
+            standings.draws, standings.omw, standings.matches
+    FROM    standings INNER JOIN players
+            ON (players.id = standings.player_id)
+    WHERE   standings.tournament_id = :tournament_id
+    ORDER BY standings.wins DESC, standings.draws DESC, standings.omw DESC,
+             standings.matches DESC, standings.player_id;"""
+
+# The same single pass over a tournament's matches as STANDINGS_QUERY in
+# tournament.py
+STANDINGS_QUERY = """
+    WITH results AS (
+        SELECT  player_1_id AS player_id, player_2_id AS opponent_id,
+                winner_id, draw
+        FROM    matches
+        WHERE   tournament_id = :tournament_id
+        UNION ALL
+        SELECT  player_2_id, player_1_id, winner_id, draw
+        FROM    matches
+        WHERE   tournament_id = :tournament_id AND
+                player_2_id <> player_1_id
+    ),
+    records AS (
+        SELECT  player_id,
+                SUM(CASE WHEN winner_id = player_id THEN 1 ELSE 0 END)
+                    AS wins,
+                SUM(CASE WHEN draw THEN 1 ELSE 0 END) AS draws,
+                COUNT(*) AS matches
+        FROM    results
+        GROUP BY player_id
+    ),
+    opponent_wins AS (
+        SELECT  results.player_id, SUM(records.wins) AS omw
+        FROM    results INNER JOIN records
+                ON (records.player_id = results.opponent_id)
+        WHERE   results.opponent_id <> results.player_id
+        GROUP BY results.player_id
+    )
+    SELECT  players.id, players.name, competitors.competitor_bye,
+            COALESCE(records.wins, 0) AS "Wins",
+            COALESCE(records.draws, 0) AS "Draws",
+            COALESCE(opponent_wins.omw, 0) AS "OMW",
+            COALESCE(records.matches, 0) AS "Matches"
+    FROM    players INNER JOIN competitors
+            ON (players.id = competitors.competitor_id)
+            LEFT JOIN records ON (records.player_id = players.id)
+            LEFT JOIN opponent_wins ON (opponent_wins.player_id = players.id)
+    WHERE   competitors.tournament_id = :tournament_id
+    ORDER BY "Wins" DESC, "Draws" DESC, "OMW" DESC, "Matches" DESC,
+             players.id;"""
+
+INSERT_MATCH = """
+    INSERT INTO matches (tournament_id, player_1_id, player_2_id, winner_id,
+                         draw)
+    VALUES (?, ?, ?, ?, ?);"""
+
+# The same query as tournament.ROUND_PAIRINGS_QUERY
+ROUND_PAIRINGS_QUERY = """
+    SELECT  pairings.player_1_id, first.name, pairings.player_2_id,
+            second.name, matches.tournament_id IS NOT NULL
+    FROM    pairings
+            INNER JOIN players AS first ON (first.id = pairings.player_1_id)
+            INNER JOIN players AS second
+            ON (second.id = pairings.player_2_id)
+            LEFT JOIN matches
+            ON (matches.tournament_id = pairings.tournament_id AND
+                matches.player_1_id = MIN(pairings.player_1_id,
+                                          pairings.player_2_id) AND
+                matches.player_2_id = MAX(pairings.player_1_id,
+                                          pairings.player_2_id))
+    WHERE   pairings.tournament_id = :tournament_id AND
+            pairings.round = :round
+    ORDER BY pairings.board;"""
+
+INSERT_COMPETITOR = """
+    INSERT INTO competitors (tournament_id, competitor_id, competitor_bye)
+    VALUES (?, ?, 0);"""
+
+INSERT_STANDINGS = """
+    INSERT INTO standings (tournament_id, player_id, bye, wins, draws, omw,
+                           matches)
+    VALUES (?, ?, 0, 0, 0, 0, 0);"""
+
+# The statements tournament._recordStandings() runs, in the same order
+RECORD_MATCHES = """
+    UPDATE standings
+    SET matches = matches + 1,
+        draws = draws + CASE WHEN :draw THEN 1 ELSE 0 END
+    WHERE tournament_id = :tournament_id AND
+          player_id IN (:player1, :player2);"""
+
+RECORD_WIN = """
+    UPDATE standings SET wins = wins + 1
+    WHERE tournament_id = :tournament_id AND player_id = :winner;"""
+
+RECORD_WINNER_OPPONENTS = """
+    UPDATE standings SET omw = omw + 1
+    WHERE tournament_id = :tournament_id AND
+          player_id NOT IN (:player1, :player2) AND
+          player_id IN (
+          SELECT player_2_id FROM matches
+          WHERE  tournament_id = :tournament_id AND player_1_id = :winner
+          UNION
+          SELECT player_1_id FROM matches
+          WHERE  tournament_id = :tournament_id AND player_2_id = :winner);"""
+
+RECORD_NEW_OPPONENTS = """
+    UPDATE standings
+    SET omw = omw + (
+        SELECT opponent.wins FROM standings AS opponent
+        WHERE  opponent.tournament_id = :tournament_id AND
+               opponent.player_id = CASE WHEN standings.player_id = :player1
+                                         THEN :player2 ELSE :player1 END)
+    WHERE tournament_id = :tournament_id AND
+          player_id IN (:player1, :player2);"""
+
+
+# The statements SQLiteBackend._recordAllStandings() runs, one for each
+# player rather than one for each match, in the same order
+RECORD_WINNER_EARLIER_OPPONENTS = """
+    UPDATE standings SET omw = omw + :wins
+    WHERE tournament_id = :tournament_id AND
+          player_id <> :winner AND
+          player_id IN (
+          SELECT player_2_id FROM matches
+          WHERE  tournament_id = :tournament_id AND player_1_id = :winner
+          UNION
+          SELECT player_1_id FROM matches
+          WHERE  tournament_id = :tournament_id AND player_2_id = :winner);"""
+
+RECORD_PLAYED = """
+    UPDATE standings
+    SET wins = wins + :wins, draws = draws + :draws,
+        matches = matches + :matches
+    WHERE tournament_id = :tournament_id AND player_id = :player;"""
+
+RECORD_OPPONENT = """
+    UPDATE standings
+    SET omw = omw + (
+        SELECT opponent.wins FROM standings AS opponent
+        WHERE  opponent.tournament_id = :tournament_id AND
+               opponent.player_id = :opponent)
+    WHERE tournament_id = :tournament_id AND player_id = :player;"""
+
+
+class SQLiteConnection(object):
+    """A thread's connection to the database, as returned by connect().
+
+    Behaves like the underlying sqlite3 connection, except that close()
+    only rolls back uncommitted work, leaving the connection open for the
+    backend to reuse.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        self._connection.rollback()
+
+
+class SQLiteBackend(object):
+    """Stores tournament data in a SQLite database.
+
+    Has a method for each tournament function that touches the database,
+    taking the same arguments and returning the same results.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        """Returns this thread's connection, opening it if necessary."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT,
+                                         cached_statements=CACHED_STATEMENTS)
+
+            # Return names as str, as psycopg2 does
+            connection.text_factory = str
+            connection.execute("PRAGMA foreign_keys = ON;")
+            connection.execute("PRAGMA journal_mode = WAL;")
+            connection.execute("PRAGMA synchronous = NORMAL;")
+            with open(SCHEMA_FILE) as schema:
+                connection.executescript(schema.read())
+            self._local.connection = connection
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Yields a cursor on this thread's connection.  The transaction is
+        committed when the 'with' block completes and rolled back if it
+        raises."""
+        connection = metrics.instrumentConnection(self._connection())
+        try:
+            dbcursor = connection.cursor()
+            yield dbcursor
+            connection.commit()
+        finally:
+            # Does nothing once the transaction has been committed
+            connection.rollback()
+
+    def close(self):
+        """Closes this thread's connection."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def connect(self):
+        """Returns this thread's connection to the database."""
+        return SQLiteConnection(self._connection())
+
+    def deleteMatches(self):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("DELETE FROM rounds;")
+            dbcursor.execute("DELETE FROM matches;")
+            dbcursor.execute("""UPDATE standings
+                                SET wins = 0, draws = 0, omw = 0,
+                                    matches = 0;""")
+
+    def deleteCompetitors(self):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("DELETE FROM competitors;")
+
+    def deleteTournaments(self):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("DELETE FROM tournaments;")
+
+    def deletePlayers(self):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("DELETE FROM players;")
+
+    def countCompetitors(self, tournament_id):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("""SELECT COUNT(*) FROM competitors
+                                WHERE tournament_id = ?;""",
+                             (tournament_id,))
+            return dbcursor.fetchone()[0]
+
+    def createTournament(self, name):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("INSERT INTO tournaments (name) VALUES (?);",
+                             (name,))
+
+    def registerPlayer(self, name):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("INSERT INTO players (name) VALUES (?);",
+                             (name,))
+
+    def registerPlayers(self, names, tournament_id=None):
+        player_ids = []
+        with self._transaction() as dbcursor:
+            for name in names:
+                dbcursor.execute("INSERT INTO players (name) VALUES (?);",
+                                 (name,))
+                player_ids.append(dbcursor.lastrowid)
+            if tournament_id is not None:
+                self._insertCompetitors(dbcursor, tournament_id, player_ids)
+        return player_ids
+
+    def registerCompetitor(self, tournament_id, competitor_id):
+        self.registerCompetitors(tournament_id, [competitor_id])
+
+    def registerCompetitors(self, tournament_id, competitor_ids):
+        with self._transaction() as dbcursor:
+            self._insertCompetitors(dbcursor, tournament_id, competitor_ids)
+
+    def _insertCompetitors(self, dbcursor, tournament_id, competitor_ids):
+        """Registers competitors, each with an empty record in the standings
+        table, on an open cursor."""
+        # A row fetched from a cursor may be passed as it is, as psycopg2
+        # also accepts it
+        rows = [(tournament_id, competitor_id[0]
+                 if isinstance(competitor_id, tuple) else competitor_id)
+                for competitor_id in competitor_ids]
+        dbcursor.executemany(INSERT_COMPETITOR, rows)
+        dbcursor.executemany(INSERT_STANDINGS, rows)
+
+    def useCompetitorBye(self, tournament_id, competitor_id):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("""UPDATE competitors SET competitor_bye = 1
+                                WHERE tournament_id = ? AND
+                                      competitor_id = ?;""",
+                             (tournament_id, competitor_id,))
+            dbcursor.execute("""UPDATE standings SET bye = 1
+                                WHERE tournament_id = ? AND
+                                      player_id = ?;""",
+                             (tournament_id, competitor_id,))
+
+    def playerStandings(self, tournament_id):
+        with self._transaction() as dbcursor:
+            return self._fetchStandings(dbcursor, tournament_id)
+
+    def _fetchStandings(self, dbcursor, tournament_id,
+                        query=MAINTAINED_STANDINGS_QUERY):
+        """Reads the standings for a tournament on an open cursor, with byes
+        as booleans."""
+        dbcursor.execute(query, {'tournament_id': tournament_id})
+        return [(row[0], row[1], bool(row[2]), row[3], row[4], row[5],
+                 row[6]) for row in dbcursor.fetchall()]
+
+    def streamStandings(self, tournament_id, page_size):
+        """Yields the rows of tournament.iterStandings(), fetching
+        'page_size' at a time.
+
+        The rows are read on a connection of their own, as a commit on this
+        thread's connection would reset the stream's cursor.
+        """
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        connection.text_factory = str
+        try:
+            dbcursor = connection.cursor()
+            dbcursor.execute(MAINTAINED_STANDINGS_QUERY,
+                             {'tournament_id': tournament_id})
+            while True:
+                rows = dbcursor.fetchmany(page_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield (row[0], row[1], bool(row[2]), row[3], row[4],
+                           row[5], row[6])
+        finally:
+            connection.close()
+
+    def reportMatch(self, tournament_id, player_1_id, player_2_id, winner,
+                    draw):
+        player1ID = min(player_1_id, player_2_id)
+        player2ID = max(player_1_id, player_2_id)
+        with self._transaction() as dbcursor:
+            dbcursor.execute(INSERT_MATCH, (tournament_id, player1ID,
+                                            player2ID, winner, bool(draw),))
+            self._recordStandings(dbcursor, tournament_id, player1ID,
+                                  player2ID, winner, draw)
+
+    def _recordStandings(self, dbcursor, tournament_id, player1, player2,
+                         winner, draw):
+        """Updates the standings table for a match that has just been
+        inserted, as tournament._recordStandings() does."""
+        match = {'tournament_id': tournament_id, 'player1': player1,
+                 'player2': player2, 'winner': winner, 'draw': bool(draw)}
+        dbcursor.execute(RECORD_MATCHES, match)
+        if winner is not None:
+            dbcursor.execute(RECORD_WIN, match)
+            dbcursor.execute(RECORD_WINNER_OPPONENTS, match)
+        if player1 != player2:
+            dbcursor.execute(RECORD_NEW_OPPONENTS, match)
+
+    def insertMatches(self, tournament_id, rows, players):
+        """Records matches already checked by tournament.reportMatches(), as
+        (tournament_id, player_1_id, player_2_id, winner, draw) rows with the
+        lowest player id first."""
+        with self._transaction() as dbcursor:
+            self._writeMatches(dbcursor, tournament_id, rows, players)
+
+    def _writeMatches(self, dbcursor, tournament_id, rows, players):
+        """Inserts checked matches on an open cursor and updates the
+        standings of their players and of the winners' opponents."""
+        players = list(players)
+        missing = set(players)
+        # One parameter is the tournament id, and the rest are players
+        for start in xrange(0, len(players), MAX_VARIABLES - 1):
+            chunk = players[start:start + MAX_VARIABLES - 1]
+            dbcursor.execute("""SELECT competitor_id FROM competitors
+                                WHERE tournament_id = ? AND
+                                      competitor_id IN (%s);""" %
+                             ', '.join('?' * len(chunk)),
+                             [tournament_id] + chunk)
+            missing.difference_update(row[0] for row in dbcursor.fetchall())
+        if missing:
+            raise ValueError("Players %s are not competitors in tournament "
+                             "%s" % (sorted(missing), tournament_id))
+        self._recordAllStandings(dbcursor, tournament_id, rows)
+        dbcursor.executemany(INSERT_MATCH, rows)
+
+    def _recordAllStandings(self, dbcursor, tournament_id, rows):
+        """Updates the standings table for matches that are about to be
+        inserted, as tournament._recordAllStandings() does."""
+        wins = {}
+        draws = {}
+        matches = {}
+        opponents = []
+        for (_, player1, player2, winner, draw) in rows:
+            # A bye lists the same player twice, but counts once
+            for player in set([player1, player2]):
+                matches[player] = matches.get(player, 0) + 1
+                draws[player] = draws.get(player, 0) + (1 if draw else 0)
+            if winner is not None:
+                wins[winner] = wins.get(winner, 0) + 1
+            if player1 != player2:
+                opponents.extend([(player1, player2), (player2, player1)])
+
+        dbcursor.executemany(RECORD_WINNER_EARLIER_OPPONENTS, [
+            {'tournament_id': tournament_id, 'winner': winner,
+             'wins': count} for (winner, count) in wins.iteritems()])
+        dbcursor.executemany(RECORD_PLAYED, [
+            {'tournament_id': tournament_id, 'player': player,
+             'wins': wins.get(player, 0), 'draws': draws[player],
+             'matches': count} for (player, count) in matches.iteritems()])
+        dbcursor.executemany(RECORD_OPPONENT, [
+            {'tournament_id': tournament_id, 'player': player,
+             'opponent': opponent} for (player, opponent) in opponents])
+
+    def rebuildStandings(self, tournament_id=None):
+        with self._transaction() as dbcursor:
+            if tournament_id is None:
+                dbcursor.execute("SELECT id FROM tournaments;")
+                tournament_ids = [row[0] for row in dbcursor.fetchall()]
+            else:
+                tournament_ids = [tournament_id]
+            for tournament_id in tournament_ids:
+                self._rebuildStandings(dbcursor, tournament_id)
+
+    def _rebuildStandings(self, dbcursor, tournament_id):
+        """Recomputes one tournament's rows of the standings table on an open
+        cursor."""
+        dbcursor.execute("DELETE FROM standings WHERE tournament_id = ?;",
+                         (tournament_id,))
+        computed = self._fetchStandings(dbcursor, tournament_id,
+                                        STANDINGS_QUERY)
+        dbcursor.executemany("""INSERT INTO standings (tournament_id,
+                                player_id, bye, wins, draws, omw, matches)
+                                VALUES (?, ?, ?, ?, ?, ?, ?);""",
+                             [(tournament_id, row[0], row[2]) + row[3:]
+                              for row in computed])
+
+    def standingsDifferences(self, tournament_id):
+        with self._transaction() as dbcursor:
+            maintained = self._fetchStandings(dbcursor, tournament_id)
+            computed = self._fetchStandings(dbcursor, tournament_id,
+                                            STANDINGS_QUERY)
+        maintainedRows = dict((row[0], row) for row in maintained)
+        computedRows = dict((row[0], row) for row in computed)
+        differences = []
+        for player_id in sorted(set(maintainedRows) | set(computedRows)):
+            maintainedRow = maintainedRows.get(player_id)
+            computedRow = computedRows.get(player_id)
+            if maintainedRow != computedRow:
+                differences.append((maintainedRow, computedRow))
+        return differences
+
+    def tiebreakData(self, tournament_id):
+        """Returns the competitors and matches tournament.rankedStandings()
+        needs, read in one transaction, with draws as booleans."""
+        with self._transaction() as dbcursor:
+            dbcursor.execute("BEGIN;")
+            dbcursor.execute("""SELECT  players.id, players.name
+                                FROM    competitors INNER JOIN players
+                                        ON (players.id =
+                                            competitors.competitor_id)
+                                WHERE   competitors.tournament_id = ?;""",
+                             (tournament_id,))
+            competitors = dbcursor.fetchall()
+            dbcursor.execute("""SELECT  player_1_id, player_2_id, winner_id,
+                                        draw
+                                FROM    matches
+                                WHERE   tournament_id = ?;""",
+                             (tournament_id,))
+            return competitors, [(row[0], row[1], row[2], bool(row[3]))
+                                 for row in dbcursor.fetchall()]
+
+    def havePlayedPreviously(self, tournament_id, player1, player2):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("""SELECT COUNT(*) FROM matches
+                                WHERE tournament_id = ? AND
+                                      player_1_id = ? AND
+                                      player_2_id = ?;""",
+                             (tournament_id,) +
+                             pairing.pairKey(player1, player2))
+            return dbcursor.fetchone()[0] > 0
+
+    def playedPairs(self, tournament_id):
+        with self._transaction() as dbcursor:
+            return self._fetchPlayedPairs(dbcursor, tournament_id)
+
+    def _fetchPlayedPairs(self, dbcursor, tournament_id):
+        """Loads every pairing played in a tournament on an open cursor."""
+        dbcursor.execute("""SELECT player_1_id, player_2_id FROM matches
+                            WHERE tournament_id = ?;""",
+                         (tournament_id,))
+        return pairing.playedPairSet(dbcursor.fetchall())
+
+    def pairingData(self, tournament_id):
+        """Returns the standings and played pairs swissPairings() needs, read
+        in one transaction."""
+        with self._transaction() as dbcursor:
+            # Reads take a snapshot from their first statement
+            dbcursor.execute("BEGIN;")
+            return (self._fetchStandings(dbcursor, tournament_id),
+                    self._fetchPlayedPairs(dbcursor, tournament_id))
+
+    def pairingDataForTournaments(self, tournament_ids):
+        """Returns the standings and played pairs of several tournaments,
+        keyed by tournament id, read in one transaction.  Each tournament is
+        read with the same prepared statements as pairingData()."""
+        with self._transaction() as dbcursor:
+            dbcursor.execute("BEGIN;")
+            return dict((tournament_id,
+                         (self._fetchStandings(dbcursor, tournament_id),
+                          self._fetchPlayedPairs(dbcursor, tournament_id)))
+                        for tournament_id in tournament_ids)
+
+    def recordByes(self, byes):
+        """Records (tournament_id, player_id) byes in one transaction, as
+        useCompetitorBye() and reportMatch() record a single bye."""
+        with self._transaction() as dbcursor:
+            dbcursor.executemany("""UPDATE competitors SET competitor_bye = 1
+                                    WHERE tournament_id = ? AND
+                                          competitor_id = ?;""", byes)
+            dbcursor.executemany(INSERT_MATCH,
+                                 [(tournament_id, player_id, player_id,
+                                   None, False)
+                                  for (tournament_id, player_id) in byes])
+            dbcursor.executemany("""UPDATE standings
+                                    SET bye = 1, matches = matches + 1
+                                    WHERE tournament_id = ? AND
+                                          player_id = ?;""", byes)
+
+    def createRound(self, tournament_id, round_number, pair):
+        """Stores a round for tournament.createRound(), unless it already
+        exists, and returns its pairings."""
+        with self._transaction() as dbcursor:
+            # Takes the database's write lock at once, so rounds are created
+            # one at a time by every connection and process
+            dbcursor.execute("BEGIN IMMEDIATE;")
+            lastRound, pairings, complete = (
+                self._fetchRound(dbcursor, tournament_id) or (0, [], True))
+            if round_number < lastRound:
+                return self._fetchRound(dbcursor, tournament_id,
+                                        round_number)[1]
+            if round_number == lastRound:
+                return pairings
+            if round_number != lastRound + 1:
+                raise ValueError("Round %s of tournament %s cannot be "
+                                 "created before round %s" %
+                                 (round_number, tournament_id,
+                                  lastRound + 1))
+            if not complete:
+                raise ValueError("Round %s of tournament %s cannot be "
+                                 "created until every result of round %s "
+                                 "is reported" %
+                                 (round_number, tournament_id, lastRound))
+
+            bye, pairings = pair(
+                self._fetchStandings(dbcursor, tournament_id),
+                self._fetchPlayedPairs(dbcursor, tournament_id))
+            dbcursor.execute("""INSERT INTO rounds (tournament_id, round,
+                                bye_id) VALUES (?, ?, ?);""",
+                             (tournament_id, round_number, bye,))
+            if bye is not None:
+                self._recordBye(dbcursor, tournament_id, bye)
+            dbcursor.executemany("""INSERT INTO pairings (tournament_id,
+                                    round, board, player_1_id, player_2_id)
+                                    VALUES (?, ?, ?, ?, ?);""",
+                                 [(tournament_id, round_number, board, id1,
+                                   id2)
+                                  for board, (id1, name1, id2, name2)
+                                  in enumerate(pairings, 1)])
+        return pairings
+
+    def _recordBye(self, dbcursor, tournament_id, player_id):
+        """Records a player's bye on an open cursor, as useCompetitorBye()
+        and reportMatch() do in separate transactions."""
+        dbcursor.execute("""UPDATE competitors SET competitor_bye = 1
+                            WHERE tournament_id = ? AND competitor_id = ?;""",
+                         (tournament_id, player_id,))
+        dbcursor.execute("""UPDATE standings SET bye = 1
+                            WHERE tournament_id = ? AND player_id = ?;""",
+                         (tournament_id, player_id,))
+        dbcursor.execute(INSERT_MATCH, (tournament_id, player_id, player_id,
+                                        None, False,))
+        self._recordStandings(dbcursor, tournament_id, player_id, player_id,
+                              None, False)
+
+    def _fetchRound(self, dbcursor, tournament_id, round_number=None):
+        """Reads a stored round on an open cursor, the latest one unless
+        round_number is given, as tournament._fetchRound() does."""
+        if round_number is None:
+            dbcursor.execute("""SELECT MAX(round) FROM rounds
+                                WHERE tournament_id = ?;""",
+                             (tournament_id,))
+        else:
+            dbcursor.execute("""SELECT round FROM rounds
+                                WHERE tournament_id = ? AND round = ?;""",
+                             (tournament_id, round_number,))
+        row = dbcursor.fetchone()
+        if row is None or row[0] is None:
+            return None
+
+        dbcursor.execute(ROUND_PAIRINGS_QUERY,
+                         {'tournament_id': tournament_id, 'round': row[0]})
+        rows = dbcursor.fetchall()
+        return (row[0], [pairingRow[:4] for pairingRow in rows],
+                all(pairingRow[4] for pairingRow in rows))
+
+    def roundData(self, tournament_id, round_number):
+        """Reads a stored round for tournament.currentRound() and
+        tournament.fetchRound()."""
+        with self._transaction() as dbcursor:
+            dbcursor.execute("BEGIN;")
+            return self._fetchRound(dbcursor, tournament_id, round_number)
+
+    def completeRound(self, tournament_id, round_number, rows, players):
+        """Records results already checked by tournament.completeRound()."""
+        with self._transaction() as dbcursor:
+            dbcursor.execute("BEGIN IMMEDIATE;")
+            stored = self._fetchRound(dbcursor, tournament_id, round_number)
+            if stored is None:
+                raise ValueError("Round %s of tournament %s has not been "
+                                 "created" % (round_number, tournament_id))
+            if stored[2]:
+                raise ValueError("Round %s of tournament %s is already "
+                                 "complete" % (round_number, tournament_id))
+            if set(pairing.pairKey(id1, id2)
+                   for (id1, name1, id2, name2) in stored[1]) != \
+                    set((row[1], row[2]) for row in rows):
+                raise ValueError("The results do not match the pairings of "
+                                 "round %s of tournament %s" %
+                                 (round_number, tournament_id))
+            self._writeMatches(dbcursor, tournament_id, rows, players)
+
+    def ratingData(self):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("""SELECT  players.id, players.name,
+                                        ratings.rating, ratings.deviation,
+                                        ratings.volatility, ratings.matches
+                                FROM    players LEFT JOIN ratings
+                                        ON (ratings.player_id = players.id);
+                             """)
+            return dbcursor.fetchall()
+
+    def updateRatings(self, player_ids, rate):
+        """Replaces some players' ratings for tournament.rateRound()."""
+        with self._transaction() as dbcursor:
+            # Takes the write lock at once, as PostgreSQL takes its advisory
+            # lock, so that updates are made one at a time
+            dbcursor.execute("BEGIN IMMEDIATE;")
+            stored = {}
+            for player_id in player_ids:
+                dbcursor.execute("""SELECT  rating, deviation, volatility,
+                                            matches
+                                    FROM    ratings
+                                    WHERE   player_id = ?;""", (player_id,))
+                row = dbcursor.fetchone()
+                if row is not None:
+                    stored[player_id] = row
+            dbcursor.executemany("""INSERT OR REPLACE INTO ratings
+                                    (player_id, rating, deviation,
+                                     volatility, matches)
+                                    VALUES (?, ?, ?, ?, ?);""",
+                                 rate(stored))
+
+    def rebuildRatings(self, rebuild):
+        """Replaces every rating for tournament.rebuildRatings(), replaying
+        matches in rowid order."""
+        with self._transaction() as dbcursor:
+            dbcursor.execute("BEGIN IMMEDIATE;")
+            dbcursor.execute("""SELECT  player_1_id, player_2_id,
+                                        COALESCE(winner_id, 0), draw
+                                FROM    matches
+                                ORDER BY rowid;""")
+            rows = rebuild(dbcursor.fetchall())
+            dbcursor.execute("DELETE FROM ratings;")
+            dbcursor.executemany("""INSERT INTO ratings (player_id, rating,
+                                    deviation, volatility, matches)
+                                    VALUES (?, ?, ?, ?, ?);""", rows)
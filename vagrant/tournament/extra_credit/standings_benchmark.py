@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#
+# Benchmark for the playerStandings() query
+#
+# Fills a scratch tournament with random match results, then times the
+# set-based STANDINGS_QUERY in tournament.py against the correlated-subquery
+# version it replaced, and checks that both return the same standings.  It
+# also times reading the maintained standings table, and ranking the
+# tournament by every tiebreak in tiebreak.py.  The scratch tournament and
+# its players are deleted afterwards.
+
+import argparse
+import random
+import timeit
+
+import tiebreak
+from tournament import *
+
+# The standings query as it was before it was rewritten as a single
+# aggregation pass: five correlated subqueries per player
+LEGACY_STANDINGS_QUERY = """
+    SELECT  players.id, players.name, competitors.competitor_bye,
+      (SELECT COUNT(*)
+       FROM   matches
+       WHERE  matches.winner_id = players.id AND
+              tournament_id = %(tournament_id)s) as "Wins",
+      (SELECT COUNT(*)
+       FROM   matches
+       WHERE  (matches.player_1_id = players.id OR
+              matches.player_2_id = players.id) AND
+              tournament_id = %(tournament_id)s AND
+              matches.draw = True) as "Draws",
+      (SELECT COUNT(*)
+       FROM   matches
+       WHERE  tournament_id = %(tournament_id)s AND
+              NOT(matches.winner_id = players.id) AND
+             (matches.winner_id IN (
+              SELECT matches.player_1_id
+              FROM   matches
+              WHERE  matches.player_2_id = players.id AND
+                     tournament_id = %(tournament_id)s) OR
+              matches.winner_id IN (
+              SELECT matches.player_2_id
+              FROM   matches
+              WHERE  matches.player_1_id = players.id AND
+                     tournament_id = %(tournament_id)s))) as "OMW",
+      (SELECT COUNT(*)
+       FROM   matches
+       WHERE  (matches.player_1_id = players.id OR
+              matches.player_2_id = players.id) AND
+              tournament_id = %(tournament_id)s) as "Matches"
+    FROM players INNER JOIN competitors
+         ON (players.id = competitors.competitor_id)
+    WHERE competitors.tournament_id = %(tournament_id)s
+    ORDER BY "Wins" DESC, "Draws" DESC, "OMW" DESC, "Matches" DESC;"""
+
+
+def createScratchTournament(playerCount, matchCount, seed):
+    """Creates a tournament with random results between distinct pairs of
+    players, plus a bye for one player in fifty.  Returns (tournament_id,
+    player_ids)."""
+    rng = random.Random(seed)
+    with transaction() as dbcursor:
+        dbcursor.execute("""INSERT INTO tournaments (name)
+                            VALUES ('Standings benchmark') RETURNING id;""")
+        tournament_id = dbcursor.fetchone()[0]
+        dbcursor.execute("""INSERT INTO players (name)
+                            SELECT 'Benchmark player ' || n
+                            FROM generate_series(1, %s) AS n
+                            RETURNING id;""",
+                         (playerCount,))
+        player_ids = [row[0] for row in dbcursor.fetchall()]
+        dbcursor.execute("""INSERT INTO competitors (tournament_id,
+                            competitor_id, competitor_bye)
+                            SELECT %s, id, False FROM players
+                            WHERE id = ANY(%s);""",
+                         (tournament_id, player_ids,))
+
+        # A bye is recorded as a match against yourself with no winner
+        rows = [(tournament_id, player_id, player_id, None, False)
+                for player_id in player_ids[::50]]
+        played = set()
+        while len(played) < matchCount:
+            player1, player2 = sorted(rng.sample(player_ids, 2))
+            if (player1, player2) in played:
+                continue
+            played.add((player1, player2))
+            outcome = rng.random()
+            if outcome < 0.1:
+                rows.append((tournament_id, player1, player2, None, True))
+            else:
+                winner = player1 if outcome < 0.55 else player2
+                rows.append((tournament_id, player1, player2, winner, False))
+        dbcursor.executemany("""INSERT INTO matches (tournament_id,
+                                player_1_id, player_2_id, winner_id, draw)
+                                VALUES (%s, %s, %s, %s, %s);""", rows)
+        dbcursor.execute("ANALYZE matches;")
+    rebuildStandings(tournament_id)
+    return tournament_id, player_ids
+
+
+def dropScratchTournament(tournament_id, player_ids):
+    """Deletes everything createScratchTournament() made."""
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM matches WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM competitors WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM tournaments WHERE id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM players WHERE id = ANY(%s);",
+                         (player_ids,))
+
+
+def runQuery(query, tournament_id):
+    """Runs a standings query and returns its rows."""
+    with transaction() as dbcursor:
+        dbcursor.execute(query, {'tournament_id': tournament_id})
+        return dbcursor.fetchall()
+
+
+def sortKeys(rows):
+    """Returns the (Wins, Draws, OMW, Matches) sort keys of standings rows,
+    in the order the rows were returned."""
+    return [tuple(row[3:7]) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times the standings query against the legacy query.")
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--matches', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    tournament_id, player_ids = createScratchTournament(args.players,
+                                                        args.matches,
+                                                        args.seed)
+    try:
+        current = runQuery(STANDINGS_QUERY, tournament_id)
+        legacy = runQuery(LEGACY_STANDINGS_QUERY, tournament_id)
+        if sorted(current) != sorted(legacy):
+            raise ValueError("The standings queries disagree.")
+        if sortKeys(current) != sortKeys(legacy):
+            raise ValueError("The standings queries order players "
+                             "differently.")
+
+        print "%d players, %d matches: both queries return the same " \
+              "standings" % (args.players, args.matches)
+        for label, query in (("Maintained", MAINTAINED_STANDINGS_QUERY),
+                             ("Set-based", STANDINGS_QUERY),
+                             ("Legacy", LEGACY_STANDINGS_QUERY)):
+            seconds = min(timeit.repeat(
+                lambda: runQuery(query, tournament_id),
+                repeat=args.repeat, number=1))
+            print "%-10s %8.4f s" % (label, seconds)
+
+        # The tiebreak engine, with every tiebreak it offers
+        seconds = min(timeit.repeat(
+            lambda: rankedStandings(tournament_id,
+                                    sorted(tiebreak.TIEBREAKS)),
+            repeat=args.repeat, number=1))
+        print "%-10s %8.4f s" % ("Tiebreaks", seconds)
+    finally:
+        dropScratchTournament(tournament_id, player_ids)
+
+
+if __name__ == '__main__':
+    main()
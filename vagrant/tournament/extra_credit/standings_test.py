@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#
+# Test cases for the standings table maintained by tournament.py
+#
+# Plays random rounds, with draws and byes, in a scratch tournament and
+# checks that the standings table always agrees with standings computed from
+# scratch.  The scratch tournament and its players are deleted afterwards.
+
+import random
+
+from tournament import *
+
+
+def createScratchTournament(playerCount):
+    """Creates a tournament of new players.  Returns (tournament_id,
+    player_ids)."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""INSERT INTO tournaments (name)
+                            VALUES ('Standings test') RETURNING id;""")
+        tournament_id = dbcursor.fetchone()[0]
+        dbcursor.execute("""INSERT INTO players (name)
+                            SELECT 'Standings test player ' || n
+                            FROM generate_series(1, %s) AS n
+                            RETURNING id;""",
+                         (playerCount,))
+        player_ids = [row[0] for row in dbcursor.fetchall()]
+    for player_id in player_ids:
+        registerCompetitor(tournament_id, player_id)
+    return tournament_id, player_ids
+
+
+def dropScratchTournament(tournament_id, player_ids):
+    """Deletes everything createScratchTournament() made."""
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM matches WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM competitors WHERE tournament_id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM tournaments WHERE id = %s;",
+                         (tournament_id,))
+        dbcursor.execute("DELETE FROM players WHERE id = ANY(%s);",
+                         (player_ids,))
+
+
+def playRound(tournament_id, rng):
+    """Pairs a round and reports random results for it."""
+    for (id1, name1, id2, name2) in swissPairings(tournament_id):
+        outcome = rng.random()
+        if outcome < 0.2:
+            reportMatch(tournament_id, id1, id2, None, True)
+        else:
+            winner = id1 if outcome < 0.6 else id2
+            reportMatch(tournament_id, id1, id2, winner, False)
+
+
+def assertConsistent(tournament_id, message):
+    """Raises ValueError if the standings table disagrees with standings
+    computed from scratch."""
+    differences = standingsDifferences(tournament_id)
+    if differences:
+        raise ValueError(message + " First difference (maintained, "
+                         "computed): " + repr(differences[0]))
+
+
+def testNewCompetitors(tournament_id):
+    assertConsistent(tournament_id, "New competitors should have an empty "
+                     "record in the standings table.")
+    print "1. New competitors appear in the standings table."
+
+
+def testReportMatchKeepsStandings(tournament_id):
+    rng = random.Random(0)
+    for roundNumber in range(6):
+        playRound(tournament_id, rng)
+        assertConsistent(tournament_id, "After round " +
+                         str(roundNumber + 1) + ", the standings table "
+                         "should match the matches table.")
+    print "2. Wins, draws, OMW, matches and byes are kept up to date."
+
+
+def testRebuildStandings(tournament_id):
+    with transaction() as dbcursor:
+        dbcursor.execute("""UPDATE standings SET wins = wins + 5, omw = 0
+                            WHERE tournament_id = %s;""",
+                         (tournament_id,))
+    if not standingsDifferences(tournament_id):
+        raise ValueError("standingsDifferences() should report a corrupted "
+                         "standings table.")
+    rebuildStandings(tournament_id)
+    assertConsistent(tournament_id, "rebuildStandings() should restore the "
+                     "standings table.")
+    print "3. A corrupted standings table is detected and rebuilt."
+
+
+if __name__ == '__main__':
+    tournament_id, player_ids = createScratchTournament(13)
+    try:
+        testNewCompetitors(tournament_id)
+        testReportMatchKeepsStandings(tournament_id)
+        testRebuildStandings(tournament_id)
+    finally:
+        dropScratchTournament(tournament_id, player_ids)
+    print "Success!  All tests pass!"
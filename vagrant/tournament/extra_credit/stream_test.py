@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#
+# Test cases for iterStandings() and exportStandings()
+#
+# Runs on PostgreSQL, in memory and on SQLite.  PostgreSQL is skipped if the
+# database cannot be reached.  Like extra_credit_tests.py, this empties the
+# tables of each backend first.
+
+import contextlib
+import cStringIO
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import psycopg2
+
+import tournament
+from tournament import *
+
+PLAYERS = 11
+PAGE_SIZE = 3
+
+
+def clearAllTables():
+    """Empties all tables of the selected backend."""
+    deleteMatches()
+    deleteCompetitors()
+    deleteTournaments()
+    deletePlayers()
+
+
+def newTournament():
+    """Creates a tournament of PLAYERS new players on the selected backend,
+    and plays a round of it.  Returns its id."""
+    clearAllTables()
+    createTournament("Stream test")
+    dbconnection = connect()
+    dbcursor = dbconnection.cursor()
+    dbcursor.execute("SELECT id FROM tournaments;")
+    tournament_id = dbcursor.fetchall()[0][0]
+    dbconnection.close()
+    registerPlayers(["Stream test player %d" % n for n in range(PLAYERS)],
+                    tournament_id)
+    reportMatches(tournament_id, [(id1, id2, id1, False)
+                                  for (id1, name1, id2, name2)
+                                  in swissPairings(tournament_id)])
+    return tournament_id
+
+
+def testStreaming():
+    tournament_id = newTournament()
+    if list(iterStandings(tournament_id, PAGE_SIZE)) != \
+            playerStandings(tournament_id) or \
+            list(iterStandings(tournament_id)) != \
+            playerStandings(tournament_id):
+        raise ValueError(BACKEND + " should stream the standings in order.")
+
+    # Streams are read alongside other calls, and closed part way through
+    reads = []
+    for _ in range(tournament.POOL_MAX_CONNECTIONS + 1):
+        with contextlib.closing(iterStandings(tournament_id,
+                                              PAGE_SIZE)) as stream:
+            reads.append(next(stream))
+            useCompetitorBye(tournament_id, reads[-1][0])
+            reads.append(next(stream))
+    if len(reads) != 2 * (tournament.POOL_MAX_CONNECTIONS + 1):
+        raise ValueError("Streams should be readable alongside writes.")
+
+
+def testClosedStreamsReleaseConnections():
+    tournament_id = newTournament()
+    errors = []
+
+    def readMany():
+        try:
+            for _ in range(tournament.POOL_MAX_CONNECTIONS + 1):
+                stream = iterStandings(tournament_id, PAGE_SIZE)
+                next(stream)
+                stream.close()
+        except Exception as error:
+            errors.append(error)
+
+    # A stream that kept its connection would leave the next ones waiting
+    reader = threading.Thread(target=readMany)
+    reader.daemon = True
+    reader.start()
+    reader.join(30)
+    if reader.is_alive():
+        raise ValueError("Closing a stream should return its connection.")
+    if errors:
+        raise errors[0]
+
+
+def testExports():
+    tournament_id = newTournament()
+    expected = [tuple(str(value) for value in row)
+                for row in playerStandings(tournament_id)]
+    buf = cStringIO.StringIO()
+    if exportStandings(tournament_id, buf, page_size=PAGE_SIZE) != PLAYERS:
+        raise ValueError("exportStandings() should count the players.")
+    rows = [tuple(row) for row in csv.reader(cStringIO.StringIO(
+        buf.getvalue()))]
+    if rows[0] != STANDINGS_COLUMNS or rows[1:] != expected:
+        raise ValueError(BACKEND + " should export a header and the "
+                         "standings as CSV.")
+
+    buf = cStringIO.StringIO()
+    exportStandings(tournament_id, buf, 'json', PAGE_SIZE)
+    objects = json.loads(buf.getvalue())
+    if [tuple(str(item[column]) for column in STANDINGS_COLUMNS)
+            for item in objects] != expected:
+        raise ValueError(BACKEND + " should export the standings as JSON.")
+
+    clearAllTables()
+    buf = cStringIO.StringIO()
+    exportStandings(tournament_id, buf, 'json')
+    if json.loads(buf.getvalue()) != []:
+        raise ValueError("An empty tournament should export an empty array.")
+    try:
+        exportStandings(tournament_id, buf, 'xml')
+    except ValueError:
+        pass
+    else:
+        raise ValueError("An unknown format should be rejected.")
+
+
+def onEveryBackend(test):
+    """Runs a test on each backend."""
+    directory = tempfile.mkdtemp()
+    try:
+        tournament.SQLITE_PATH = os.path.join(directory, 'tournament.db')
+        for backend in ['postgresql', 'memory', 'sqlite']:
+            useBackend(backend)
+            try:
+                test()
+            except psycopg2.OperationalError:
+                print "PostgreSQL is not available; skipping it."
+    finally:
+        if tournament.BACKEND == 'sqlite':
+            tournament._backend.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    backend = tournament.BACKEND
+    try:
+        onEveryBackend(testStreaming)
+        print "1. Standings are streamed a page at a time, in order."
+        onEveryBackend(testClosedStreamsReleaseConnections)
+        print "2. Closing a stream returns its connection to the pool."
+        onEveryBackend(testExports)
+        print "3. Standings are exported as CSV and JSON."
+    finally:
+        useBackend(backend)
+    print "Success!  All tests pass!"
@@ -0,0 +1,167 @@
+#
+# tiebreak.py -- in-memory tiebreak engine for Swiss-system standings
+#
+# Like pairing.py, the engine works on data already loaded from the
+# database: a tournament's competitors and its match list.  One pass over the
+# matches builds every player's record and list of opponents, and each
+# tiebreak is then a sum or mean over those lists, so ranking a tournament
+# costs the same whatever tiebreaks are asked for.
+#
+# Points are counted as one for a win and a half for a draw, so sums of
+# points are exact.  A bye, stored as a match against oneself with no winner,
+# scores nothing and is left out of every tiebreak.
+#
+
+import math
+
+# Match-win percentages below this count as this much in OMW%, so that a
+# player is not punished too harshly for meeting opponents who did badly
+MINIMUM_PERCENTAGE = 1.0 / 3
+
+
+class Record(object):
+    """A player's results in one tournament."""
+
+    __slots__ = ('points', 'wins', 'played', 'opponents', 'scores')
+
+    def __init__(self):
+        self.points = 0.0
+        self.wins = 0
+        self.played = 0
+        # The ids of the player's opponents, and what the player scored
+        # against each of them, in the same order
+        self.opponents = []
+        self.scores = []
+
+    def percentage(self):
+        """Returns the player's match-win percentage, byes excluded."""
+        if not self.played:
+            return MINIMUM_PERCENTAGE
+        return max(MINIMUM_PERCENTAGE, self.points / self.played)
+
+
+def buildRecords(player_ids, matches):
+    """Builds every player's Record in one pass over a match list.
+
+    Args:
+      player_ids: the ids of the tournament's competitors
+      matches: (player_1_id, player_2_id, winner_id, draw) rows
+
+    Returns:
+      A dict of Records keyed by player id.
+    """
+    records = dict((player_id, Record()) for player_id in player_ids)
+    for (player1, player2, winner, draw) in matches:
+        # Byes, and matches recorded with neither a winner nor a draw, score
+        # nothing against an opponent
+        if player1 == player2 or (winner is None and not draw):
+            continue
+        first = records[player1]
+        second = records[player2]
+        if draw:
+            firstScore = secondScore = 0.5
+        elif winner == player1:
+            firstScore, secondScore = 1.0, 0.0
+            first.wins += 1
+        elif winner == player2:
+            firstScore, secondScore = 0.0, 1.0
+            second.wins += 1
+        else:
+            raise ValueError("Player %s did not play in match %s vs. %s" %
+                             (winner, player1, player2))
+        first.points += firstScore
+        second.points += secondScore
+        first.played += 1
+        second.played += 1
+        first.opponents.append(player2)
+        first.scores.append(firstScore)
+        second.opponents.append(player1)
+        second.scores.append(secondScore)
+    return records
+
+
+def omw(record, records):
+    """Returns the total wins of a player's opponents."""
+    return sum(records[opponent].wins for opponent in record.opponents)
+
+
+def omwPercentage(record, records):
+    """Returns the mean match-win percentage of a player's opponents.
+
+    math.fsum() rounds the total only once, so players with the same
+    opponents tie whatever order their matches were loaded in.
+    """
+    if not record.opponents:
+        return 0.0
+    return (math.fsum(records[opponent].percentage()
+                      for opponent in record.opponents) /
+            len(record.opponents))
+
+
+def buchholz(record, records):
+    """Returns the total points of a player's opponents."""
+    return sum(records[opponent].points for opponent in record.opponents)
+
+
+def medianBuchholz(record, records):
+    """Returns the Buchholz score without the best and worst opponent, once
+    a player has met at least three."""
+    points = sorted(records[opponent].points
+                    for opponent in record.opponents)
+    if len(points) >= 3:
+        points = points[1:-1]
+    return sum(points)
+
+
+def sonnebornBerger(record, records):
+    """Returns the points of the opponents a player beat, plus half the
+    points of those they drew with."""
+    return sum(records[opponent].points * score
+               for (opponent, score) in zip(record.opponents,
+                                            record.scores))
+
+
+# Every tiebreak, by the name rankStandings() takes
+TIEBREAKS = {
+    'omw': omw,
+    'omw_percentage': omwPercentage,
+    'buchholz': buchholz,
+    'median_buchholz': medianBuchholz,
+    'sonneborn_berger': sonnebornBerger,
+}
+
+
+def rankStandings(competitors, matches, tiebreaks):
+    """Ranks a tournament's players by points, then by a chain of
+    tiebreaks.
+
+    Args:
+      competitors: (id, name) tuples for every player in the tournament
+      matches: (player_1_id, player_2_id, winner_id, draw) rows
+      tiebreaks: names from TIEBREAKS, most important first
+
+    Returns:
+      A list of (id, name, points, tiebreak, ...) tuples, best first, with
+      one value for each tiebreak in the chain.  Players level on every
+      tiebreak are ordered by id.
+
+    Raises:
+      ValueError: if a tiebreak is not in TIEBREAKS
+    """
+    functions = []
+    for name in tiebreaks:
+        if name not in TIEBREAKS:
+            raise ValueError("Unknown tiebreak '%s'; choose from %s" %
+                             (name, ', '.join(sorted(TIEBREAKS))))
+        functions.append(TIEBREAKS[name])
+
+    records = buildRecords([player_id for (player_id, name) in competitors],
+                           matches)
+    rows = []
+    for (player_id, name) in competitors:
+        record = records[player_id]
+        rows.append((player_id, name, record.points) +
+                    tuple(function(record, records)
+                          for function in functions))
+    rows.sort(key=lambda row: tuple(-value for value in row[2:]) + (row[0],))
+    return rows
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#
+# Test cases for tiebreak.py
+
+from tiebreak import *
+
+COMPETITORS = [(1, "A"), (2, "B"), (3, "C"), (4, "D")]
+
+# A beats B, C draws with D, C beats A, B beats D, and A has a bye
+MATCHES = [(1, 2, 1, False), (3, 4, None, True), (1, 3, 3, False),
+           (2, 4, 2, False), (1, 1, None, False)]
+
+
+def tiebreakValues(name):
+    """Returns each player's value of one tiebreak, keyed by id."""
+    return dict((row[0], row[3])
+                for row in rankStandings(COMPETITORS, MATCHES, [name]))
+
+
+def testRecords():
+    records = buildRecords([1, 2, 3, 4], MATCHES)
+    if [records[player].points for player in (1, 2, 3, 4)] != \
+            [1.0, 1.0, 1.5, 0.5]:
+        raise ValueError("A win should score one point and a draw half.")
+    if records[1].played != 2 or records[1].opponents != [2, 3]:
+        raise ValueError("A bye should not count as a match or an "
+                         "opponent.")
+    print "1. Records are built in one pass over the matches."
+
+
+def testTiebreaks():
+    expected = {
+        'omw': {1: 2, 2: 1, 3: 1, 4: 2},
+        'omw_percentage': {1: 0.625, 2: (1.0 / 3 + 0.5) / 2,
+                           3: (1.0 / 3 + 0.5) / 2, 4: 0.625},
+        'buchholz': {1: 2.5, 2: 1.5, 3: 1.5, 4: 2.5},
+        'median_buchholz': {1: 2.5, 2: 1.5, 3: 1.5, 4: 2.5},
+        'sonneborn_berger': {1: 1.0, 2: 0.5, 3: 1.25, 4: 0.75},
+    }
+    for name, values in sorted(expected.iteritems()):
+        if tiebreakValues(name) != values:
+            raise ValueError("Wrong %s values: %r" %
+                             (name, tiebreakValues(name)))
+    print "2. Every tiebreak is computed as defined."
+
+
+def testMedianBuchholz():
+    # A meets B, C and D, who finish on 0, 1 and 2 points
+    matches = [(1, 2, 1, False), (1, 3, 1, False), (1, 4, 1, False),
+               (3, 5, 3, False), (4, 5, 4, False), (4, 6, 4, False)]
+    competitors = COMPETITORS + [(5, "E"), (6, "F")]
+    rows = rankStandings(competitors, matches,
+                         ['buchholz', 'median_buchholz'])
+    values = dict((row[0], row[3:]) for row in rows)
+    if values[1] != (3.0, 1.0):
+        raise ValueError("Median Buchholz should drop the best and worst "
+                         "opponents.")
+    print "3. Median Buchholz drops the best and worst opponents."
+
+
+def testChains():
+    order = [row[0] for row in rankStandings(COMPETITORS, MATCHES,
+                                             ['buchholz'])]
+    if order != [3, 1, 2, 4]:
+        raise ValueError("Players level on points should be ordered by the "
+                         "first tiebreak.")
+    order = [row[0] for row in rankStandings(COMPETITORS, MATCHES,
+                                             ['omw', 'sonneborn_berger'])]
+    if order != [3, 1, 2, 4]:
+        raise ValueError("Players level on one tiebreak should be ordered by "
+                         "the next.")
+    if [row[0] for row in rankStandings(COMPETITORS, MATCHES, [])] != \
+            [3, 1, 2, 4]:
+        raise ValueError("Players level on points should be ordered by id.")
+    try:
+        rankStandings(COMPETITORS, MATCHES, ['coin_toss'])
+    except ValueError:
+        pass
+    else:
+        raise ValueError("An unknown tiebreak should be rejected.")
+    print "4. Standings are ordered by a chain of tiebreaks."
+
+
+def testMatchOrder():
+    shuffled = list(reversed(MATCHES))
+    if rankStandings(COMPETITORS, shuffled, sorted(TIEBREAKS)) != \
+            rankStandings(COMPETITORS, MATCHES, sorted(TIEBREAKS)):
+        raise ValueError("The order matches are loaded in should not matter.")
+    print "5. Rankings do not depend on the order of the matches."
+
+
+def testNoResult():
+    records = buildRecords([1, 2, 3, 4], MATCHES + [(3, 2, None, False)])
+    if [(records[player].wins, records[player].played)
+            for player in (2, 3)] != [(1, 2), (1, 2)]:
+        raise ValueError("A match with no winner and no draw should not "
+                         "count as a win.")
+    try:
+        buildRecords([1, 2, 3, 4], [(1, 2, 3, False)])
+    except ValueError:
+        pass
+    else:
+        raise ValueError("A winner who did not play should be rejected.")
+    print "6. Matches without a result are not counted as wins."
+
+
+if __name__ == '__main__':
+    testRecords()
+    testTiebreaks()
+    testMedianBuchholz()
+    testChains()
+    testMatchOrder()
+    testNoResult()
+    print "Success!  All tests pass!"
@@ -3,83 +3,417 @@
 # tournament.py -- implementation of a Swiss-system tournament
 #
 
+import contextlib
+import cStringIO
+import csv
+import functools
+import inspect
+import json
+import multiprocessing
+import os
+import threading
+
 import psycopg2
+import psycopg2.extras
+import psycopg2.pool
+
+import cache
+import memory_backend
+import metrics
+import pairing
+import rating
+import sqlite_backend
+import tiebreak
+
+# Connection settings for the shared pool.  These can be overridden from the
+# environment, or at runtime with configurePool()
+DSN = os.environ.get('TOURNAMENT_DSN', 'dbname=tournament')
+POOL_MIN_CONNECTIONS = int(os.environ.get('TOURNAMENT_POOL_MIN', 1))
+POOL_MAX_CONNECTIONS = int(os.environ.get('TOURNAMENT_POOL_MAX', 10))
+
+# How swissPairings() pairs a round: 'greedy' pairs top-down within score
+# groups, 'optimal' solves a maximum-weight matching (see pairing.py)
+PAIRING_MODE = os.environ.get('TOURNAMENT_PAIRING', 'greedy')
+
+# The tiebreaks rankedStandings() orders players by once their points are
+# level, most important first (see tiebreak.py for the choices)
+TIEBREAKS = os.environ.get(
+    'TOURNAMENT_TIEBREAKS', 'omw_percentage,buchholz,sonneborn_berger'
+).split(',')
+
+# How many rows the bulk registration functions send in each COPY
+COPY_BATCH_SIZE = 10000
+
+# How many standings rows iterStandings() fetches from the server at a time
+STREAM_PAGE_SIZE = 2000
+
+# The first key of the advisory locks createRound() takes; the second is
+# the tournament id.  Anything else taking two-key advisory locks on the
+# tournament database should use a different first key
+ROUND_LOCK_KEY = 1
+
+# How rateRound() and rebuildRatings() rate players: 'elo' or 'glicko2' (see
+# rating.py).  Ratings kept under one system should be rebuilt with
+# rebuildRatings() after switching to the other
+RATING_SYSTEM = os.environ.get('TOURNAMENT_RATING', 'elo')
+
+# If set, playerStandings() results are cached in memory, up to this many
+# standings rows across every tournament (see cache.py)
+STANDINGS_CACHE_ROWS = int(os.environ.get('TOURNAMENT_STANDINGS_CACHE', 0))
+
+# The first key of the advisory lock rateRound() and rebuildRatings() take,
+# so that ratings are updated one period at a time
+RATING_LOCK_KEY = 2
+
+# Where the tournament functions keep their data: 'postgresql', 'memory' for
+# the in-memory backend in memory_backend.py, or 'sqlite' for the SQLite
+# database file at SQLITE_PATH (see sqlite_backend.py).  Can be changed at
+# runtime with useBackend()
+BACKEND = os.environ.get('TOURNAMENT_BACKEND', 'postgresql')
+SQLITE_PATH = os.environ.get('TOURNAMENT_SQLITE_PATH', 'tournament.db')
+
+# The shared pool is created lazily on first use
+_pool = None
+_poolLock = threading.Lock()
+
+# Pools inherited from the parent of a forked process.  Their connections
+# still belong to the parent, so they are never used or closed here, only
+# kept referenced so that garbage collection does not close them either
+_inheritedPools = []
+
+# The backend object handling the tournament functions, or None while they
+# use PostgreSQL
+_backend = None
+
+if STANDINGS_CACHE_ROWS:
+    cache.enable(cache.StandingsCache(STANDINGS_CACHE_ROWS))
+
+
+class PooledConnection(object):
+    """A database connection borrowed from a ConnectionPool.
+
+    Behaves like the underlying psycopg2 connection, except that close()
+    hands the connection back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        """Returns the connection to the pool.
+
+        Any uncommitted work is rolled back so the next borrower starts with
+        a clean transaction.  Connections that are broken are discarded.
+        """
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        discard = bool(connection.closed)
+        if not discard:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                discard = True
+        self._pool.putconn(connection, close=discard)
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of connections to the tournament database.
+
+    When every connection is checked out, borrowers wait for one to be
+    returned rather than failing.
+    """
+
+    def __init__(self, dsn, minconn, maxconn):
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn,
+                                                          dsn)
+        self._available = threading.BoundedSemaphore(maxconn)
+        self.pid = os.getpid()
+
+    def getconn(self):
+        """Borrows a connection, blocking until one is available."""
+        self._available.acquire()
+        try:
+            return PooledConnection(self, self._pool.getconn())
+        except Exception:
+            self._available.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        """Takes back a connection, closing it if 'close' is True."""
+        try:
+            self._pool.putconn(connection, close=close)
+        finally:
+            self._available.release()
+
+    def closeall(self):
+        """Closes every connection held by the pool."""
+        self._pool.closeall()
+
+
+def configurePool(dsn=None, minconn=None, maxconn=None):
+    """Sets the connection settings used by the shared pool.
+
+    Any existing pool is closed; a new one is created on next use.
+
+    Args:
+      dsn: the libpq connection string for the tournament database
+      minconn: the number of connections to keep open while idle
+      maxconn: the maximum number of connections open at once
+    """
+    global DSN, POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS
+    if dsn is not None:
+        DSN = dsn
+    if minconn is not None:
+        POOL_MIN_CONNECTIONS = minconn
+    if maxconn is not None:
+        POOL_MAX_CONNECTIONS = maxconn
+    closePool()
+    if cache.enabled is not None:
+        cache.enabled.clear()
+
+
+def closePool():
+    """Closes all pooled connections."""
+    global _pool
+    with _poolLock:
+        if _pool is not None:
+            if _pool.pid == os.getpid():
+                _pool.closeall()
+            else:
+                _inheritedPools.append(_pool)
+            _pool = None
+
+
+def getPool():
+    """Returns the shared connection pool, creating it if necessary.
+
+    A process forked from one that already had a pool gets a pool of its
+    own, as two processes cannot share a connection.
+    """
+    global _pool
+    if _pool is None or _pool.pid != os.getpid():
+        with _poolLock:
+            if _pool is not None and _pool.pid != os.getpid():
+                _inheritedPools.append(_pool)
+                _pool = None
+            if _pool is None:
+                _pool = ConnectionPool(DSN, POOL_MIN_CONNECTIONS,
+                                       POOL_MAX_CONNECTIONS)
+    return _pool
+
+
+def useBackend(backend):
+    """Selects where the tournament functions keep their data.
+
+    Args:
+      backend: 'postgresql', 'memory' for a new, empty MemoryBackend,
+               'sqlite' for the database at SQLITE_PATH, or an object with
+               a method for each function marked @_pluggable
+    """
+    global BACKEND, _backend
+    if backend == 'postgresql':
+        _backend = None
+    elif backend == 'memory':
+        _backend = memory_backend.MemoryBackend()
+    elif backend == 'sqlite':
+        _backend = sqlite_backend.SQLiteBackend(SQLITE_PATH)
+    elif isinstance(backend, basestring):
+        raise ValueError("Unknown tournament backend '%s'" % backend)
+    else:
+        _backend = backend
+    BACKEND = backend
+    if cache.enabled is not None:
+        cache.enabled.clear()
+
+
+def _pluggable(function):
+    """Hands calls to 'function' to the selected backend's method of the same
+    name, without any leading underscore, unless PostgreSQL is selected."""
+    name = function.__name__.lstrip('_')
+
+    @functools.wraps(function)
+    def dispatch(*args, **kwargs):
+        if _backend is None:
+            return function(*args, **kwargs)
+        return getattr(_backend, name)(*args, **kwargs)
+    dispatch.__wrapped__ = function
+    return dispatch
+
+
+def _instrumented(function):
+    """Measures calls to 'function' while metrics are enabled (see
+    metrics.py)."""
+    name = function.__name__
 
+    @functools.wraps(function)
+    def measure(*args, **kwargs):
+        if metrics.enabled is None:
+            return function(*args, **kwargs)
+        return metrics.measure(name, function, args, kwargs)
+    return measure
 
+
+def _changesStandings(argument=None):
+    """Marks a function that changes standings, so that the cached
+    standings it changes are dropped once it returns (see cache.py).
+
+    Args:
+      argument: the name of the function's argument holding the id of the
+                tournament it changes, or a list of ids.  Nothing is
+                dropped when that argument is None.  Without an argument,
+                every tournament's standings are dropped
+    """
+    def decorate(function):
+        spec = inspect.getargspec(getattr(function, '__wrapped__', function))
+
+        @functools.wraps(function)
+        def invalidate(*args, **kwargs):
+            try:
+                return function(*args, **kwargs)
+            finally:
+                standingsCache = cache.enabled
+                if standingsCache is not None:
+                    if argument is None:
+                        standingsCache.clear()
+                    else:
+                        _invalidate(standingsCache, spec, argument, args,
+                                    kwargs)
+        return invalidate
+    return decorate
+
+
+def _invalidate(standingsCache, spec, argument, args, kwargs):
+    """Drops the cached standings of the tournament or tournaments named
+    by 'argument' in a call with 'args' and 'kwargs' to a function with
+    the argument spec 'spec'."""
+    if argument in kwargs:
+        value = kwargs[argument]
+    else:
+        position = spec.args.index(argument)
+        if position < len(args):
+            value = args[position]
+        else:
+            value = spec.defaults[position - len(spec.args)]
+    if value is None:
+        return
+    for tournament_id in (value if isinstance(value, (list, tuple))
+                          else [value]):
+        standingsCache.invalidate(tournament_id)
+
+
+def _cachedStandings(function):
+    """Reads standings through the enabled cache, if any (see cache.py)."""
+    @functools.wraps(function)
+    def read(tournament_id):
+        standingsCache = cache.enabled
+        if standingsCache is None:
+            return function(tournament_id)
+        return standingsCache.read(tournament_id, function)
+    return read
+
+
+@_pluggable
 def connect():
-    """Connect to the PostgreSQL database.  Returns a database connection."""
-    return psycopg2.connect("dbname=tournament")
+    """Borrow a connection to the PostgreSQL database from the shared pool.
+    Returns a database connection; closing it returns it to the pool."""
+    return metrics.instrumentConnection(getPool().getconn())
+
 
+@contextlib.contextmanager
+def transaction():
+    """Borrows a pooled connection and yields a cursor on it.
 
+    The transaction is committed when the 'with' block completes and rolled
+    back if it raises.  Either way the connection goes back to the pool.
+    """
+    dbconnection = connect()
+    try:
+        dbcursor = dbconnection.cursor()
+        yield dbcursor
+        dbconnection.commit()
+    finally:
+        dbconnection.close()
+
+
+@_instrumented
+@_changesStandings()
+@_pluggable
 def deleteMatches():
     """Remove all the match records from the database."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("DELETE FROM matches;")
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        # Rounds are made of matches, so they go too
+        dbcursor.execute("DELETE FROM rounds;")
+        dbcursor.execute("DELETE FROM matches;")
+
+        # With no matches left, every competitor's record starts again
+        dbcursor.execute("""UPDATE standings
+                            SET wins = 0, draws = 0, omw = 0, matches = 0;""")
 
 
+@_instrumented
+@_changesStandings()
+@_pluggable
 def deleteCompetitors():
     """Removes all tournament competitors from the database."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("DELETE FROM competitors;")
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM competitors;")
 
 
+@_instrumented
+@_changesStandings()
+@_pluggable
 def deleteTournaments():
     """Removes all tournaments from the database."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("DELETE FROM tournaments;")
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM tournaments;")
 
 
+@_instrumented
+@_changesStandings()
+@_pluggable
 def deletePlayers():
     """Remove all the player records from the database."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("DELETE FROM players;")
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM players;")
 
 
+@_instrumented
+@_pluggable
 def countCompetitors(tournament_id):
     """Returns the number of competitors currently registered in a specific
     tournament."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-
-    # Use of 'COALESCE' returns zero instead of 'None' when table is empty
-    dbcursor.execute("""SELECT COALESCE(COUNT(*), 0)
-                        FROM competitors
-                        WHERE tournament_id = %s;""",
-                     (tournament_id,))
+    with transaction() as dbcursor:
+        # Use of 'COALESCE' returns zero instead of 'None' when table is empty
+        dbcursor.execute("""SELECT COALESCE(COUNT(*), 0)
+                            FROM competitors
+                            WHERE tournament_id = %s;""",
+                         (tournament_id,))
 
-    # Assign only the first value in the first tuple to avoid error
-    competitorCount = dbcursor.fetchall()[0][0]
+        # Assign only the first value in the first tuple to avoid error
+        competitorCount = dbcursor.fetchall()[0][0]
 
-    dbconnection.close()
     return competitorCount
 
 
+@_instrumented
+@_pluggable
 def createTournament(name):
     """Adds a new tournament to the tournaments table."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-
-    # Use string insertion method with tuple to prevent SQL injection attacks
-    dbcursor.execute("""INSERT INTO tournaments (id, name) VALUES
-                        (DEFAULT, %s);""",
-                     (name,))
-
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        # Use string insertion method with tuple to prevent SQL injection
+        # attacks
+        dbcursor.execute("""INSERT INTO tournaments (id, name) VALUES
+                            (DEFAULT, %s);""",
+                         (name,))
 
 
+@_instrumented
+@_pluggable
 def registerPlayer(name):
     """Adds a player to the tournament database.
 
@@ -89,46 +423,240 @@ def registerPlayer(name):
     Args:
       name: the player's full name (need not be unique).
     """
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-
-    # Use string insertion method with tuple to prevent SQL injection attacks
-    dbcursor.execute("INSERT INTO players (id, name) VALUES (DEFAULT, %s);",
-                     (name,))
-
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        # Use string insertion method with tuple to prevent SQL injection
+        # attacks
+        dbcursor.execute("""INSERT INTO players (id, name)
+                            VALUES (DEFAULT, %s);""",
+                         (name,))
 
 
+@_instrumented
+@_changesStandings('tournament_id')
+@_pluggable
 def registerCompetitor(tournament_id, competitor_id):
     """ Registers an existing player as a competitor in a specific
         tournament."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
+    with transaction() as dbcursor:
+        dbcursor.execute("""INSERT INTO competitors (tournament_id,
+                            competitor_id, competitor_bye)
+                            VALUES (%s, %s, %s);""",
+                         (tournament_id, competitor_id, False,))
+
+        # New competitors start the standings with an empty record
+        dbcursor.execute("""INSERT INTO standings (tournament_id, player_id,
+                            bye, wins, draws, omw, matches)
+                            VALUES (%s, %s, False, 0, 0, 0, 0);""",
+                         (tournament_id, competitor_id,))
+
+
+@_instrumented
+@_changesStandings('tournament_id')
+@_pluggable
+def registerPlayers(names, tournament_id=None):
+    """Adds many players to the tournament database in one transaction, and
+    optionally registers them as competitors in a tournament.
+
+    The names are streamed to the database with COPY in batches, rather than
+    inserted one row at a time.  Ids are drawn from the players sequence
+    before each batch is copied, so they can be returned in input order.
 
-    dbcursor.execute("""INSERT INTO competitors (tournament_id, competitor_id,
-                        competitor_bye)
-                        VALUES (%s, %s, %s);""",
-                     (tournament_id, competitor_id, False,))
-
-    dbconnection.commit()
-    dbconnection.close()
+    Args:
+      names: an iterable of the players' full names (need not be unique)
+      tournament_id: if given, the id of a tournament to register the new
+                     players in
 
+    Returns:
+      A list of the new players' ids, in the same order as 'names'.
+    """
+    player_ids = []
+    with transaction() as dbcursor:
+        for batch in _batches(names, COPY_BATCH_SIZE):
+            dbcursor.execute("""SELECT nextval(pg_get_serial_sequence(
+                                    'players', 'id'))
+                                FROM generate_series(1, %s);""",
+                             (len(batch),))
+            batch_ids = sorted(row[0] for row in dbcursor.fetchall())
+            _copyRows(dbcursor, 'players', ('id', 'name'),
+                      zip(batch_ids, batch))
+            if tournament_id is not None:
+                _copyCompetitors(dbcursor, tournament_id, batch_ids)
+            player_ids.extend(batch_ids)
+    return player_ids
+
+
+@_instrumented
+def registerPlayersFromCSV(filename, tournament_id=None, column='name'):
+    """Adds the players listed in a CSV file to the tournament database, as
+    registerPlayers() does.
 
-def useCompetitorBye(tournament_id, competitor_id):
-    """Registers that a player's bye has been used in a specific tournament."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
+    Args:
+      filename: the path of a CSV file with a header row
+      tournament_id: if given, the id of a tournament to register the new
+                     players in
+      column: the header of the column holding the players' names
 
-    dbcursor.execute("""UPDATE competitors SET competitor_bye = True
-                        WHERE tournament_id = %s AND
-                              competitor_id = %s""",
-                     (tournament_id, competitor_id,))
+    Returns:
+      A list of the new players' ids, in the same order as the file's rows.
+    """
+    with open(filename, 'rb') as csvfile:
+        return registerPlayers((row[column] for row in
+                                csv.DictReader(csvfile)),
+                               tournament_id)
 
-    dbconnection.commit()
-    dbconnection.close()
 
+@_instrumented
+@_changesStandings('tournament_id')
+@_pluggable
+def registerCompetitors(tournament_id, competitor_ids):
+    """Registers many existing players as competitors in a specific
+    tournament in one transaction, streaming them to the database with COPY.
 
+    Args:
+      tournament_id: the id of the tournament to register the players in
+      competitor_ids: an iterable of existing players' ids
+    """
+    with transaction() as dbcursor:
+        for batch in _batches(competitor_ids, COPY_BATCH_SIZE):
+            _copyCompetitors(dbcursor, tournament_id, batch)
+
+
+def _copyCompetitors(dbcursor, tournament_id, competitor_ids):
+    """Copies competitors, each with an empty record in the standings table,
+    into a tournament on an open cursor."""
+    _copyRows(dbcursor, 'competitors',
+              ('tournament_id', 'competitor_id', 'competitor_bye'),
+              ((tournament_id, competitor_id, False)
+               for competitor_id in competitor_ids))
+    _copyRows(dbcursor, 'standings',
+              ('tournament_id', 'player_id', 'bye', 'wins', 'draws', 'omw',
+               'matches'),
+              ((tournament_id, competitor_id, False, 0, 0, 0, 0)
+               for competitor_id in competitor_ids))
+
+
+def _copyRows(dbcursor, table, columns, rows):
+    """Streams rows into a table with COPY ... FROM STDIN on an open
+    cursor."""
+    buf = cStringIO.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    for row in rows:
+        writer.writerow([value.encode('utf-8')
+                         if isinstance(value, unicode) else value
+                         for value in row])
+    buf.seek(0)
+    dbcursor.copy_expert("COPY %s (%s) FROM STDIN WITH (FORMAT csv);" %
+                         (table, ', '.join(columns)), buf)
+
+
+def _batches(iterable, size):
+    """Yields lists of up to 'size' items from an iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@_instrumented
+@_changesStandings('tournament_id')
+@_pluggable
+def useCompetitorBye(tournament_id, competitor_id):
+    """Registers that a player's bye has been used in a specific tournament."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""UPDATE competitors SET competitor_bye = True
+                            WHERE tournament_id = %s AND
+                                  competitor_id = %s""",
+                         (tournament_id, competitor_id,))
+        dbcursor.execute("""UPDATE standings SET bye = True
+                            WHERE tournament_id = %s AND
+                                  player_id = %s""",
+                         (tournament_id, competitor_id,))
+
+
+# Standings for one tournament, read from the standings table.  That table
+# holds a running record for every competitor, kept up to date by
+# reportMatch() in the same transaction as the match it records, and is
+# indexed in standings order so reading it needs no sorting.
+MAINTAINED_STANDINGS_QUERY = """
+    SELECT  players.id, players.name, standings.bye, standings.wins,
+            standings.draws, standings.omw, standings.matches
+    FROM    standings INNER JOIN players
+            ON (players.id = standings.player_id)
+    WHERE   standings.tournament_id = %(tournament_id)s
+    ORDER BY standings.wins DESC, standings.draws DESC, standings.omw DESC,
+             standings.matches DESC, standings.player_id;"""
+
+
+# The same standings for several tournaments at once, ordered by tournament
+# and then as above, so that each tournament's rows can be read off in
+# standings order.
+MAINTAINED_STANDINGS_FOR_TOURNAMENTS_QUERY = """
+    SELECT  standings.tournament_id, players.id, players.name, standings.bye,
+            standings.wins, standings.draws, standings.omw, standings.matches
+    FROM    standings INNER JOIN players
+            ON (players.id = standings.player_id)
+    WHERE   standings.tournament_id = ANY(%(tournament_ids)s)
+    ORDER BY standings.tournament_id, standings.wins DESC,
+             standings.draws DESC, standings.omw DESC, standings.matches DESC,
+             standings.player_id;"""
+
+
+# Standings for one tournament, computed from scratch in a single pass over
+# its matches.  Used to build and check the standings table.
+# Each match is unfolded into one row per player taking part (a bye, where a
+# player is matched against themselves, gives a single row).  Grouping those
+# rows gives each player's wins, draws and matches played.  OMW, the total
+# wins of everyone a player has faced, is then the sum of their opponents'
+# win counts.
+STANDINGS_QUERY = """
+    WITH results AS (
+        SELECT  player_1_id AS player_id, player_2_id AS opponent_id,
+                winner_id, draw
+        FROM    matches
+        WHERE   tournament_id = %(tournament_id)s
+        UNION ALL
+        SELECT  player_2_id, player_1_id, winner_id, draw
+        FROM    matches
+        WHERE   tournament_id = %(tournament_id)s AND
+                player_2_id <> player_1_id
+    ),
+    records AS (
+        SELECT  player_id,
+                SUM(CASE WHEN winner_id = player_id THEN 1 ELSE 0 END)
+                    AS wins,
+                SUM(CASE WHEN draw THEN 1 ELSE 0 END) AS draws,
+                COUNT(*) AS matches
+        FROM    results
+        GROUP BY player_id
+    ),
+    opponent_wins AS (
+        SELECT  results.player_id, SUM(records.wins) AS omw
+        FROM    results INNER JOIN records
+                ON (records.player_id = results.opponent_id)
+        WHERE   results.opponent_id <> results.player_id
+        GROUP BY results.player_id
+    )
+    SELECT  players.id, players.name, competitors.competitor_bye,
+            COALESCE(records.wins, 0) AS "Wins",
+            COALESCE(records.draws, 0) AS "Draws",
+            CAST(COALESCE(opponent_wins.omw, 0) AS bigint) AS "OMW",
+            COALESCE(records.matches, 0) AS "Matches"
+    FROM    players INNER JOIN competitors
+            ON (players.id = competitors.competitor_id)
+            LEFT JOIN records ON (records.player_id = players.id)
+            LEFT JOIN opponent_wins ON (opponent_wins.player_id = players.id)
+    WHERE   competitors.tournament_id = %(tournament_id)s
+    ORDER BY "Wins" DESC, "Draws" DESC, "OMW" DESC, "Matches" DESC,
+             players.id;"""
+
+
+@_instrumented
+@_cachedStandings
+@_pluggable
 def playerStandings(tournament_id):
     """ Returns a list of the players and their win records, sorted by wins,
         then draws, then number of matches played, for a specific tournament.
@@ -145,58 +673,120 @@ def playerStandings(tournament_id):
             wins: the number of matches the player has won
             matches: the number of matches the player has played
     """
+    with transaction() as dbcursor:
+        return _fetchStandings(dbcursor, tournament_id)
+
+
+def _fetchStandings(dbcursor, tournament_id, query=MAINTAINED_STANDINGS_QUERY):
+    """Reads the standings for a tournament on an open cursor.  Returns the
+    rows described in playerStandings()."""
+    dbcursor.execute(query, {'tournament_id': tournament_id})
+
+    # The rows are already tuples, so they are returned as fetched rather
+    # than copied
+    return dbcursor.fetchall()
+
+
+# The columns of a standings row, as exportStandings() labels them
+STANDINGS_COLUMNS = ('id', 'name', 'bye', 'wins', 'draws', 'omw', 'matches')
+
+# A JSON object for a row of standings, filled with its encoded values; this
+# is twice as fast as encoding an OrderedDict for each row
+_JSON_STANDING = '{%s}' % ', '.join('"%s": %%s' % column
+                                    for column in STANDINGS_COLUMNS)
+
+
+def iterStandings(tournament_id, page_size=None):
+    """Yields the standings of a tournament one row at a time, without
+    holding them all in memory, for tournaments too large to read with
+    playerStandings().
+
+    The rows are read in one transaction from a server-side cursor, a page
+    at a time, so the stream holds a pooled connection until it is
+    exhausted or closed.  Close a stream that is not read to the end, or
+    read it in a 'with contextlib.closing(...)' block.
+
+    Args:
+      tournament_id: the id of the tournament to read
+      page_size: how many rows to fetch at a time; defaults to
+                 STREAM_PAGE_SIZE
+
+    Returns:
+      An iterator of the rows described in playerStandings(), in the same
+      order.
+    """
+    return _streamStandings(tournament_id, STREAM_PAGE_SIZE
+                            if page_size is None else page_size)
+
+
+@_pluggable
+def _streamStandings(tournament_id, page_size):
+    """Yields the rows of iterStandings(), fetching 'page_size' at a
+    time."""
     dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("""SELECT  players.id, players.name,
-                                competitors.competitor_bye,
-                      (SELECT COUNT(*)
-                       FROM   matches
-                       WHERE  matches.winner_id = players.id AND
-                              tournament_id = %s) as "Wins",
-                      (SELECT COUNT(*)
-                       FROM   matches
-                       WHERE  (matches.player_1_id = players.id OR
-                              matches.player_2_id = players.id) AND
-                              tournament_id = %s AND
-                              matches.draw = True) as "Draws",
-                      (SELECT COUNT(*)
-                       FROM   matches
-                       WHERE  tournament_id = %s AND
-                              NOT(matches.winner_id = players.id) AND
-                             (matches.winner_id IN (
-                              SELECT matches.player_1_id
-                              FROM   matches
-                              WHERE  matches.player_2_id = players.id AND
-                                     tournament_id = %s) OR
-                              matches.winner_id IN (
-                              SELECT matches.player_2_id
-                              FROM   matches
-                              WHERE  matches.player_1_id = players.id AND
-                                     tournament_id = %s))) as "OMW",
-                      (SELECT COUNT(*)
-                       FROM   matches
-                       WHERE  (matches.player_1_id = players.id OR
-                              matches.player_2_id = players.id) AND
-                              tournament_id = %s) as "Matches"
-                      FROM players INNER JOIN competitors
-                           ON (players.id = competitors.competitor_id)
-                      WHERE competitors.tournament_id = %s
-                      ORDER BY "Wins" DESC, "Draws" DESC, "OMW" DESC,
-                               "Matches" DESC;""",
-                     (tournament_id, tournament_id, tournament_id,
-                      tournament_id, tournament_id, tournament_id,
-                      tournament_id,))
-
-    # Start with an empty list, iterate through results, and append row by row
-    playerStandings = []
-    for row in dbcursor.fetchall():
-        playerStandings.append((row[0], row[1], row[2], row[3], row[4], row[5],
-                                row[6]))
-
-    dbconnection.close()
-    return playerStandings
+    try:
+        # Named cursors are server-side: the query's rows stay on the
+        # server until they are fetched
+        dbcursor = dbconnection.cursor('standings_stream')
+        dbcursor.execute(MAINTAINED_STANDINGS_QUERY,
+                         {'tournament_id': tournament_id})
+        while True:
+            rows = dbcursor.fetchmany(page_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+        dbcursor.close()
+    finally:
+        dbconnection.close()
 
 
+@_instrumented
+def exportStandings(tournament_id, fileobj, format='csv', page_size=None):
+    """Writes the standings of a tournament to a file object as they are
+    streamed from iterStandings(), so memory use does not grow with the
+    size of the tournament.
+
+    Args:
+      tournament_id: the id of the tournament to export
+      fileobj: a file object open for writing
+      format: 'csv' for a header row of STANDINGS_COLUMNS and a row for
+              each player, or 'json' for an array with an object for each
+              player, keyed by STANDINGS_COLUMNS
+      page_size: as for iterStandings()
+
+    Returns:
+      The number of players written.
+
+    Raises:
+      ValueError: if the format is unknown
+    """
+    if format not in ('csv', 'json'):
+        raise ValueError("Unknown export format '%s'; choose from csv, json"
+                         % format)
+
+    count = 0
+    with contextlib.closing(iterStandings(tournament_id, page_size)) as rows:
+        if format == 'csv':
+            writer = csv.writer(fileobj, lineterminator='\n')
+            writer.writerow(STANDINGS_COLUMNS)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        else:
+            encode = json.JSONEncoder().encode
+            fileobj.write('[')
+            for row in rows:
+                fileobj.write(',\n' if count else '\n')
+                fileobj.write(_JSON_STANDING % tuple(map(encode, row)))
+                count += 1
+            fileobj.write('\n]\n' if count else ']\n')
+    return count
+
+
+@_instrumented
+@_changesStandings('tournament_id')
+@_pluggable
 def reportMatch(tournament_id, player_1_id, player_2_id, winner, draw):
     """Records the outcome of a single match between two players in a specific
     tournament.
@@ -212,19 +802,534 @@ def reportMatch(tournament_id, player_1_id, player_2_id, winner, draw):
     player1ID = min(player_1_id, player_2_id)
     player2ID = max(player_1_id, player_2_id)
 
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
+    with transaction() as dbcursor:
+        # Use string insertion method with tuple to prevent SQL injection
+        # attacks
+        dbcursor.execute("""INSERT INTO matches (tournament_id, player_1_id,
+                            player_2_id, winner_id, draw) VALUES
+                            (%s, %s, %s, %s, %s);""",
+                         (tournament_id, player1ID, player2ID, winner, draw,))
+        _recordStandings(dbcursor, tournament_id, player1ID, player2ID,
+                         winner, draw)
+
+
+@_instrumented
+@_changesStandings('tournament_id')
+def reportMatches(tournament_id, results):
+    """Records the outcomes of many matches in a specific tournament, such as
+    a whole round, in a single transaction.
+
+    Every result is checked before anything is written.  If any result is
+    invalid, or the database rejects one, none of them are recorded.
+
+    Args:
+      tournament_id:  the id of the tournament these matches belong to
+      results: an iterable of (player_1_id, player_2_id, winner, draw)
+               tuples, with the same meaning as the arguments of
+               reportMatch()
+
+    Raises:
+      ValueError: if a result is invalid, repeats a pair of players, or
+                  names a player who is not a competitor in the tournament
+    """
+    rows, players = _checkResults(tournament_id, results)
+    if rows:
+        _insertMatches(tournament_id, rows, players)
 
-    # Use string insertion method with tuple to prevent SQL injection attacks
-    dbcursor.execute("""INSERT INTO matches (tournament_id, player_1_id,
-                        player_2_id, winner_id, draw) VALUES
-                        (%s, %s, %s, %s, %s);""",
-                     (tournament_id, player1ID, player2ID, winner, draw,))
 
-    dbconnection.commit()
-    dbconnection.close()
+def _checkResults(tournament_id, results):
+    """Checks results for reportMatches() and completeRound().
 
+    Returns:
+      A (rows, players) tuple: the results as (tournament_id, player_1_id,
+      player_2_id, winner, draw) rows, lowest player id first, and the set
+      of every player in them.
 
+    Raises:
+      ValueError: as described in reportMatches()
+    """
+    rows = []
+    pairs = set()
+    players = set()
+    for (player_1_id, player_2_id, winner, draw) in results:
+        # Keeping things orderly by always inserting player IDs lowest to
+        # highest
+        player1ID = min(player_1_id, player_2_id)
+        player2ID = max(player_1_id, player_2_id)
+        if winner is not None and winner not in (player1ID, player2ID):
+            raise ValueError("Player %s did not play in match %s vs. %s" %
+                             (winner, player1ID, player2ID))
+        if draw and winner is not None:
+            raise ValueError("Match %s vs. %s cannot be both a draw and won" %
+                             (player1ID, player2ID))
+        if (player1ID, player2ID) in pairs:
+            raise ValueError("Match %s vs. %s is reported more than once" %
+                             (player1ID, player2ID))
+        pairs.add((player1ID, player2ID))
+        players.update((player1ID, player2ID))
+        rows.append((tournament_id, player1ID, player2ID, winner, bool(draw)))
+
+    return rows, players
+
+
+@_pluggable
+def _insertMatches(tournament_id, rows, players):
+    """Records matches checked by reportMatches() in one transaction.
+
+    Args:
+      tournament_id:  the id of the tournament these matches belong to
+      rows: (tournament_id, player_1_id, player_2_id, winner, draw) tuples,
+            with the lowest player id first
+      players: the set of ids of every player in 'rows'
+    """
+    with transaction() as dbcursor:
+        _writeMatches(dbcursor, tournament_id, rows, players)
+
+
+def _writeMatches(dbcursor, tournament_id, rows, players):
+    """Inserts the matches described in _insertMatches() on an open cursor,
+    and updates the standings of their players and of the winners'
+    opponents."""
+    dbcursor.execute("""SELECT competitor_id FROM competitors
+                        WHERE tournament_id = %s AND
+                              competitor_id = ANY(%s);""",
+                     (tournament_id, list(players),))
+    missing = players - set(row[0] for row in dbcursor.fetchall())
+    if missing:
+        raise ValueError("Players %s are not competitors in tournament %s" %
+                         (sorted(missing), tournament_id))
+
+    _recordAllStandings(dbcursor, tournament_id, rows)
+
+    # One multi-row INSERT per page of results rather than one per match
+    psycopg2.extras.execute_values(
+        dbcursor,
+        """INSERT INTO matches (tournament_id, player_1_id, player_2_id,
+           winner_id, draw) VALUES %s;""",
+        rows, page_size=1000)
+
+
+def _recordAllStandings(dbcursor, tournament_id, rows):
+    """Updates the standings table for matches that are about to be
+    inserted, as _recordStandings() does for one match, with one statement
+    for each of its steps rather than one for each match.
+
+    Must be called before the matches are inserted, so that the winners'
+    earlier opponents can be told from their new ones.
+    """
+    wins = {}
+    draws = {}
+    matches = {}
+    opponents = []
+    for (_, player1, player2, winner, draw) in rows:
+        # A bye lists the same player twice, but counts once
+        for player in set([player1, player2]):
+            matches[player] = matches.get(player, 0) + 1
+            draws[player] = draws.get(player, 0) + (1 if draw else 0)
+        if winner is not None:
+            wins[winner] = wins.get(winner, 0) + 1
+        if player1 != player2:
+            opponents.extend([(player1, player2), (player2, player1)])
+
+    if wins:
+        # The winners' earlier opponents each gain one OMW per new win
+        dbcursor.execute("""UPDATE standings
+                            SET omw = standings.omw + gained.omw
+                            FROM (
+                                SELECT  results.opponent_id,
+                                        SUM(won.wins) AS omw
+                                FROM    unnest(%(winners)s, %(wins)s)
+                                        AS won (player_id, wins)
+                                        INNER JOIN (
+                                        SELECT player_1_id AS player_id,
+                                               player_2_id AS opponent_id
+                                        FROM   matches
+                                        WHERE  tournament_id =
+                                               %(tournament_id)s
+                                        UNION ALL
+                                        SELECT player_2_id, player_1_id
+                                        FROM   matches
+                                        WHERE  tournament_id =
+                                               %(tournament_id)s)
+                                        AS results
+                                        ON (results.player_id = won.player_id)
+                                WHERE   results.opponent_id <>
+                                        results.player_id
+                                GROUP BY results.opponent_id) AS gained
+                            WHERE standings.tournament_id = %(tournament_id)s
+                              AND standings.player_id = gained.opponent_id;""",
+                         {'tournament_id': tournament_id,
+                          'winners': wins.keys(), 'wins': wins.values()})
+
+    players = matches.keys()
+    dbcursor.execute("""UPDATE standings
+                        SET wins = standings.wins + played.wins,
+                            draws = standings.draws + played.draws,
+                            matches = standings.matches + played.matches
+                        FROM unnest(%(players)s, %(wins)s, %(draws)s,
+                                    %(matches)s)
+                             AS played (player_id, wins, draws, matches)
+                        WHERE standings.tournament_id = %(tournament_id)s AND
+                              standings.player_id = played.player_id;""",
+                     {'tournament_id': tournament_id, 'players': players,
+                      'wins': [wins.get(player, 0) for player in players],
+                      'draws': [draws[player] for player in players],
+                      'matches': [matches[player] for player in players]})
+
+    if opponents:
+        # Each player's OMW gains their new opponents' wins, these matches'
+        # included
+        dbcursor.execute("""UPDATE standings
+                            SET omw = standings.omw + gained.omw
+                            FROM (
+                                SELECT  met.player_id,
+                                        SUM(opponent.wins) AS omw
+                                FROM    unnest(%(players)s, %(opponents)s)
+                                        AS met (player_id, opponent_id)
+                                        INNER JOIN standings AS opponent
+                                        ON (opponent.player_id =
+                                            met.opponent_id)
+                                WHERE   opponent.tournament_id =
+                                        %(tournament_id)s
+                                GROUP BY met.player_id) AS gained
+                            WHERE standings.tournament_id = %(tournament_id)s
+                              AND standings.player_id = gained.player_id;""",
+                         {'tournament_id': tournament_id,
+                          'players': [pair[0] for pair in opponents],
+                          'opponents': [pair[1] for pair in opponents]})
+
+
+def _recordStandings(dbcursor, tournament_id, player1, player2, winner,
+                     draw):
+    """Updates the standings table for a match that has just been inserted,
+    on the same cursor so both commit together.
+
+    A win changes the OMW of everyone the winner has played, and the match
+    makes each player an opponent of the other, so each player's OMW also
+    gains the other's wins.
+    """
+    match = {'tournament_id': tournament_id, 'player1': player1,
+             'player2': player2, 'winner': winner, 'draw': bool(draw)}
+
+    # A bye lists the same player twice, so 'IN' counts it only once
+    dbcursor.execute("""UPDATE standings
+                        SET matches = matches + 1,
+                            draws = draws +
+                                    CASE WHEN %(draw)s THEN 1 ELSE 0 END
+                        WHERE tournament_id = %(tournament_id)s AND
+                              player_id IN (%(player1)s, %(player2)s);""",
+                     match)
+
+    if winner is not None:
+        dbcursor.execute("""UPDATE standings SET wins = wins + 1
+                            WHERE tournament_id = %(tournament_id)s AND
+                                  player_id = %(winner)s;""",
+                         match)
+
+        # The winner's earlier opponents each gain one OMW
+        dbcursor.execute("""UPDATE standings SET omw = omw + 1
+                            WHERE tournament_id = %(tournament_id)s AND
+                                  player_id NOT IN (%(player1)s,
+                                                    %(player2)s) AND
+                                  player_id IN (
+                                  SELECT player_2_id FROM matches
+                                  WHERE  tournament_id = %(tournament_id)s AND
+                                         player_1_id = %(winner)s
+                                  UNION
+                                  SELECT player_1_id FROM matches
+                                  WHERE  tournament_id = %(tournament_id)s AND
+                                         player_2_id = %(winner)s);""",
+                         match)
+
+    if player1 != player2:
+        # Each player's OMW gains their new opponent's wins, this one
+        # included
+        dbcursor.execute("""UPDATE standings
+                            SET omw = standings.omw + opponent.wins
+                            FROM standings AS opponent
+                            WHERE standings.tournament_id = %(tournament_id)s
+                              AND opponent.tournament_id = %(tournament_id)s
+                              AND ((standings.player_id = %(player1)s AND
+                                    opponent.player_id = %(player2)s) OR
+                                   (standings.player_id = %(player2)s AND
+                                    opponent.player_id = %(player1)s));""",
+                         match)
+
+
+@_instrumented
+@_changesStandings()
+@_pluggable
+def rebuildStandings(tournament_id=None):
+    """Recomputes the standings table from the matches table.
+
+    Use this after changing matches by hand, or to fill the table in a
+    database created before it existed.
+
+    Args:
+      tournament_id: the tournament to rebuild, or None for every tournament
+    """
+    with transaction() as dbcursor:
+        if tournament_id is None:
+            dbcursor.execute("SELECT id FROM tournaments;")
+            tournament_ids = [row[0] for row in dbcursor.fetchall()]
+        else:
+            tournament_ids = [tournament_id]
+
+        for tournament_id in tournament_ids:
+            _rebuildStandings(dbcursor, tournament_id)
+
+
+def _rebuildStandings(dbcursor, tournament_id):
+    """Recomputes one tournament's rows of the standings table on an open
+    cursor."""
+    dbcursor.execute("DELETE FROM standings WHERE tournament_id = %s;",
+                     (tournament_id,))
+    dbcursor.execute("""INSERT INTO standings (tournament_id, player_id, bye,
+                        wins, draws, omw, matches)
+                        SELECT  %(tournament_id)s, computed.id,
+                                computed.competitor_bye, computed."Wins",
+                                computed."Draws", computed."OMW",
+                                computed."Matches"
+                        FROM    (""" + STANDINGS_QUERY.rstrip(';') +
+                     """) AS computed;""",
+                     {'tournament_id': tournament_id})
+
+
+@_instrumented
+@_pluggable
+def standingsDifferences(tournament_id):
+    """Checks the standings table against standings computed from scratch.
+
+    Returns:
+      A list of (maintained, computed) tuples of standings rows, as described
+      in playerStandings(), for every player whose rows differ.  A player
+      missing from one side has None in its place.  An empty list means the
+      table is consistent.
+    """
+    with transaction() as dbcursor:
+        maintained = _fetchStandings(dbcursor, tournament_id)
+        computed = _fetchStandings(dbcursor, tournament_id, STANDINGS_QUERY)
+
+    maintainedRows = dict((row[0], row) for row in maintained)
+    computedRows = dict((row[0], row) for row in computed)
+    differences = []
+    for player_id in sorted(set(maintainedRows) | set(computedRows)):
+        maintainedRow = maintainedRows.get(player_id)
+        computedRow = computedRows.get(player_id)
+        if maintainedRow != computedRow:
+            differences.append((maintainedRow, computedRow))
+    return differences
+
+
+@_instrumented
+def rankedStandings(tournament_id, tiebreaks=None):
+    """Ranks the players of a tournament by points, then by a chain of
+    tiebreaks.
+
+    A win scores one point and a draw half a point.  The tiebreaks are
+    computed by the engine in tiebreak.py from one read of the tournament's
+    matches, rather than by a subquery per player.
+
+    Args:
+      tournament_id: the id of the tournament to rank
+      tiebreaks: names of tiebreaks from tiebreak.TIEBREAKS ('omw',
+                 'omw_percentage', 'buchholz', 'median_buchholz' and
+                 'sonneborn_berger'), most important first; defaults to
+                 TIEBREAKS
+
+    Returns:
+      A list of tuples, best first, each of which contains (id, name,
+      points) followed by the player's value for each tiebreak.
+
+    Raises:
+      ValueError: if a tiebreak is unknown
+    """
+    competitors, matches = _tiebreakData(tournament_id)
+    return tiebreak.rankStandings(competitors, matches,
+                                  TIEBREAKS if tiebreaks is None
+                                  else tiebreaks)
+
+
+@_pluggable
+def _tiebreakData(tournament_id):
+    """Loads what rankedStandings() needs in one transaction.  Returns a
+    tuple of the tournament's competitors, as (id, name) tuples, and its
+    matches, as (player_1_id, player_2_id, winner_id, draw) tuples."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""SELECT  players.id, players.name
+                            FROM    competitors INNER JOIN players
+                                    ON (players.id = competitors.competitor_id)
+                            WHERE   competitors.tournament_id = %s;""",
+                         (tournament_id,))
+        competitors = dbcursor.fetchall()
+        dbcursor.execute("""SELECT  player_1_id, player_2_id, winner_id, draw
+                            FROM    matches
+                            WHERE   tournament_id = %s;""",
+                         (tournament_id,))
+        return competitors, dbcursor.fetchall()
+
+
+@_instrumented
+def playerRatings():
+    """Returns every player's rating, best first.
+
+    Returns:
+      A list of (id, name, rating, deviation, volatility, matches) tuples,
+      ordered by rating and then by id.  Players who have not been rated
+      have the starting rating of RATING_SYSTEM and 0 matches.  Elo ratings
+      have a deviation and volatility of 0.
+    """
+    system = rating.ratingSystem(RATING_SYSTEM)
+    rows = [(player_id, name, rating.INITIAL_RATING, system.deviation,
+             system.volatility, 0) if matches is None else
+            (player_id, name, playerRating, deviation, volatility, matches)
+            for (player_id, name, playerRating, deviation, volatility,
+                 matches) in _ratingData()]
+    rows.sort(key=lambda row: (-row[2], row[0]))
+    return rows
+
+
+@_pluggable
+def _ratingData():
+    """Reads every player's stored rating for playerRatings().  Returns
+    (id, name, rating, deviation, volatility, matches) tuples, with None in
+    the last four places for players who have not been rated."""
+    with transaction() as dbcursor:
+        dbcursor.execute("""SELECT  players.id, players.name, ratings.rating,
+                                    ratings.deviation, ratings.volatility,
+                                    ratings.matches
+                            FROM    players LEFT JOIN ratings
+                                    ON (ratings.player_id = players.id);""")
+        return dbcursor.fetchall()
+
+
+@_instrumented
+def rateRound(results, system=None):
+    """Updates the ratings of the players in a round from its results.
+
+    The round is rated as one rating period, with the whole round's updates
+    computed at once from the ratings players had before it (see
+    rating.py).  Call this once for each round, after its results are
+    recorded with reportMatches() or completeRound().
+
+    Args:
+      results: an iterable of (player_1_id, player_2_id, winner, draw)
+               tuples, as for reportMatches().  Byes, and matches with
+               neither a winner nor a draw, are not rated
+      system: 'elo' or 'glicko2'; defaults to RATING_SYSTEM
+
+    Raises:
+      ValueError: if a result is invalid or the rating system is unknown
+    """
+    system = rating.ratingSystem(RATING_SYSTEM if system is None else system)
+    rows, players = _checkResults(None, results)
+    results = [row[1:] for row in rows
+               if row[1] != row[2] and (row[3] is not None or row[4])]
+    if not results:
+        return
+
+    def rate(stored):
+        return rating.rateResults(system, stored, results)
+    _updateRatings(sorted(set(player_id for row in results
+                              for player_id in row[:2])), rate)
+
+
+@_pluggable
+def _updateRatings(player_ids, rate):
+    """Replaces the ratings of some players for rateRound(), in one
+    transaction.
+
+    Args:
+      player_ids: the ids of the players to rate
+      rate: a function taking a dict of the players' stored (rating,
+            deviation, volatility, matches) tuples, keyed by id, and
+            returning (player_id, rating, deviation, volatility, matches)
+            tuples for every player
+    """
+    with transaction() as dbcursor:
+        # Held until the transaction ends, so that a player's ratings are
+        # never read by one update while another is writing them
+        dbcursor.execute("SELECT pg_advisory_xact_lock(%s, 0);",
+                         (RATING_LOCK_KEY,))
+        dbcursor.execute("""SELECT  player_id, rating, deviation, volatility,
+                                    matches
+                            FROM    ratings
+                            WHERE   player_id = ANY(%s);""", (player_ids,))
+        rows = rate(dict((row[0], row[1:]) for row in dbcursor.fetchall()))
+        dbcursor.execute("DELETE FROM ratings WHERE player_id = ANY(%s);",
+                         (player_ids,))
+        psycopg2.extras.execute_values(
+            dbcursor,
+            """INSERT INTO ratings (player_id, rating, deviation, volatility,
+               matches) VALUES %s;""",
+            rows, page_size=1000)
+
+
+@_instrumented
+def rebuildRatings(system=None):
+    """Rates every player from scratch by replaying the whole match history,
+    such as after a result has been corrected.
+
+    The history is read in the order matches were reported and rated a
+    round at a time, as rateRound() would have rated it, with NumPy doing
+    the work of each round in a few array operations.  A million matches
+    are replayed in seconds.
+
+    Args:
+      system: 'elo' or 'glicko2'; defaults to RATING_SYSTEM
+
+    Raises:
+      ValueError: if the rating system is unknown
+    """
+    system = rating.ratingSystem(RATING_SYSTEM if system is None else system)
+
+    def rebuild(history):
+        return rating.replay(system, history).rows()
+    _rebuildRatings(rebuild)
+
+
+@_pluggable
+def _rebuildRatings(rebuild):
+    """Replaces every rating for rebuildRatings(), in one transaction.
+
+    Args:
+      rebuild: a function taking the match history, as an integer
+               (player_1_id, player_2_id, winner_id, draw) row for every
+               match in the order they were reported, with 0 for no winner
+               and 1 for a draw, and returning (player_id, rating,
+               deviation, volatility, matches) tuples
+    """
+    with transaction() as dbcursor:
+        dbcursor.execute("SELECT pg_advisory_xact_lock(%s, 0);",
+                         (RATING_LOCK_KEY,))
+
+        # COPY sends the history as text in one stream, which NumPy parses
+        # much faster than psycopg2 builds a tuple for every row
+        buf = cStringIO.StringIO()
+        dbcursor.copy_expert("""COPY (SELECT player_1_id, player_2_id,
+                                             COALESCE(winner_id, 0),
+                                             CASE WHEN draw THEN 1 ELSE 0 END
+                                      FROM   matches
+                                      ORDER BY id) TO STDOUT;""", buf)
+        rows = rebuild(rating.loadHistory(buf.getvalue()))
+        dbcursor.execute("DELETE FROM ratings;")
+        _copyRows(dbcursor, 'ratings', ('player_id', 'rating', 'deviation',
+                                        'volatility', 'matches'), rows)
+
+
+# Counts the matches between a pair of players in a tournament, lowest player
+# id first.  'COALESCE' returns zero instead of 'None' when query returns no
+# rows.
+PLAYED_PREVIOUSLY_QUERY = """
+    SELECT  COALESCE(COUNT(*), 0)
+    FROM    matches
+    WHERE   tournament_id = %s AND
+            player_1_id = %s AND
+            player_2_id = %s;"""
+
+
+@_instrumented
+@_pluggable
 def havePlayedPreviously(tournament_id, player1, player2):
     """ Returns True if the two players passed as arguments have played each
         other already in this tournament.
@@ -240,21 +1345,12 @@ def havePlayedPreviously(tournament_id, player1, player2):
     player2ID = max(player1, player2)
 
     # Query the database for this pairing
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-
-    # 'COALESCE' returns zero instead of 'None' when query returns no rows
-    dbcursor.execute("""SELECT  COALESCE(COUNT(*), 0)
-                        FROM    matches
-                        WHERE   tournament_id = %s AND
-                                player_1_id = %s AND
-                                player_2_id = %s;""",
-                     (tournament_id, player1ID, player2ID,))
+    with transaction() as dbcursor:
+        dbcursor.execute(PLAYED_PREVIOUSLY_QUERY,
+                         (tournament_id, player1ID, player2ID,))
 
-    # Assign only the first value in the first tuple to avoid error
-    previousMatches = dbcursor.fetchall()[0][0]
-
-    dbconnection.close()
+        # Assign only the first value in the first tuple to avoid error
+        previousMatches = dbcursor.fetchall()[0][0]
 
     # Return True or False, depending on whether a previous match exists or not
     if (previousMatches > 0):
@@ -263,7 +1359,27 @@ def havePlayedPreviously(tournament_id, player1, player2):
         return False
 
 
-def swissPairings(tournament_id):
+@_instrumented
+@_pluggable
+def playedPairs(tournament_id):
+    """ Returns the set of pairs of players who have already played each
+        other in this tournament, as (lowest id, highest id) tuples."""
+    with transaction() as dbcursor:
+        return _fetchPlayedPairs(dbcursor, tournament_id)
+
+
+def _fetchPlayedPairs(dbcursor, tournament_id):
+    """Loads every pairing played in a tournament on an open cursor.  Returns
+    the set described in playedPairs()."""
+    dbcursor.execute("""SELECT  player_1_id, player_2_id
+                        FROM    matches
+                        WHERE   tournament_id = %s;""",
+                     (tournament_id,))
+    return pairing.playedPairSet(dbcursor.fetchall())
+
+
+@_instrumented
+def swissPairings(tournament_id, mode=None):
     """ Returns a list of pairs of players for the next round of a match in a
         specific tournament.
 
@@ -272,6 +1388,10 @@ def swissPairings(tournament_id):
         If there is an odd number of players, one of them gets a 'bye' for this
         round.
 
+        Args:
+        tournament_id: the id of the tournament to pair
+        mode: 'greedy' or 'optimal'; defaults to PAIRING_MODE
+
         Returns:
         A list of tuples, each of which contains (id1, name1, id2, name2)
             id1: the first player's unique id
@@ -279,51 +1399,428 @@ def swissPairings(tournament_id):
             id2: the second player's unique id
             name2: the second player's name
     """
-    currentStandings = playerStandings(tournament_id)
+    # Load the standings and every pair that has already played in one go,
+    # so pairing itself needs no further queries
+    currentStandings, previousPairs = _pairingData(tournament_id)
 
-    # If our list of competitors has an odd length...
-    if (len(currentStandings) % 2 != 0):
+    # If our list of competitors has an odd length, record in the database
+    # that a player who has not used their round bye in this tournament has
+    # now used it, and give them a 'win' against themselves
+    player = _chooseBye(currentStandings)
+    if player is not None:
+        useCompetitorBye(tournament_id, player[0])
+        reportMatch(tournament_id, player[0], player[0], None, False)
 
-        # ... iterate through the players until we find someone who has not
-        # used their round bye in this tournament...
-        for player in currentStandings:
+    return _pairStandings(currentStandings, previousPairs, mode)
 
-            # ... remove them from the list, record in the database that
-            # they have now used their bye, and give them a 'win' against
-            # themselves
-            if (player[2] == False):
-                currentStandings.remove(player)
-                useCompetitorBye(tournament_id, player[0])
-                reportMatch(tournament_id, player[0], player[0], None, False)
-                break
 
-    # Start with an empty list, iterate through results of playerStandings
-    # in pairs and append row by row
-    pairList = []
+@_instrumented
+@_changesStandings('tournament_id')
+def createRound(tournament_id, round_number, mode=None):
+    """Pairs a round of a tournament and stores it, safely from any number
+    of processes at once.
 
-    # Iterate through each row of the current standings...
-    for player in currentStandings:
+    Rounds of a tournament are created one at a time, under an advisory
+    lock on the tournament, and each round is stored in a single
+    transaction with its bye.  Creating a round that already exists returns
+    its stored pairings without pairing it again, so a call that failed or
+    timed out can simply be retried.
 
-        # if this player is not in the new pair list...
-        if any(player[0] in row for row in pairList) == False:
+    Args:
+      tournament_id: the id of the tournament to pair
+      round_number: the round to create, counting from 1.  Must be the
+                    round after the last one created, once every result of
+                    that round is reported, or an existing round
+      mode: 'greedy' or 'optimal'; defaults to PAIRING_MODE
+
+    Returns:
+      The pairings described in swissPairings().
+
+    Raises:
+      ValueError: if round_number is below 1 or beyond the round after the
+                  last one, or the last round still has results to report
+    """
+    if round_number < 1:
+        raise ValueError("Rounds are numbered from 1, not %s" % round_number)
 
-            # iterate through all of the other players...
-            for player2 in currentStandings:
+    def pair(currentStandings, previousPairs):
+        player = _chooseBye(currentStandings)
+        return (None if player is None else player[0],
+                _pairStandings(currentStandings, previousPairs, mode))
+    return _createRound(tournament_id, round_number, pair)
 
-                # and, if the other player is not the same person...
-                if player[0] != player2[0]:
 
-                    # if this player is not in the new pair list...
-                    if any(player2[0] in row for row in pairList) == False:
+@_pluggable
+def _createRound(tournament_id, round_number, pair):
+    """Stores a round of a tournament for createRound(), unless it already
+    exists.
 
-                        # check that the other player is not already in the
-                        # pairlist and have not already played this player
-                        if (havePlayedPreviously(tournament_id, player[0],
-                                                 player2[0]) == False):
+    Args:
+      tournament_id: the id of the tournament to pair
+      round_number: the round to create
+      pair: a function taking the tournament's standings and played pairs,
+            and returning a (bye player id or None, pairings) tuple
 
-                            # .. then add them as the next pair
-                            pairList.append((player[0], player[1], player2[0],
-                                             player2[1]))
-                            break
+    Returns:
+      The pairings of the round.
+    """
+    with transaction() as dbcursor:
+        # Held until the transaction ends.  Anyone else creating a round of
+        # this tournament waits here, and then finds the round stored
+        dbcursor.execute("SELECT pg_advisory_xact_lock(%s, %s);",
+                         (ROUND_LOCK_KEY, tournament_id,))
+        lastRound, pairings, complete = (
+            _fetchRound(dbcursor, tournament_id) or (0, [], True))
+        if round_number < lastRound:
+            return _fetchRound(dbcursor, tournament_id, round_number)[1]
+        if round_number == lastRound:
+            return pairings
+        if round_number != lastRound + 1:
+            raise ValueError("Round %s of tournament %s cannot be created "
+                             "before round %s" %
+                             (round_number, tournament_id, lastRound + 1))
+        if not complete:
+            raise ValueError("Round %s of tournament %s cannot be created "
+                             "until every result of round %s is reported" %
+                             (round_number, tournament_id, lastRound))
+
+        bye, pairings = pair(_fetchStandings(dbcursor, tournament_id),
+                             _fetchPlayedPairs(dbcursor, tournament_id))
+        dbcursor.execute("""INSERT INTO rounds (tournament_id, round, bye_id)
+                            VALUES (%s, %s, %s);""",
+                         (tournament_id, round_number, bye,))
+        if bye is not None:
+            _recordBye(dbcursor, tournament_id, bye)
+        psycopg2.extras.execute_values(
+            dbcursor,
+            """INSERT INTO pairings (tournament_id, round, board,
+               player_1_id, player_2_id) VALUES %s;""",
+            [(tournament_id, round_number, board, id1, id2)
+             for board, (id1, name1, id2, name2) in enumerate(pairings, 1)],
+            page_size=1000)
+    return pairings
+
+
+def _recordBye(dbcursor, tournament_id, player_id):
+    """Records a player's bye on an open cursor, as useCompetitorBye() and
+    reportMatch() do in separate transactions."""
+    dbcursor.execute("""UPDATE competitors SET competitor_bye = True
+                        WHERE tournament_id = %s AND competitor_id = %s;""",
+                     (tournament_id, player_id,))
+    dbcursor.execute("""UPDATE standings SET bye = True
+                        WHERE tournament_id = %s AND player_id = %s;""",
+                     (tournament_id, player_id,))
+    dbcursor.execute("""INSERT INTO matches (tournament_id, player_1_id,
+                        player_2_id, winner_id, draw) VALUES
+                        (%s, %s, %s, NULL, False);""",
+                     (tournament_id, player_id, player_id,))
+    _recordStandings(dbcursor, tournament_id, player_id, player_id, None,
+                     False)
+
+
+# The pairings of a stored round in board order, each with whether its
+# result has been reported.  Matches are stored lowest player id first, so
+# each pairing is looked up in the matches primary key the same way.
+ROUND_PAIRINGS_QUERY = """
+    SELECT  pairings.player_1_id, first.name, pairings.player_2_id,
+            second.name, matches.tournament_id IS NOT NULL
+    FROM    pairings
+            INNER JOIN players AS first ON (first.id = pairings.player_1_id)
+            INNER JOIN players AS second
+            ON (second.id = pairings.player_2_id)
+            LEFT JOIN matches
+            ON (matches.tournament_id = pairings.tournament_id AND
+                matches.player_1_id = LEAST(pairings.player_1_id,
+                                            pairings.player_2_id) AND
+                matches.player_2_id = GREATEST(pairings.player_1_id,
+                                               pairings.player_2_id))
+    WHERE   pairings.tournament_id = %(tournament_id)s AND
+            pairings.round = %(round)s
+    ORDER BY pairings.board;"""
+
+
+def _fetchRound(dbcursor, tournament_id, round_number=None):
+    """Reads a stored round on an open cursor: the latest one, unless
+    round_number is given.  Returns the (round_number, pairings, complete)
+    tuple described in currentRound(), or None if there is no such round."""
+    if round_number is None:
+        dbcursor.execute("""SELECT MAX(round) FROM rounds
+                            WHERE tournament_id = %s;""",
+                         (tournament_id,))
+    else:
+        dbcursor.execute("""SELECT round FROM rounds
+                            WHERE tournament_id = %s AND round = %s;""",
+                         (tournament_id, round_number,))
+    row = dbcursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+
+    dbcursor.execute(ROUND_PAIRINGS_QUERY,
+                     {'tournament_id': tournament_id, 'round': row[0]})
+    rows = dbcursor.fetchall()
+    return (row[0], [tuple(pairingRow[:4]) for pairingRow in rows],
+            all(pairingRow[4] for pairingRow in rows))
+
+
+@_instrumented
+def currentRound(tournament_id):
+    """Returns the latest round createRound() has stored for a tournament.
+
+    Reading a stored round is a single index scan with no side effects, so
+    clients showing the current round should call this instead of pairing
+    the round again.
+
+    Returns:
+      A (round_number, pairings, complete) tuple, or None if no round has
+      been created:
+        round_number: the round's number, counting from 1
+        pairings: the pairings described in swissPairings(), in board order
+        complete: whether every pairing's result has been reported
+    """
+    return _roundData(tournament_id, None)
+
+
+@_instrumented
+def fetchRound(tournament_id, round_number):
+    """Returns a round createRound() has stored, as currentRound() does.
+
+    Raises:
+      ValueError: if the round has not been created
+    """
+    stored = _roundData(tournament_id, round_number)
+    if stored is None:
+        raise ValueError("Round %s of tournament %s has not been created" %
+                         (round_number, tournament_id))
+    return stored
+
+
+@_pluggable
+def _roundData(tournament_id, round_number):
+    """Reads a stored round in one transaction, for currentRound() and
+    fetchRound().  Reads the latest round if round_number is None."""
+    with transaction() as dbcursor:
+        return _fetchRound(dbcursor, tournament_id, round_number)
 
-    return pairList
+
+@_instrumented
+@_changesStandings('tournament_id')
+def completeRound(tournament_id, round_number, results):
+    """Records the results of every pairing of a stored round in one
+    transaction.
+
+    Args:
+      tournament_id:  the id of the tournament the round belongs to
+      round_number: the round the results are for
+      results: an iterable of (player_1_id, player_2_id, winner, draw)
+               tuples, as for reportMatches(), with one result for each of
+               the round's pairings
+
+    Raises:
+      ValueError: if a result is invalid, the round has not been created or
+                  is already complete, or the results do not match its
+                  pairings
+    """
+    rows, players = _checkResults(tournament_id, results)
+    _completeRound(tournament_id, round_number, rows, players)
+
+
+@_pluggable
+def _completeRound(tournament_id, round_number, rows, players):
+    """Records results checked by completeRound() in one transaction.
+
+    Args:
+      tournament_id:  the id of the tournament the round belongs to
+      round_number: the round the results are for
+      rows: (tournament_id, player_1_id, player_2_id, winner, draw) tuples,
+            with the lowest player id first
+      players: the set of ids of every player in 'rows'
+    """
+    with transaction() as dbcursor:
+        # Keeps the round from changing until the results are in
+        dbcursor.execute("SELECT pg_advisory_xact_lock(%s, %s);",
+                         (ROUND_LOCK_KEY, tournament_id,))
+        stored = _fetchRound(dbcursor, tournament_id, round_number)
+        if stored is None:
+            raise ValueError("Round %s of tournament %s has not been "
+                             "created" % (round_number, tournament_id))
+        if stored[2]:
+            raise ValueError("Round %s of tournament %s is already complete"
+                             % (round_number, tournament_id))
+        if set(pairing.pairKey(id1, id2)
+               for (id1, name1, id2, name2) in stored[1]) != \
+                set((row[1], row[2]) for row in rows):
+            raise ValueError("The results do not match the pairings of "
+                             "round %s of tournament %s" %
+                             (round_number, tournament_id))
+        _writeMatches(dbcursor, tournament_id, rows, players)
+
+
+@_instrumented
+@_changesStandings('tournament_ids')
+def swissPairingsForTournaments(tournament_ids, mode=None, processes=None):
+    """Pairs the next round of many tournaments at once, such as every event
+    at a festival.
+
+    The standings and played pairs of every tournament are loaded in one
+    transaction, and the byes of every odd-sized tournament are recorded in
+    another, instead of a few transactions per tournament.  Pairing needs no
+    database, so the tournaments are paired in parallel in a pool of worker
+    processes.  The byes are only recorded once every tournament has been
+    paired, so if pairing fails nothing is written.
+
+    Args:
+      tournament_ids: the ids of the tournaments to pair
+      mode: 'greedy' or 'optimal'; defaults to PAIRING_MODE
+      processes: the number of worker processes; defaults to the number of
+                 CPUs.  With 1, every tournament is paired in this process
+
+    Returns:
+      A dict keyed by tournament id of the pairings swissPairings() returns
+      for that tournament.
+    """
+    tournament_ids = sorted(set(tournament_ids))
+    data = _pairingDataForTournaments(tournament_ids)
+
+    tasks = []
+    byes = []
+    for tournament_id in tournament_ids:
+        currentStandings, previousPairs = data[tournament_id]
+        player = _chooseBye(currentStandings)
+        if player is not None:
+            byes.append((tournament_id, player[0]))
+        tasks.append((currentStandings, previousPairs, mode or PAIRING_MODE))
+
+    pairings = _pairTasks(tasks, processes)
+    if byes:
+        _recordByes(byes)
+    return dict(zip(tournament_ids, pairings))
+
+
+def _pairTasks(tasks, processes):
+    """Pairs the tournaments of swissPairingsForTournaments(), in a pool of
+    'processes' worker processes, or the number of CPUs if it is None.
+    Returns their pairings in the order of 'tasks'."""
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = min(processes, len(tasks))
+    if processes <= 1:
+        return map(_pairTask, tasks)
+
+    # Workers are forked, so anything they need is already loaded; they only
+    # receive each tournament's data and send back its pairings
+    workers = multiprocessing.Pool(processes)
+    try:
+        return workers.map(_pairTask, tasks)
+    finally:
+        workers.terminate()
+        workers.join()
+
+
+def _chooseBye(currentStandings):
+    """Removes the player who gets this round's bye from a tournament's
+    standings, if it has an odd number of players.
+
+    The bye goes to the highest placed player who has not used theirs.
+
+    Returns:
+      The removed standings row, or None if nobody gets a bye.
+    """
+    if (len(currentStandings) % 2 != 0):
+        for player in currentStandings:
+            if (player[2] == False):
+                currentStandings.remove(player)
+                return player
+    return None
+
+
+def _pairStandings(currentStandings, previousPairs, mode):
+    """Pairs a round from loaded standings and played pairs, without touching
+    the database.  Returns the pairings described in swissPairings()."""
+    # Pair players within their score group (wins, then draws), without
+    # rematches
+    if (mode or PAIRING_MODE) == 'optimal':
+        return pairing.optimalPairRound(currentStandings, previousPairs,
+                                        _points)
+    return pairing.pairRound(currentStandings, previousPairs,
+                             lambda row: (row[3], row[4]))
+
+
+def _pairTask(task):
+    """Pairs one tournament for swissPairingsForTournaments(), in a worker
+    process.  'task' is a (standings, played pairs, mode) tuple."""
+    return _pairStandings(*task)
+
+
+@_pluggable
+def _pairingData(tournament_id):
+    """Loads a tournament's standings and every pair that has already played
+    in one transaction.  Returns a (playerStandings(), playedPairs()) tuple.
+    """
+    with transaction() as dbcursor:
+        return (_fetchStandings(dbcursor, tournament_id),
+                _fetchPlayedPairs(dbcursor, tournament_id))
+
+
+@_pluggable
+def _pairingDataForTournaments(tournament_ids):
+    """Loads the standings and played pairs of several tournaments in one
+    transaction.  Returns a dict keyed by tournament id of
+    (playerStandings(), playedPairs()) tuples."""
+    data = dict((tournament_id, ([], set()))
+                for tournament_id in tournament_ids)
+    with transaction() as dbcursor:
+        dbcursor.execute(MAINTAINED_STANDINGS_FOR_TOURNAMENTS_QUERY,
+                         {'tournament_ids': list(tournament_ids)})
+        for row in dbcursor.fetchall():
+            data[row[0]][0].append(tuple(row[1:]))
+
+        dbcursor.execute("""SELECT  tournament_id, player_1_id, player_2_id
+                            FROM    matches
+                            WHERE   tournament_id = ANY(%s);""",
+                         (list(tournament_ids),))
+        for row in dbcursor.fetchall():
+            data[row[0]][1].add(pairing.pairKey(row[1], row[2]))
+    return data
+
+
+@_pluggable
+def _recordByes(byes):
+    """Records the byes given by swissPairingsForTournaments() in one
+    transaction, as useCompetitorBye() and reportMatch() record a single
+    bye.
+
+    Args:
+      byes: a list of (tournament_id, player_id) tuples
+    """
+    with transaction() as dbcursor:
+        psycopg2.extras.execute_values(
+            dbcursor,
+            """UPDATE competitors SET competitor_bye = True
+               FROM (VALUES %s) AS byes (tournament_id, player_id)
+               WHERE competitors.tournament_id = byes.tournament_id AND
+                     competitors.competitor_id = byes.player_id;""",
+            byes, page_size=1000)
+        psycopg2.extras.execute_values(
+            dbcursor,
+            """INSERT INTO matches (tournament_id, player_1_id, player_2_id,
+               winner_id, draw) VALUES %s;""",
+            [(tournament_id, player_id, player_id)
+             for (tournament_id, player_id) in byes],
+            template="(%s, %s, %s, NULL, False)", page_size=1000)
+        psycopg2.extras.execute_values(
+            dbcursor,
+            """UPDATE standings
+               SET bye = True, matches = standings.matches + 1
+               FROM (VALUES %s) AS byes (tournament_id, player_id)
+               WHERE standings.tournament_id = byes.tournament_id AND
+                     standings.player_id = byes.player_id;""",
+            byes, page_size=1000)
+
+
+def _points(row):
+    """Returns a standings row's score in half points: two for a win and one
+    for a draw."""
+    return 2 * row[3] + row[4]
+
+
+useBackend(BACKEND)
@@ -1,6 +1,10 @@
 -- Database schema for the tournament project.
 
 -- Drop all existing tables and views
+DROP TABLE IF EXISTS ratings CASCADE;
+DROP TABLE IF EXISTS pairings CASCADE;
+DROP TABLE IF EXISTS rounds CASCADE;
+DROP TABLE IF EXISTS standings CASCADE;
 DROP TABLE IF EXISTS matches CASCADE;
 DROP TABLE IF EXISTS competitors CASCADE;
 DROP TABLE IF EXISTS players CASCADE;
@@ -37,5 +41,80 @@ CREATE TABLE matches (
     player_2_id     integer REFERENCES players(id),
     winner_id       integer REFERENCES players(id),
     draw            boolean,
+    id              serial,
     PRIMARY KEY (tournament_id, player_1_id, player_2_id)
-);
\ No newline at end of file
+);
+
+
+-- Indexes for the matches lookups made by the standings and pairing queries.
+-- The primary key already covers lookups by tournament and player_1_id.
+-- Databases created before these were added can be upgraded with
+-- tournament_indexes.sql.
+CREATE INDEX matches_winner_idx ON matches (tournament_id, winner_id);
+CREATE INDEX matches_player_2_idx
+    ON matches (tournament_id, player_2_id, player_1_id, winner_id, draw);
+
+
+-- Create standings table: a running record for every competitor, kept up to
+-- date by reportMatch() so that standings can be read without recomputing
+-- them from matches
+CREATE TABLE standings (
+    tournament_id   integer,
+    player_id       integer,
+    bye             boolean,
+    wins            integer,
+    draws           integer,
+    omw             integer,
+    matches         integer,
+    PRIMARY KEY (tournament_id, player_id),
+    FOREIGN KEY (tournament_id, player_id)
+        REFERENCES competitors(tournament_id, competitor_id)
+        ON DELETE CASCADE
+);
+
+-- Lets playerStandings() read a tournament's standings in order with a
+-- single index scan
+CREATE INDEX standings_order_idx ON standings (tournament_id, wins DESC,
+    draws DESC, omw DESC, matches DESC, player_id);
+
+
+-- One row per round created by createRound(), with the player who was given
+-- the round's bye, if any
+CREATE TABLE rounds (
+    tournament_id   integer REFERENCES tournaments(id),
+    round           integer,
+    bye_id          integer REFERENCES players(id),
+    PRIMARY KEY (tournament_id, round)
+);
+
+
+-- The pairings of each round, numbered by board in the order createRound()
+-- returned them
+CREATE TABLE pairings (
+    tournament_id   integer,
+    round           integer,
+    board           integer,
+    player_1_id     integer,
+    player_2_id     integer,
+    PRIMARY KEY (tournament_id, round, board),
+    FOREIGN KEY (tournament_id, round)
+        REFERENCES rounds(tournament_id, round)
+        ON DELETE CASCADE,
+    FOREIGN KEY (tournament_id, player_1_id)
+        REFERENCES competitors(tournament_id, competitor_id)
+        ON DELETE CASCADE,
+    FOREIGN KEY (tournament_id, player_2_id)
+        REFERENCES competitors(tournament_id, competitor_id)
+        ON DELETE CASCADE
+);
+
+
+-- Each player's rating, kept by rateRound() and rebuilt by rebuildRatings()
+-- from the whole match history, which it reads in the order of matches.id
+CREATE TABLE ratings (
+    player_id   integer PRIMARY KEY REFERENCES players(id) ON DELETE CASCADE,
+    rating      double precision,
+    deviation   double precision,
+    volatility  double precision,
+    matches     integer
+);
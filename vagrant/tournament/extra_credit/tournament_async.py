@@ -0,0 +1,125 @@
+#
+# tournament_async.py -- non-blocking versions of the tournament functions
+#
+# Each function here takes the same arguments as the function of the same
+# name in tournament.py, hands the call to a pool of worker threads and
+# returns a concurrent.futures.Future of its result at once, so an event
+# loop is never blocked on the database.  There is one worker for each
+# connection the shared pool may open, so workers never wait for a
+# connection and the calls in flight are bounded by the pool.
+#
+# The Futures fit any event loop: an asyncio application awaits
+# asyncio.wrap_future(future), a Tornado coroutine yields the Future
+# itself, and any other loop can add_done_callback() to it.  On Python 2,
+# concurrent.futures is the 'futures' package.
+#
+
+import functools
+import os
+import threading
+
+from concurrent import futures
+
+import tournament
+
+# Every tournament function with a non-blocking version here
+FUNCTIONS = (
+    'deleteMatches', 'deleteCompetitors', 'deleteTournaments',
+    'deletePlayers', 'countCompetitors', 'createTournament',
+    'registerPlayer', 'registerCompetitor', 'registerPlayers',
+    'registerPlayersFromCSV', 'registerCompetitors', 'useCompetitorBye',
+    'playerStandings', 'reportMatch', 'reportMatches', 'rebuildStandings',
+    'standingsDifferences', 'rankedStandings', 'playerRatings', 'rateRound',
+    'rebuildRatings', 'havePlayedPreviously', 'playedPairs', 'swissPairings',
+    'createRound', 'currentRound', 'fetchRound', 'completeRound',
+    'swissPairingsForTournaments', 'exportStandings',
+)
+
+# The worker threads are started on first use, in each process
+_executor = None
+_executorPid = None
+_executorLock = threading.Lock()
+
+
+def getExecutor():
+    """Returns the pool of worker threads, starting it if necessary.
+
+    A forked process starts a pool of its own, as threads are not carried
+    across a fork.
+    """
+    global _executor, _executorPid
+    if _executor is None or _executorPid != os.getpid():
+        with _executorLock:
+            if _executor is None or _executorPid != os.getpid():
+                _executor = futures.ThreadPoolExecutor(
+                    tournament.POOL_MAX_CONNECTIONS)
+                _executorPid = os.getpid()
+    return _executor
+
+
+def shutdown(wait=True):
+    """Stops the worker threads once the calls already made are done.  A
+    new pool is started by the next call."""
+    global _executor
+    with _executorLock:
+        if _executor is not None and _executorPid == os.getpid():
+            _executor.shutdown(wait)
+        _executor = None
+
+
+def _nonBlocking(name):
+    """Returns a function that runs tournament.name() on a worker thread."""
+    function = getattr(tournament, name)
+
+    @functools.wraps(function)
+    def submit(*args, **kwargs):
+        return getExecutor().submit(function, *args, **kwargs)
+    submit.__doc__ = ("Runs tournament.%s() on a worker thread.  Returns a "
+                      "Future of its result." % name)
+    return submit
+
+
+for _name in FUNCTIONS:
+    globals()[_name] = _nonBlocking(_name)
+del _name
+
+
+def playerStandingsForTournaments(tournament_ids):
+    """Reads the standings of many tournaments at once, each on its own
+    worker thread.
+
+    Returns:
+      A Future of a dict of the standings described in
+      tournament.playerStandings(), keyed by tournament id.  If any read
+      fails, the Future fails with its error.
+    """
+    tournament_ids = list(tournament_ids)
+    reads = [playerStandings(tournament_id)
+             for tournament_id in tournament_ids]
+    return _gather(dict(zip(tournament_ids, reads)))
+
+
+def _gather(reads):
+    """Returns a Future of a dict of the results of a dict of Futures,
+    without tying up a worker thread to wait for them."""
+    gathered = futures.Future()
+    remaining = [len(reads)]
+    lock = threading.Lock()
+
+    def done(finishedRead):
+        with lock:
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished:
+            for read in reads.itervalues():
+                if read.exception() is not None:
+                    gathered.set_exception(read.exception())
+                    return
+            gathered.set_result(dict((key, read.result())
+                                     for (key, read) in reads.iteritems()))
+
+    if not reads:
+        gathered.set_result({})
+    for read in reads.values():
+        read.add_done_callback(done)
+    return gathered
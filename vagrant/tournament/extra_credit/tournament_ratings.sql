@@ -0,0 +1,17 @@
+-- Migration: adds the ratings table from tournament.sql to an existing
+-- tournament database, and numbers the matches already played so that
+-- rebuildRatings() can replay them.  Matches stored before this migration
+-- are numbered in whatever order PostgreSQL reads them.
+--
+-- Run it from psql with '\i tournament_ratings.sql' while connected to the
+-- tournament database.
+
+ALTER TABLE matches ADD COLUMN id serial;
+
+CREATE TABLE ratings (
+    player_id   integer PRIMARY KEY REFERENCES players(id) ON DELETE CASCADE,
+    rating      double precision,
+    deviation   double precision,
+    volatility  double precision,
+    matches     integer
+);
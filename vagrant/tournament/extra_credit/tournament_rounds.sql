@@ -0,0 +1,30 @@
+-- Migration: adds the rounds and pairings tables from tournament.sql to an
+-- existing tournament database.
+--
+-- Run it from psql with '\i tournament_rounds.sql' while connected to the
+-- tournament database.
+
+CREATE TABLE rounds (
+    tournament_id   integer REFERENCES tournaments(id),
+    round           integer,
+    bye_id          integer REFERENCES players(id),
+    PRIMARY KEY (tournament_id, round)
+);
+
+CREATE TABLE pairings (
+    tournament_id   integer,
+    round           integer,
+    board           integer,
+    player_1_id     integer,
+    player_2_id     integer,
+    PRIMARY KEY (tournament_id, round, board),
+    FOREIGN KEY (tournament_id, round)
+        REFERENCES rounds(tournament_id, round)
+        ON DELETE CASCADE,
+    FOREIGN KEY (tournament_id, player_1_id)
+        REFERENCES competitors(tournament_id, competitor_id)
+        ON DELETE CASCADE,
+    FOREIGN KEY (tournament_id, player_2_id)
+        REFERENCES competitors(tournament_id, competitor_id)
+        ON DELETE CASCADE
+);
@@ -0,0 +1,88 @@
+-- SQLite version of the schema in tournament.sql, used by sqlite_backend.py.
+--
+-- The backend runs this script every time it opens a database, so every
+-- statement must be safe to repeat.  Serial columns become AUTOINCREMENT
+-- keys, which likewise never reuse an id, and booleans are stored as 0 or 1.
+
+CREATE TABLE IF NOT EXISTS players (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    name    text
+);
+
+CREATE TABLE IF NOT EXISTS tournaments (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    name    text
+);
+
+CREATE TABLE IF NOT EXISTS competitors (
+    tournament_id   integer REFERENCES tournaments(id),
+    competitor_id   integer REFERENCES players(id),
+    competitor_bye  boolean,
+    PRIMARY KEY (tournament_id, competitor_id)
+);
+
+-- The rowid numbers matches in the order they were reported, in place of
+-- the id column of tournament.sql
+CREATE TABLE IF NOT EXISTS matches (
+    tournament_id   integer REFERENCES tournaments(id),
+    player_1_id     integer REFERENCES players(id),
+    player_2_id     integer REFERENCES players(id),
+    winner_id       integer REFERENCES players(id),
+    draw            boolean,
+    PRIMARY KEY (tournament_id, player_1_id, player_2_id)
+);
+
+CREATE INDEX IF NOT EXISTS matches_winner_idx
+    ON matches (tournament_id, winner_id);
+CREATE INDEX IF NOT EXISTS matches_player_2_idx
+    ON matches (tournament_id, player_2_id, player_1_id, winner_id, draw);
+
+CREATE TABLE IF NOT EXISTS standings (
+    tournament_id   integer,
+    player_id       integer,
+    bye             boolean,
+    wins            integer,
+    draws           integer,
+    omw             integer,
+    matches         integer,
+    PRIMARY KEY (tournament_id, player_id),
+    FOREIGN KEY (tournament_id, player_id)
+        REFERENCES competitors(tournament_id, competitor_id)
+        ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS standings_order_idx ON standings (tournament_id,
+    wins DESC, draws DESC, omw DESC, matches DESC, player_id);
+
+CREATE TABLE IF NOT EXISTS rounds (
+    tournament_id   integer REFERENCES tournaments(id),
+    round           integer,
+    bye_id          integer REFERENCES players(id),
+    PRIMARY KEY (tournament_id, round)
+);
+
+CREATE TABLE IF NOT EXISTS pairings (
+    tournament_id   integer,
+    round           integer,
+    board           integer,
+    player_1_id     integer,
+    player_2_id     integer,
+    PRIMARY KEY (tournament_id, round, board),
+    FOREIGN KEY (tournament_id, round)
+        REFERENCES rounds(tournament_id, round)
+        ON DELETE CASCADE,
+    FOREIGN KEY (tournament_id, player_1_id)
+        REFERENCES competitors(tournament_id, competitor_id)
+        ON DELETE CASCADE,
+    FOREIGN KEY (tournament_id, player_2_id)
+        REFERENCES competitors(tournament_id, competitor_id)
+        ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    player_id   integer PRIMARY KEY REFERENCES players(id) ON DELETE CASCADE,
+    rating      double precision,
+    deviation   double precision,
+    volatility  double precision,
+    matches     integer
+);
@@ -0,0 +1,24 @@
+-- Migration: adds the standings table from tournament.sql to an existing
+-- tournament database.
+--
+-- Run it from psql with '\i tournament_standings.sql' while connected to the
+-- tournament database, then fill the table from the existing matches with:
+--
+--     python -c "import tournament; tournament.rebuildStandings()"
+
+CREATE TABLE standings (
+    tournament_id   integer,
+    player_id       integer,
+    bye             boolean,
+    wins            integer,
+    draws           integer,
+    omw             integer,
+    matches         integer,
+    PRIMARY KEY (tournament_id, player_id),
+    FOREIGN KEY (tournament_id, player_id)
+        REFERENCES competitors(tournament_id, competitor_id)
+        ON DELETE CASCADE
+);
+
+CREATE INDEX standings_order_idx ON standings (tournament_id, wins DESC,
+    draws DESC, omw DESC, matches DESC, player_id);
@@ -0,0 +1,569 @@
+#
+# matching.py -- maximum-weight matching in general graphs
+#
+# An implementation of Edmonds' blossom algorithm with dual variables, in the
+# form described by Zvi Galil in "Efficient Algorithms for Finding Maximum
+# Matching in Graphs" (ACM Computing Surveys, 1986).  The structure follows
+# Joris van Rantwijk's public domain mwmatching.py.  The algorithm runs in
+# O(n^3) time for n vertices; it is used by pairing.py on sparse graphs of a
+# few hundred vertices at a time.
+#
+# Edge weights must be integers.  All arithmetic is then done in integers, so
+# the result is exact.
+#
+
+
+def maxWeightMatching(edges, maxCardinality=False):
+    """Computes a maximum-weight matching of a general graph.
+
+    Args:
+      edges: a list of (i, j, weight) tuples, one per edge, where i and j are
+             vertex numbers counting from zero and i != j
+      maxCardinality: if True, only matchings with the largest possible
+                      number of edges are considered, and the heaviest of
+                      those is returned
+
+    Returns:
+      A list 'mate' with one entry per vertex, where mate[i] is the vertex
+      matched to vertex i, or -1 if vertex i is single.
+    """
+    if not edges:
+        return []
+
+    nedge = len(edges)
+    nvertex = 0
+    for (i, j, weight) in edges:
+        if i < 0 or j < 0 or i == j:
+            raise ValueError("Invalid edge (%r, %r)" % (i, j))
+        nvertex = max(nvertex, i + 1, j + 1)
+
+    # The largest weight, used as the initial vertex dual so that every edge
+    # starts with non-negative slack
+    maxweight = max(0, max(weight for (i, j, weight) in edges))
+
+    # endpoint[p] is the vertex at endpoint p; edge k has endpoints 2k and
+    # 2k+1
+    endpoint = [edges[p // 2][p % 2] for p in range(2 * nedge)]
+
+    # neighbend[v] lists the remote endpoints of the edges attached to v
+    neighbend = [[] for v in range(nvertex)]
+    for k, (i, j, weight) in enumerate(edges):
+        neighbend[i].append(2 * k + 1)
+        neighbend[j].append(2 * k)
+
+    # mate[v] is the remote endpoint of v's matched edge, or -1 if single
+    mate = nvertex * [-1]
+
+    # label[b] is 0 (unlabeled), 1 (S-vertex/blossom) or 2 (T-vertex/blossom)
+    # for top-level blossoms and single vertices
+    label = (2 * nvertex) * [0]
+
+    # labelend[b] is the remote endpoint of the edge through which b obtained
+    # its label, or -1 if it has none
+    labelend = (2 * nvertex) * [-1]
+
+    # inblossom[v] is the top-level blossom containing vertex v
+    inblossom = list(range(nvertex))
+
+    # Blossoms are numbered nvertex .. 2*nvertex-1
+    blossomparent = (2 * nvertex) * [-1]
+    blossomchilds = (2 * nvertex) * [None]
+    blossombase = list(range(nvertex)) + nvertex * [-1]
+    blossomendps = (2 * nvertex) * [None]
+
+    # bestedge[b] is the least-slack edge from b to a different S-blossom
+    bestedge = (2 * nvertex) * [-1]
+    blossombestedges = (2 * nvertex) * [None]
+
+    unusedblossoms = list(range(nvertex, 2 * nvertex))
+
+    dualvar = nvertex * [maxweight] + nvertex * [0]
+
+    # allowedge[k] is True if edge k has zero slack in the optimization
+    # problem; if False the edge's slack may or may not be zero
+    allowedge = nedge * [False]
+
+    # Queue of newly discovered S-vertices
+    queue = []
+
+    def slack(k):
+        """Returns twice the slack of edge k (does not work inside
+        blossoms)."""
+        (i, j, weight) = edges[k]
+        return dualvar[i] + dualvar[j] - 2 * weight
+
+    def blossomLeaves(b):
+        """Yields every vertex inside blossom b."""
+        if b < nvertex:
+            yield b
+        else:
+            for t in blossomchilds[b]:
+                if t < nvertex:
+                    yield t
+                else:
+                    for v in blossomLeaves(t):
+                        yield v
+
+    def assignLabel(w, t, p):
+        """Labels vertex w and its top-level blossom with label t, reached
+        through the edge with remote endpoint p."""
+        b = inblossom[w]
+        label[w] = label[b] = t
+        labelend[w] = labelend[b] = p
+        bestedge[w] = bestedge[b] = -1
+        if t == 1:
+            # b became an S-vertex/blossom; add it(s vertices) to the queue
+            queue.extend(blossomLeaves(b))
+        elif t == 2:
+            # b became a T-vertex/blossom; assign label S to its mate
+            base = blossombase[b]
+            assignLabel(endpoint[mate[base]], 1, mate[base] ^ 1)
+
+    def scanBlossom(v, w):
+        """Traces back from S-vertices v and w to discover either a new
+        blossom or an augmenting path.  Returns the base vertex of the new
+        blossom, or -1."""
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            # Look for a breadcrumb in v's blossom or put a new breadcrumb
+            b = inblossom[v]
+            if label[b] & 4:
+                base = blossombase[b]
+                break
+            path.append(b)
+            label[b] = 5
+            # Trace one step back
+            if labelend[b] == -1:
+                # The base of blossom b is single; stop tracing this path
+                v = -1
+            else:
+                v = endpoint[labelend[b]]
+                b = inblossom[v]
+                # b is a T-blossom; trace one more step back
+                v = endpoint[labelend[b]]
+            # Swap v and w so that we alternate between both paths
+            if w != -1:
+                v, w = w, v
+        # Remove breadcrumbs
+        for b in path:
+            label[b] = 1
+        return base
+
+    def addBlossom(base, k):
+        """Constructs a new blossom with the given base, containing edge k
+        which connects a pair of S-vertices."""
+        (v, w, weight) = edges[k]
+        bb = inblossom[base]
+        bv = inblossom[v]
+        bw = inblossom[w]
+        # Create the blossom
+        b = unusedblossoms.pop()
+        blossombase[b] = base
+        blossomparent[b] = -1
+        blossomparent[bb] = b
+        # Make a list of sub-blossoms and their interconnecting edge
+        # endpoints, tracing back from v to the base
+        blossomchilds[b] = path = []
+        blossomendps[b] = endps = []
+        while bv != bb:
+            blossomparent[bv] = b
+            path.append(bv)
+            endps.append(labelend[bv])
+            v = endpoint[labelend[bv]]
+            bv = inblossom[v]
+        path.append(bb)
+        path.reverse()
+        endps.reverse()
+        endps.append(2 * k)
+        # Trace back from w to the base
+        while bw != bb:
+            blossomparent[bw] = b
+            path.append(bw)
+            endps.append(labelend[bw] ^ 1)
+            w = endpoint[labelend[bw]]
+            bw = inblossom[w]
+        # The new blossom is an S-blossom
+        label[b] = 1
+        labelend[b] = labelend[bb]
+        dualvar[b] = 0
+        # Relabel its vertices
+        for v in blossomLeaves(b):
+            if label[inblossom[v]] == 2:
+                # This T-vertex now turns into an S-vertex because it becomes
+                # part of an S-blossom; add it to the queue
+                queue.append(v)
+            inblossom[v] = b
+        # Compute blossombestedges[b]
+        bestedgeto = (2 * nvertex) * [-1]
+        for bv in path:
+            if blossombestedges[bv] is None:
+                # This subblossom does not have a list of least-slack edges;
+                # get the information from the vertices
+                nblists = [[p // 2 for p in neighbend[v]]
+                           for v in blossomLeaves(bv)]
+            else:
+                nblists = [blossombestedges[bv]]
+            for nblist in nblists:
+                for k in nblist:
+                    (i, j, weight) = edges[k]
+                    if inblossom[j] == b:
+                        i, j = j, i
+                    bj = inblossom[j]
+                    if (bj != b and label[bj] == 1 and
+                            (bestedgeto[bj] == -1 or
+                             slack(k) < slack(bestedgeto[bj]))):
+                        bestedgeto[bj] = k
+            # Forget about least-slack edges of the subblossom
+            blossombestedges[bv] = None
+            bestedge[bv] = -1
+        blossombestedges[b] = [k for k in bestedgeto if k != -1]
+        # Select bestedge[b]
+        bestedge[b] = -1
+        for k in blossombestedges[b]:
+            if bestedge[b] == -1 or slack(k) < slack(bestedge[b]):
+                bestedge[b] = k
+
+    def expandBlossom(b, endstage):
+        """Expands the given top-level blossom."""
+        # Convert sub-blossoms into top-level blossoms
+        for s in blossomchilds[b]:
+            blossomparent[s] = -1
+            if s < nvertex:
+                inblossom[s] = s
+            elif endstage and dualvar[s] == 0:
+                # Recursively expand this sub-blossom
+                expandBlossom(s, endstage)
+            else:
+                for v in blossomLeaves(s):
+                    inblossom[v] = s
+        # If we expand a T-blossom during a stage, its sub-blossoms must be
+        # relabeled
+        if (not endstage) and label[b] == 2:
+            # Start at the sub-blossom through which the expanding blossom
+            # obtained its label, and relabel sub-blossoms until we reach the
+            # base.  Figure out through which sub-blossom the expanding
+            # blossom obtained its label initially.
+            entrychild = inblossom[endpoint[labelend[b] ^ 1]]
+            # Decide in which direction we will go round the blossom
+            j = blossomchilds[b].index(entrychild)
+            if j & 1:
+                # Start index is odd; go forward and wrap
+                j -= len(blossomchilds[b])
+                jstep = 1
+                endptrick = 0
+            else:
+                # Start index is even; go backward
+                jstep = -1
+                endptrick = 1
+            # Move along the blossom until we get to the base
+            p = labelend[b]
+            while j != 0:
+                # Relabel the T-sub-blossom
+                label[endpoint[p ^ 1]] = 0
+                label[endpoint[blossomendps[b][j - endptrick] ^
+                               endptrick ^ 1]] = 0
+                assignLabel(endpoint[p ^ 1], 2, p)
+                # Step to the next S-sub-blossom and note its forward endpoint
+                allowedge[blossomendps[b][j - endptrick] // 2] = True
+                j += jstep
+                p = blossomendps[b][j - endptrick] ^ endptrick
+                # Step to the next T-sub-blossom
+                allowedge[p // 2] = True
+                j += jstep
+            # Relabel the base T-sub-blossom WITHOUT stepping through to its
+            # mate (so don't call assignLabel)
+            bv = blossomchilds[b][j]
+            label[endpoint[p ^ 1]] = label[bv] = 2
+            labelend[endpoint[p ^ 1]] = labelend[bv] = p
+            bestedge[bv] = -1
+            # Continue along the blossom until we get back to entrychild
+            j += jstep
+            while blossomchilds[b][j] != entrychild:
+                # Examine the vertices of the sub-blossom to see whether it is
+                # reachable from a neighbouring S-vertex outside the expanding
+                # blossom
+                bv = blossomchilds[b][j]
+                if label[bv] == 1:
+                    # This sub-blossom just got label S through one of its
+                    # neighbours; leave it
+                    j += jstep
+                    continue
+                for v in blossomLeaves(bv):
+                    if label[v] != 0:
+                        break
+                # If the sub-blossom contains a reachable vertex, assign label
+                # T to the sub-blossom
+                if label[v] != 0:
+                    label[v] = 0
+                    label[endpoint[mate[blossombase[bv]]]] = 0
+                    assignLabel(v, 2, labelend[v])
+                j += jstep
+        # Recycle the blossom number
+        label[b] = labelend[b] = -1
+        blossomchilds[b] = blossomendps[b] = None
+        blossombase[b] = -1
+        blossombestedges[b] = None
+        bestedge[b] = -1
+        unusedblossoms.append(b)
+
+    def augmentBlossom(b, v):
+        """Swaps matched/unmatched edges over an alternating path through
+        blossom b between vertex v and the base vertex, keeping track of the
+        base."""
+        # Bubble up through the blossom tree from vertex v to an immediate
+        # sub-blossom of b
+        t = v
+        while blossomparent[t] != b:
+            t = blossomparent[t]
+        # Recursively deal with the first sub-blossom
+        if t >= nvertex:
+            augmentBlossom(t, v)
+        # Decide in which direction we will go round the blossom
+        i = j = blossomchilds[b].index(t)
+        if i & 1:
+            # Start index is odd; go forward and wrap
+            j -= len(blossomchilds[b])
+            jstep = 1
+            endptrick = 0
+        else:
+            # Start index is even; go backward
+            jstep = -1
+            endptrick = 1
+        # Move along the blossom until we get to the base
+        while j != 0:
+            # Step to the next sub-blossom and augment it recursively
+            j += jstep
+            t = blossomchilds[b][j]
+            p = blossomendps[b][j - endptrick] ^ endptrick
+            if t >= nvertex:
+                augmentBlossom(t, endpoint[p])
+            # Step to the next sub-blossom and augment it recursively
+            j += jstep
+            t = blossomchilds[b][j]
+            if t >= nvertex:
+                augmentBlossom(t, endpoint[p ^ 1])
+            # Match the edge connecting those sub-blossoms
+            mate[endpoint[p]] = p ^ 1
+            mate[endpoint[p ^ 1]] = p
+        # Rotate the list of sub-blossoms to put the new base at the front
+        blossomchilds[b] = blossomchilds[b][i:] + blossomchilds[b][:i]
+        blossomendps[b] = blossomendps[b][i:] + blossomendps[b][:i]
+        blossombase[b] = blossombase[blossomchilds[b][0]]
+
+    def augmentMatching(k):
+        """Swaps matched/unmatched edges over an alternating path between two
+        single vertices.  The augmenting path runs through edge k, which
+        connects a pair of S-vertices."""
+        (v, w, weight) = edges[k]
+        for (s, p) in ((v, 2 * k + 1), (w, 2 * k)):
+            # Match vertex s to remote endpoint p, then trace back from s
+            # until we find a single vertex, swapping matched and unmatched
+            # edges as we go
+            while True:
+                bs = inblossom[s]
+                # Augment through the S-blossom from s to base
+                if bs >= nvertex:
+                    augmentBlossom(bs, s)
+                # Update mate[s]
+                mate[s] = p
+                # Trace one step back
+                if labelend[bs] == -1:
+                    # Reached a single vertex; stop
+                    break
+                t = endpoint[labelend[bs]]
+                bt = inblossom[t]
+                # Trace one more step back
+                s = endpoint[labelend[bt]]
+                j = endpoint[labelend[bt] ^ 1]
+                # Augment through the T-blossom from j to base
+                if bt >= nvertex:
+                    augmentBlossom(bt, j)
+                # Update mate[j]
+                mate[j] = labelend[bt]
+                # Keep the opposite endpoint; it will be assigned to mate[s]
+                # in the next step
+                p = labelend[bt] ^ 1
+
+    # Main loop: continue until no further improvement is possible.  Each
+    # iteration of this loop is a "stage".  A stage finds an augmenting path
+    # and uses that to improve the matching.
+    for t in range(nvertex):
+        # Remove labels from top-level blossoms/vertices
+        label[:] = (2 * nvertex) * [0]
+        # Forget all about least-slack edges
+        bestedge[:] = (2 * nvertex) * [-1]
+        blossombestedges[nvertex:] = nvertex * [None]
+        # Loss of labeling means that we can not be sure that currently
+        # allowable edges remain allowable throughout this stage
+        allowedge[:] = nedge * [False]
+        # Make queue empty
+        queue[:] = []
+        # Label single blossoms/vertices with S and put them in the queue
+        for v in range(nvertex):
+            if mate[v] == -1 and label[inblossom[v]] == 0:
+                assignLabel(v, 1, -1)
+        # Loop until we succeed in augmenting the matching
+        augmented = False
+        while True:
+            # Continue labeling until all vertices which are reachable through
+            # an alternating path have got a label
+            while queue and not augmented:
+                # Take an S-vertex from the queue
+                v = queue.pop()
+                # Scan its neighbours
+                for p in neighbend[v]:
+                    k = p // 2
+                    w = endpoint[p]
+                    # w is a neighbour to v
+                    if inblossom[v] == inblossom[w]:
+                        # This edge is internal to a blossom; ignore it
+                        continue
+                    if not allowedge[k]:
+                        kslack = slack(k)
+                        if kslack <= 0:
+                            # Edge k has zero slack, so it is allowable
+                            allowedge[k] = True
+                    if allowedge[k]:
+                        if label[inblossom[w]] == 0:
+                            # (C1) w is a free vertex; label w with T and
+                            # label its mate with S (R12)
+                            assignLabel(w, 2, p ^ 1)
+                        elif label[inblossom[w]] == 1:
+                            # (C2) w is an S-vertex (not in the same
+                            # blossom); follow back-links to discover either
+                            # an augmenting path or a new blossom
+                            base = scanBlossom(v, w)
+                            if base >= 0:
+                                # Found a new blossom; add it to the blossom
+                                # bookkeeping and turn it into an S-blossom
+                                addBlossom(base, k)
+                            else:
+                                # Found an augmenting path; augment the
+                                # matching and end this stage
+                                augmentMatching(k)
+                                augmented = True
+                                break
+                        elif label[w] == 0:
+                            # w is inside a T-blossom, but w itself has not
+                            # yet been reached from outside the blossom;
+                            # mark it as reached (we need this to relabel
+                            # during T-blossom expansion)
+                            label[w] = 2
+                            labelend[w] = p ^ 1
+                    elif label[inblossom[w]] == 1:
+                        # Keep track of the least-slack non-allowable edge to
+                        # a different S-blossom
+                        b = inblossom[v]
+                        if bestedge[b] == -1 or kslack < slack(bestedge[b]):
+                            bestedge[b] = k
+                    elif label[w] == 0:
+                        # w is a free vertex (or an unreached vertex inside a
+                        # T-blossom) but we can not reach it yet; keep track
+                        # of the least-slack edge that reaches w
+                        if bestedge[w] == -1 or kslack < slack(bestedge[w]):
+                            bestedge[w] = k
+
+            if augmented:
+                break
+
+            # There is no augmenting path under these constraints; compute
+            # delta and reduce slack in the optimization problem
+            deltatype = -1
+            delta = deltaedge = deltablossom = None
+
+            # Compute delta1: the minimum value of any vertex dual
+            if not maxCardinality:
+                deltatype = 1
+                delta = min(dualvar[:nvertex])
+
+            # Compute delta2: the minimum slack on any edge between an
+            # S-vertex and a free vertex
+            for v in range(nvertex):
+                if label[inblossom[v]] == 0 and bestedge[v] != -1:
+                    d = slack(bestedge[v])
+                    if deltatype == -1 or d < delta:
+                        delta = d
+                        deltatype = 2
+                        deltaedge = bestedge[v]
+
+            # Compute delta3: half the minimum slack on any edge between a
+            # pair of S-blossoms
+            for b in range(2 * nvertex):
+                if (blossomparent[b] == -1 and label[b] == 1 and
+                        bestedge[b] != -1):
+                    d = slack(bestedge[b]) // 2
+                    if deltatype == -1 or d < delta:
+                        delta = d
+                        deltatype = 3
+                        deltaedge = bestedge[b]
+
+            # Compute delta4: minimum z variable of any T-blossom
+            for b in range(nvertex, 2 * nvertex):
+                if (blossombase[b] >= 0 and blossomparent[b] == -1 and
+                        label[b] == 2 and
+                        (deltatype == -1 or dualvar[b] < delta)):
+                    delta = dualvar[b]
+                    deltatype = 4
+                    deltablossom = b
+
+            if deltatype == -1:
+                # No further improvement possible; max-cardinality optimum
+                # reached.  Do a final delta update to make the optimum
+                # verifiable
+                deltatype = 1
+                delta = max(0, min(dualvar[:nvertex]))
+
+            # Update dual variables according to delta
+            for v in range(nvertex):
+                if label[inblossom[v]] == 1:
+                    # S-vertex: 2*u = 2*u - 2*delta
+                    dualvar[v] -= delta
+                elif label[inblossom[v]] == 2:
+                    # T-vertex: 2*u = 2*u + 2*delta
+                    dualvar[v] += delta
+            for b in range(nvertex, 2 * nvertex):
+                if blossombase[b] >= 0 and blossomparent[b] == -1:
+                    if label[b] == 1:
+                        # top-level S-blossom: z = z + 2*delta
+                        dualvar[b] += delta
+                    elif label[b] == 2:
+                        # top-level T-blossom: z = z - 2*delta
+                        dualvar[b] -= delta
+
+            # Take action at the point where minimum delta occurred
+            if deltatype == 1:
+                # No further improvement possible; optimum reached
+                break
+            elif deltatype == 2:
+                # Use the least-slack edge to continue the search
+                allowedge[deltaedge] = True
+                (i, j, weight) = edges[deltaedge]
+                if label[inblossom[i]] == 0:
+                    i, j = j, i
+                queue.append(i)
+            elif deltatype == 3:
+                # Use the least-slack edge to continue the search
+                allowedge[deltaedge] = True
+                (i, j, weight) = edges[deltaedge]
+                queue.append(i)
+            elif deltatype == 4:
+                # Expand the least-z blossom
+                expandBlossom(deltablossom, False)
+
+        # Stop when no more augmenting path can be found
+        if not augmented:
+            break
+
+        # End of a stage; expand all S-blossoms which have dualvar = 0
+        for b in range(nvertex, 2 * nvertex):
+            if (blossomparent[b] == -1 and blossombase[b] >= 0 and
+                    label[b] == 1 and dualvar[b] == 0):
+                expandBlossom(b, True)
+
+    # Transform mate[] such that mate[v] is the vertex to which v is paired
+    for v in range(nvertex):
+        if mate[v] >= 0:
+            mate[v] = endpoint[mate[v]]
+
+    return mate
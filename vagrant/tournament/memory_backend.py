@@ -0,0 +1,189 @@
+#
+# memory_backend.py -- in-memory storage for the tournament functions
+#
+# Keeps players and matches in Python objects instead of PostgreSQL, for
+# simulations and tests that need thousands of rounds per second.  Select it
+# with TOURNAMENT_BACKEND=memory, or at runtime with
+# tournament.useBackend('memory').
+#
+# The data mirrors tournament.sql: ids are handed out like a serial column,
+# a pair of players can only meet once, and players who have played matches
+# cannot be deleted.  Nothing is persisted; each MemoryBackend starts empty.
+#
+
+import array
+import re
+
+import pairing
+
+# The columns of each table, in the order tournament.sql creates them
+TABLES = {
+    'players': ('id', 'name'),
+    'matches': ('player_1_id', 'player_2_id', 'winner_id'),
+}
+
+# The only statements MemoryCursor understands
+SELECT_PATTERN = re.compile(r'^\s*SELECT\s+(?P<columns>\*|\w+(\s*,\s*\w+)*)'
+                            r'\s+FROM\s+(?P<table>\w+)\s*;?\s*$',
+                            re.IGNORECASE)
+
+
+class Player(object):
+    """A registered player and their win record."""
+
+    __slots__ = ('id', 'name', 'wins', 'matches')
+
+    def __init__(self, player_id, name):
+        self.id = player_id
+        self.name = name
+        self.wins = 0
+        self.matches = 0
+
+
+class MemoryBackend(object):
+    """Stores tournament data in memory.
+
+    Has a method for each tournament function that touches the database,
+    taking the same arguments and returning the same results.  Matches are
+    stored column by column in arrays, in the order they were reported.
+    """
+
+    def __init__(self):
+        self._players = {}
+        self._lastPlayerId = 0
+        self._played = set()
+        self._player1s = array.array('l')
+        self._player2s = array.array('l')
+        self._winners = array.array('l')
+
+    def connect(self):
+        """Returns a MemoryConnection, which can read whole tables."""
+        return MemoryConnection(self)
+
+    def deleteMatches(self):
+        self._played = set()
+        self._player1s = array.array('l')
+        self._player2s = array.array('l')
+        self._winners = array.array('l')
+        for player in self._players.itervalues():
+            player.wins = 0
+            player.matches = 0
+
+    def deletePlayers(self):
+        if self._player1s:
+            raise ValueError("Players still have matches")
+        self._players.clear()
+
+    def countPlayers(self):
+        return len(self._players)
+
+    def registerPlayer(self, name):
+        self._lastPlayerId += 1
+        self._players[self._lastPlayerId] = Player(self._lastPlayerId, name)
+
+    def playerStandings(self):
+        players = sorted(self._players.itervalues(),
+                         key=lambda player: (-player.wins, -player.matches,
+                                             player.id))
+        return [(player.id, player.name, player.wins, player.matches)
+                for player in players]
+
+    def reportMatch(self, winner, loser):
+        for player_id in (winner, loser):
+            if player_id not in self._players:
+                raise ValueError("Player %s does not exist" % player_id)
+        key = pairing.pairKey(winner, loser)
+        if key in self._played:
+            raise ValueError("Match %s vs. %s has already been played" % key)
+
+        self._played.add(key)
+        self._player1s.append(key[0])
+        self._player2s.append(key[1])
+        self._winners.append(winner)
+        self._players[winner].wins += 1
+        self._players[winner].matches += 1
+        self._players[loser].matches += 1
+
+    def havePlayedPreviously(self, player1, player2):
+        return pairing.pairKey(player1, player2) in self._played
+
+    def playedPairs(self):
+        return set(self._played)
+
+    def pairingData(self):
+        """Returns the standings and played pairs swissPairings() needs."""
+        return self.playerStandings(), self._played
+
+    def tableRows(self, table):
+        """Returns every row of one of the tables in TABLES, as tuples of
+        its columns."""
+        if table == 'players':
+            return sorted((player.id, player.name)
+                          for player in self._players.itervalues())
+        if table == 'matches':
+            return zip(self._player1s, self._player2s, self._winners)
+        raise ValueError("Unknown table '%s'" % table)
+
+
+class MemoryConnection(object):
+    """Stands in for a database connection to a MemoryBackend.
+
+    Its cursors can only read whole tables, with statements of the form
+    'SELECT column, ... FROM table'.  There is nothing to commit.
+    """
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def cursor(self):
+        return MemoryCursor(self._backend)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryCursor(object):
+    """A cursor on a MemoryConnection."""
+
+    def __init__(self, backend):
+        self._backend = backend
+        self._rows = []
+
+    def execute(self, query, params=None):
+        match = SELECT_PATTERN.match(query)
+        if match is None:
+            raise ValueError("The memory backend can only run 'SELECT "
+                             "column, ... FROM table' statements, not " +
+                             repr(query))
+        table = match.group('table').lower()
+        if table not in TABLES:
+            raise ValueError("Unknown table '%s'" % table)
+        columns = TABLES[table]
+        if match.group('columns') == '*':
+            indexes = range(len(columns))
+        else:
+            try:
+                indexes = [columns.index(column.strip().lower())
+                           for column in match.group('columns').split(',')]
+            except ValueError:
+                raise ValueError("Unknown column in " + repr(query))
+        self._rows = [tuple(row[index] for index in indexes)
+                      for row in self._backend.tableRows(table)]
+
+    def fetchone(self):
+        if not self._rows:
+            return None
+        return self._rows.pop(0)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        self._rows = []
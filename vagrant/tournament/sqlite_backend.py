@@ -0,0 +1,163 @@
+#
+# sqlite_backend.py -- SQLite storage for the tournament functions
+#
+# For venues without a PostgreSQL server.  Select it with
+# TOURNAMENT_BACKEND=sqlite, setting TOURNAMENT_SQLITE_PATH to the database
+# file, or at runtime with tournament.useBackend('sqlite').
+#
+# The schema in tournament_sqlite.sql reproduces tournament.sql, including
+# the player_standings view, so standings are computed and ordered the same
+# way.  Each thread keeps one connection open in WAL mode, so readers do not
+# block the writer, and the statements below stay prepared in that
+# connection's statement cache.
+#
+
+import contextlib
+import os
+import sqlite3
+import threading
+
+import metrics
+import pairing
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'tournament_sqlite.sql')
+
+# How many prepared statements each connection keeps; more than the number
+# of distinct statements below, so none are ever evicted
+CACHED_STATEMENTS = 64
+
+# How long to wait for another connection's write lock, in seconds
+BUSY_TIMEOUT = 30
+
+
+class SQLiteConnection(object):
+    """A thread's connection to the database, as returned by connect().
+
+    Behaves like the underlying sqlite3 connection, except that close()
+    only rolls back uncommitted work, leaving the connection open for the
+    backend to reuse.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        self._connection.rollback()
+
+
+class SQLiteBackend(object):
+    """Stores tournament data in a SQLite database.
+
+    Has a method for each tournament function that touches the database,
+    taking the same arguments and returning the same results.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        """Returns this thread's connection, opening it if necessary."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT,
+                                         cached_statements=CACHED_STATEMENTS)
+
+            # Return names as str, as psycopg2 does
+            connection.text_factory = str
+            connection.execute("PRAGMA foreign_keys = ON;")
+            connection.execute("PRAGMA journal_mode = WAL;")
+            connection.execute("PRAGMA synchronous = NORMAL;")
+            with open(SCHEMA_FILE) as schema:
+                connection.executescript(schema.read())
+            self._local.connection = connection
+        return connection
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Yields a cursor on this thread's connection.  The transaction is
+        committed when the 'with' block completes and rolled back if it
+        raises."""
+        connection = metrics.instrumentConnection(self._connection())
+        try:
+            dbcursor = connection.cursor()
+            yield dbcursor
+            connection.commit()
+        finally:
+            # Does nothing once the transaction has been committed
+            connection.rollback()
+
+    def close(self):
+        """Closes this thread's connection."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def connect(self):
+        """Returns this thread's connection to the database."""
+        return SQLiteConnection(self._connection())
+
+    def deleteMatches(self):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("DELETE FROM matches;")
+
+    def deletePlayers(self):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("DELETE FROM players;")
+
+    def countPlayers(self):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("SELECT COUNT(*) FROM players;")
+            return dbcursor.fetchone()[0]
+
+    def registerPlayer(self, name):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("INSERT INTO players (name) VALUES (?);",
+                             (name,))
+
+    def playerStandings(self):
+        with self._transaction() as dbcursor:
+            return self._fetchStandings(dbcursor)
+
+    def _fetchStandings(self, dbcursor):
+        """Runs the standings query on an open cursor."""
+        dbcursor.execute("SELECT * FROM player_standings;")
+        return dbcursor.fetchall()
+
+    def reportMatch(self, winner, loser):
+        player1ID, player2ID = pairing.pairKey(winner, loser)
+        with self._transaction() as dbcursor:
+            dbcursor.execute("""INSERT INTO matches (player_1_id, player_2_id,
+                                winner_id) VALUES (?, ?, ?);""",
+                             (player1ID, player2ID, winner,))
+
+    def havePlayedPreviously(self, player1, player2):
+        with self._transaction() as dbcursor:
+            dbcursor.execute("""SELECT COUNT(*) FROM matches
+                                WHERE player_1_id = ? AND
+                                      player_2_id = ?;""",
+                             pairing.pairKey(player1, player2))
+            return dbcursor.fetchone()[0] > 0
+
+    def playedPairs(self):
+        with self._transaction() as dbcursor:
+            return self._fetchPlayedPairs(dbcursor)
+
+    def _fetchPlayedPairs(self, dbcursor):
+        """Loads every pairing played so far on an open cursor."""
+        dbcursor.execute("SELECT player_1_id, player_2_id FROM matches;")
+        return pairing.playedPairSet(dbcursor.fetchall())
+
+    def pairingData(self):
+        """Returns the standings and played pairs swissPairings() needs, read
+        in one transaction."""
+        with self._transaction() as dbcursor:
+            # Reads take a snapshot from their first statement
+            dbcursor.execute("BEGIN;")
+            return self._fetchStandings(dbcursor), \
+                self._fetchPlayedPairs(dbcursor)
@@ -3,47 +3,253 @@
 # tournament.py -- implementation of a Swiss-system tournament
 #
 
+import contextlib
+import functools
+import os
+import threading
+
 import psycopg2
+import psycopg2.pool
+
+import memory_backend
+import metrics
+import pairing
+import sqlite_backend
+
+# Connection settings for the shared pool.  These can be overridden from the
+# environment, or at runtime with configurePool()
+DSN = os.environ.get('TOURNAMENT_DSN', 'dbname=tournament')
+POOL_MIN_CONNECTIONS = int(os.environ.get('TOURNAMENT_POOL_MIN', 1))
+POOL_MAX_CONNECTIONS = int(os.environ.get('TOURNAMENT_POOL_MAX', 10))
+
+# How swissPairings() pairs a round: 'greedy' pairs top-down within groups
+# of equal wins, 'optimal' solves a maximum-weight matching (see pairing.py)
+PAIRING_MODE = os.environ.get('TOURNAMENT_PAIRING', 'greedy')
+
+# Where the tournament functions keep their data: 'postgresql', 'memory' for
+# the in-memory backend in memory_backend.py, or 'sqlite' for the SQLite
+# database file at SQLITE_PATH (see sqlite_backend.py).  Can be changed at
+# runtime with useBackend()
+BACKEND = os.environ.get('TOURNAMENT_BACKEND', 'postgresql')
+SQLITE_PATH = os.environ.get('TOURNAMENT_SQLITE_PATH', 'tournament.db')
+
+# The shared pool is created lazily on first use
+_pool = None
+_poolLock = threading.Lock()
+
+# The backend object handling the tournament functions, or None while they
+# use PostgreSQL
+_backend = None
+
+
+class PooledConnection(object):
+    """A database connection borrowed from a ConnectionPool.
+
+    Behaves like the underlying psycopg2 connection, except that close()
+    hands the connection back to the pool instead of closing it.
+    """
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        """Returns the connection to the pool.
+
+        Any uncommitted work is rolled back so the next borrower starts with
+        a clean transaction.  Connections that are broken are discarded.
+        """
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        discard = bool(connection.closed)
+        if not discard:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                discard = True
+        self._pool.putconn(connection, close=discard)
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of connections to the tournament database.
+
+    When every connection is checked out, borrowers wait for one to be
+    returned rather than failing.
+    """
+
+    def __init__(self, dsn, minconn, maxconn):
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn,
+                                                          dsn)
+        self._available = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self):
+        """Borrows a connection, blocking until one is available."""
+        self._available.acquire()
+        try:
+            return PooledConnection(self, self._pool.getconn())
+        except Exception:
+            self._available.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        """Takes back a connection, closing it if 'close' is True."""
+        try:
+            self._pool.putconn(connection, close=close)
+        finally:
+            self._available.release()
+
+    def closeall(self):
+        """Closes every connection held by the pool."""
+        self._pool.closeall()
+
+
+def configurePool(dsn=None, minconn=None, maxconn=None):
+    """Sets the connection settings used by the shared pool.
+
+    Any existing pool is closed; a new one is created on next use.
+
+    Args:
+      dsn: the libpq connection string for the tournament database
+      minconn: the number of connections to keep open while idle
+      maxconn: the maximum number of connections open at once
+    """
+    global DSN, POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS
+    if dsn is not None:
+        DSN = dsn
+    if minconn is not None:
+        POOL_MIN_CONNECTIONS = minconn
+    if maxconn is not None:
+        POOL_MAX_CONNECTIONS = maxconn
+    closePool()
+
+
+def closePool():
+    """Closes all pooled connections."""
+    global _pool
+    with _poolLock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def getPool():
+    """Returns the shared connection pool, creating it if necessary."""
+    global _pool
+    if _pool is None:
+        with _poolLock:
+            if _pool is None:
+                _pool = ConnectionPool(DSN, POOL_MIN_CONNECTIONS,
+                                       POOL_MAX_CONNECTIONS)
+    return _pool
+
+
+def useBackend(backend):
+    """Selects where the tournament functions keep their data.
+
+    Args:
+      backend: 'postgresql', 'memory' for a new, empty MemoryBackend,
+               'sqlite' for the database at SQLITE_PATH, or an object with
+               a method for each function marked @_pluggable
+    """
+    global BACKEND, _backend
+    if backend == 'postgresql':
+        _backend = None
+    elif backend == 'memory':
+        _backend = memory_backend.MemoryBackend()
+    elif backend == 'sqlite':
+        _backend = sqlite_backend.SQLiteBackend(SQLITE_PATH)
+    elif isinstance(backend, basestring):
+        raise ValueError("Unknown tournament backend '%s'" % backend)
+    else:
+        _backend = backend
+    BACKEND = backend
+
+
+def _pluggable(function):
+    """Hands calls to 'function' to the selected backend's method of the same
+    name, without any leading underscore, unless PostgreSQL is selected."""
+    name = function.__name__.lstrip('_')
+
+    @functools.wraps(function)
+    def dispatch(*args, **kwargs):
+        if _backend is None:
+            return function(*args, **kwargs)
+        return getattr(_backend, name)(*args, **kwargs)
+    return dispatch
 
 
+def _instrumented(function):
+    """Measures calls to 'function' while metrics are enabled (see
+    metrics.py)."""
+    name = function.__name__
+
+    @functools.wraps(function)
+    def measure(*args, **kwargs):
+        if metrics.enabled is None:
+            return function(*args, **kwargs)
+        return metrics.measure(name, function, args, kwargs)
+    return measure
+
+
+@_pluggable
 def connect():
-    """Connect to the PostgreSQL database.  Returns a database connection."""
-    return psycopg2.connect("dbname=tournament")
+    """Borrow a connection to the PostgreSQL database from the shared pool.
+    Returns a database connection; closing it returns it to the pool."""
+    return metrics.instrumentConnection(getPool().getconn())
 
 
+@contextlib.contextmanager
+def transaction():
+    """Borrows a pooled connection and yields a cursor on it.
+
+    The transaction is committed when the 'with' block completes and rolled
+    back if it raises.  Either way the connection goes back to the pool.
+    """
+    dbconnection = connect()
+    try:
+        dbcursor = dbconnection.cursor()
+        yield dbcursor
+        dbconnection.commit()
+    finally:
+        dbconnection.close()
+
+
+@_instrumented
+@_pluggable
 def deleteMatches():
     """Remove all the match records from the database."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("DELETE FROM matches")
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM matches")
 
 
+@_instrumented
+@_pluggable
 def deletePlayers():
     """Remove all the player records from the database."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("DELETE FROM players")
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        dbcursor.execute("DELETE FROM players")
 
 
+@_instrumented
+@_pluggable
 def countPlayers():
     """Returns the number of players currently registered."""
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-
-    # Use of 'COALESCE' returns zero instead of 'None' when table is empty
-    dbcursor.execute("SELECT COALESCE(COUNT(*), 0) FROM players")
+    with transaction() as dbcursor:
+        # Use of 'COALESCE' returns zero instead of 'None' when table is empty
+        dbcursor.execute("SELECT COALESCE(COUNT(*), 0) FROM players")
 
-    # Assign only the first value in the first tuple to avoid error
-    playerCount = dbcursor.fetchall()[0][0]
+        # Assign only the first value in the first tuple to avoid error
+        playerCount = dbcursor.fetchall()[0][0]
 
-    dbconnection.close()
     return playerCount
 
 
+@_instrumented
+@_pluggable
 def registerPlayer(name):
     """Adds a player to the tournament database.
 
@@ -53,17 +259,15 @@ def registerPlayer(name):
     Args:
       name: the player's full name (need not be unique).
     """
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-
-    # Use string insertion method with tuple to prevent SQL injection attacks
-    dbcursor.execute("INSERT INTO players (id, name) VALUES (DEFAULT, %s)",
-                     (name,))
-
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        # Use string insertion method with tuple to prevent SQL injection
+        # attacks
+        dbcursor.execute("INSERT INTO players (id, name) VALUES (DEFAULT, %s)",
+                         (name,))
 
 
+@_instrumented
+@_pluggable
 def playerStandings():
     """Returns a list of the players and their win records, sorted by wins.
 
@@ -77,19 +281,22 @@ def playerStandings():
         wins: the number of matches the player has won
         matches: the number of matches the player has played
     """
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-    dbcursor.execute("SELECT * FROM player_standings")
+    with transaction() as dbcursor:
+        return _fetchStandings(dbcursor)
 
-    # Start with an empty list, iterate through results, and append row by row
-    playerStandings = []
-    for row in dbcursor.fetchall():
-        playerStandings.append((row[0], row[1], row[2], row[3]))
 
-    dbconnection.close()
-    return playerStandings
+def _fetchStandings(dbcursor):
+    """Runs the standings query on an open cursor.  Returns the rows
+    described in playerStandings()."""
+    dbcursor.execute("SELECT * FROM player_standings")
 
+    # The rows are already tuples, so they are returned as fetched rather
+    # than copied
+    return dbcursor.fetchall()
 
+
+@_instrumented
+@_pluggable
 def reportMatch(winner, loser):
     """Records the outcome of a single match between two players.
 
@@ -101,18 +308,16 @@ def reportMatch(winner, loser):
     player1ID = min(winner, loser)
     player2ID = max(winner, loser)
 
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-
-    # Use string insertion method with tuple to prevent SQL injection attacks
-    dbcursor.execute("""INSERT INTO matches (player_1_id, player_2_id,
-                        winner_id) VALUES (%s, %s, %s)""",
-                     (str(player1ID), str(player2ID), str(winner),))
-
-    dbconnection.commit()
-    dbconnection.close()
+    with transaction() as dbcursor:
+        # Use string insertion method with tuple to prevent SQL injection
+        # attacks
+        dbcursor.execute("""INSERT INTO matches (player_1_id, player_2_id,
+                            winner_id) VALUES (%s, %s, %s)""",
+                         (str(player1ID), str(player2ID), str(winner),))
 
 
+@_instrumented
+@_pluggable
 def havePlayedPreviously(player1, player2):
     """ Returns True if the two players passed as arguments have played each
         other already.
@@ -128,20 +333,17 @@ def havePlayedPreviously(player1, player2):
     player2ID = max(player1, player2)
 
     # Query the database for this pairing
-    dbconnection = connect()
-    dbcursor = dbconnection.cursor()
-
-    # Use of 'COALESCE' returns zero instead of 'None' when query returns no
-    # rows
-    dbcursor.execute(""" SELECT COALESCE(COUNT(*), 0)
-                         FROM   matches
-                         WHERE  player_1_id = " + str(player1ID) + " AND
-                                player_2_id = " + str(player2ID) """)
-
-    # Assign only the first value in the first tuple to avoid error
-    previousMatches = dbcursor.fetchall()[0][0]
-
-    dbconnection.close()
+    with transaction() as dbcursor:
+        # Use of 'COALESCE' returns zero instead of 'None' when query returns
+        # no rows
+        dbcursor.execute(""" SELECT COALESCE(COUNT(*), 0)
+                             FROM   matches
+                             WHERE  player_1_id = %s AND
+                                    player_2_id = %s""",
+                         (player1ID, player2ID,))
+
+        # Assign only the first value in the first tuple to avoid error
+        previousMatches = dbcursor.fetchall()[0][0]
 
     # Return True or False, depending on whether a previous match exists or not
     if (previousMatches > 0):
@@ -150,7 +352,24 @@ def havePlayedPreviously(player1, player2):
         return False
 
 
-def swissPairings():
+@_instrumented
+@_pluggable
+def playedPairs():
+    """ Returns the set of pairs of players who have already played each
+        other, as (lowest id, highest id) tuples."""
+    with transaction() as dbcursor:
+        return _fetchPlayedPairs(dbcursor)
+
+
+def _fetchPlayedPairs(dbcursor):
+    """Loads every pairing played so far on an open cursor.  Returns the set
+    described in playedPairs()."""
+    dbcursor.execute("SELECT player_1_id, player_2_id FROM matches")
+    return pairing.playedPairSet(dbcursor.fetchall())
+
+
+@_instrumented
+def swissPairings(mode=None):
     """ Returns a list of pairs of players for the next round of a match.
 
         Assuming that there are an even number of players registered, each
@@ -158,6 +377,9 @@ def swissPairings():
         with another player with an equal or nearly-equal win record, that is,
         a player adjacent to him or her in the standings.
 
+        Args:
+        mode: 'greedy' or 'optimal'; defaults to PAIRING_MODE
+
         Returns:
         A list of tuples, each of which contains (id1, name1, id2, name2)
             id1: the first player's unique id
@@ -165,35 +387,24 @@ def swissPairings():
             id2: the second player's unique id
             name2: the second player's name
     """
-    currentStandings = playerStandings()
-
-    # Start with an empty list, iterate through results of playerStandings
-    # in pairs and append row by row
-    pairList = []
-
-    # Iterate through each row of the current standings...
-    for player in currentStandings:
-
-        # if this player is not in the new pair list...
-        if any(player[0] in row for row in pairList) == False:
-
-            # iterate through all of the other players...
-            for player2 in currentStandings:
+    # Load the standings and every pair that has already played in one go,
+    # so pairing itself needs no further queries
+    currentStandings, previousPairs = _pairingData()
 
-                # and, if the other player is not the same person...
-                if player[0] != player2[0]:
+    # Pair players within their group of equal wins, without rematches
+    if (mode or PAIRING_MODE) == 'optimal':
+        return pairing.optimalPairRound(currentStandings, previousPairs,
+                                        lambda row: row[2])
+    return pairing.pairRound(currentStandings, previousPairs,
+                             lambda row: row[2])
 
-                    # if this player is not in the new pair list...
-                    if any(player2[0] in row for row in pairList) == False:
 
-                        # check that the other player is not already in the
-                        # pairlist and have not already played this player
-                        if (havePlayedPreviously(player[0],
-                           player2[0]) == False):
+@_pluggable
+def _pairingData():
+    """Loads the standings and every pair that has already played in one
+    transaction.  Returns a (playerStandings(), playedPairs()) tuple."""
+    with transaction() as dbcursor:
+        return _fetchStandings(dbcursor), _fetchPlayedPairs(dbcursor)
 
-                            # .. then add them as the next pair
-                            pairList.append((player[0], player[1], player2[0],
-                                            player2[1]))
-                            break
 
-    return pairList
+useBackend(BACKEND)
@@ -39,14 +39,34 @@ INSERT INTO matches (player_1_id, player_2_id, winner_id) VALUES
 	(3, 4, 3),
 	(5, 6, 6);
 
+-- Indexes for looking up matches by winner and by player_2_id.  The primary
+-- key already covers lookups by player_1_id.  Databases created before these
+-- were added can be upgraded with tournament_indexes.sql.
+CREATE INDEX matches_winner_idx ON matches (winner_id);
+CREATE INDEX matches_player_2_idx
+	ON matches (player_2_id, player_1_id, winner_id);
+
+-- Standings are computed in a single pass over matches: each match is
+-- unfolded into one row per player, and grouping those rows gives every
+-- player's wins and matches played.
 CREATE VIEW player_standings AS
-	SELECT	players.id, players.name, 
-	(SELECT	COUNT(*)
-	 FROM	matches
-	 WHERE	matches.winner_id = players.id) as "Wins",
-	(SELECT	COUNT(*)
-	 FROM	matches
-	 WHERE	matches.player_1_id = players.id OR
-			matches.player_2_id = players.id) as "Matches"
-	FROM players
-	ORDER BY "Wins" DESC, "Matches" DESC
+	WITH results AS (
+		SELECT	player_1_id AS player_id, winner_id
+		FROM	matches
+		UNION ALL
+		SELECT	player_2_id, winner_id
+		FROM	matches
+		WHERE	player_2_id <> player_1_id
+	),
+	records AS (
+		SELECT	player_id,
+				SUM(CASE WHEN winner_id = player_id THEN 1 ELSE 0 END) AS wins,
+				COUNT(*) AS matches
+		FROM	results
+		GROUP BY player_id
+	)
+	SELECT	players.id, players.name,
+			COALESCE(records.wins, 0) as "Wins",
+			COALESCE(records.matches, 0) as "Matches"
+	FROM players LEFT JOIN records ON (records.player_id = players.id)
+	ORDER BY "Wins" DESC, "Matches" DESC, players.id
@@ -0,0 +1,25 @@
+-- Migration: adds the matches indexes from tournament.sql to an existing
+-- tournament database.
+--
+-- Run it from psql with '\i tournament_indexes.sql' while connected to the
+-- tournament database.  The indexes are built concurrently, so matches can
+-- still be reported while it runs.  It is safe to run more than once:
+-- indexes that already exist are left in place, and only an index left
+-- invalid by a concurrent build that failed is dropped and built again.
+-- Needs PostgreSQL 9.6 or later.
+
+-- A failed concurrent build leaves an invalid index behind, which the
+-- IF NOT EXISTS below would otherwise keep
+SELECT format('DROP INDEX CONCURRENTLY %I', class.relname)
+FROM   pg_index INNER JOIN pg_class AS class
+       ON (class.oid = pg_index.indexrelid)
+WHERE  class.relname IN ('matches_winner_idx', 'matches_player_2_idx')
+       AND NOT pg_index.indisvalid
+\gexec
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS matches_winner_idx ON matches (winner_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS matches_player_2_idx
+	ON matches (player_2_id, player_1_id, winner_id);
+
+ANALYZE matches;
@@ -0,0 +1,44 @@
+-- SQLite version of the schema in tournament.sql, used by sqlite_backend.py.
+--
+-- The backend runs this script every time it opens a database, so every
+-- statement must be safe to repeat.  The serial id becomes an AUTOINCREMENT
+-- key, which likewise never reuses an id.  The sample players and matches
+-- in tournament.sql are left out.
+
+CREATE TABLE IF NOT EXISTS players (
+	id		INTEGER PRIMARY KEY AUTOINCREMENT,
+	name	text
+);
+
+CREATE TABLE IF NOT EXISTS matches (
+	player_1_id	integer REFERENCES players(id),
+	player_2_id	integer REFERENCES players(id),
+	winner_id	integer REFERENCES players(id),
+	PRIMARY KEY (player_1_id, player_2_id)
+);
+
+CREATE INDEX IF NOT EXISTS matches_winner_idx ON matches (winner_id);
+CREATE INDEX IF NOT EXISTS matches_player_2_idx
+	ON matches (player_2_id, player_1_id, winner_id);
+
+CREATE VIEW IF NOT EXISTS player_standings AS
+	WITH results AS (
+		SELECT	player_1_id AS player_id, winner_id
+		FROM	matches
+		UNION ALL
+		SELECT	player_2_id, winner_id
+		FROM	matches
+		WHERE	player_2_id <> player_1_id
+	),
+	records AS (
+		SELECT	player_id,
+				SUM(CASE WHEN winner_id = player_id THEN 1 ELSE 0 END) AS wins,
+				COUNT(*) AS matches
+		FROM	results
+		GROUP BY player_id
+	)
+	SELECT	players.id, players.name,
+			COALESCE(records.wins, 0) as "Wins",
+			COALESCE(records.matches, 0) as "Matches"
+	FROM players LEFT JOIN records ON (records.player_id = players.id)
+	ORDER BY "Wins" DESC, "Matches" DESC, players.id;